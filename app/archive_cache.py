@@ -0,0 +1,133 @@
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import config
+
+# --- 压缩包句柄缓存 ---
+class CachedArchive:
+    """一个已打开的 ZIP 句柄及其 文件名 -> ZipInfo 映射。"""
+    def __init__(self, path, identity):
+        self.path = path
+        self.identity = identity
+        self.zip = zipfile.ZipFile(path, 'r')
+        self.entries = {info.filename: info for info in self.zip.infolist()}
+        self.refs = 0
+        self.retired = False
+
+    def close(self):
+        try:
+            self.zip.close()
+        except Exception as e:
+            print(f"[ArchiveCache] 关闭压缩包句柄失败 {self.path}: {e}")
+
+
+def _file_identity(path):
+    """以 (mtime_ns, size) 作为文件身份，文件被替换或修改后缓存即失效。"""
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+class ArchiveHandleCache:
+    """
+    进程级的 LRU 压缩包句柄缓存，按路径索引，并用 mtime/size 校验。
+    借出的句柄带引用计数，被淘汰或失效时会等最后一个使用者归还后再关闭，
+    因此打开的文件描述符数量最多为 max_handles 加上正在使用中的已淘汰句柄。
+    """
+    def __init__(self, max_handles):
+        self.max_handles = max(1, max_handles)
+        self._lock = threading.Lock()
+        self._archives = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @contextmanager
+    def open(self, path):
+        """借出 path 对应的 CachedArchive，离开 with 块时归还。"""
+        archive = self._acquire(path)
+        try:
+            yield archive
+        finally:
+            self._release(archive)
+
+    def _acquire(self, path):
+        identity = _file_identity(path)
+        with self._lock:
+            archive = self._archives.get(path)
+            if archive is not None:
+                if archive.identity == identity:
+                    self._archives.move_to_end(path)
+                    archive.refs += 1
+                    self.hits += 1
+                    return archive
+                self._retire(path)
+                self.invalidations += 1
+            self.misses += 1
+
+        # 在锁外解析中央目录，避免慢速磁盘上的打开操作阻塞其它请求
+        new_archive = CachedArchive(path, identity)
+        with self._lock:
+            archive = self._archives.get(path)
+            if archive is not None and archive.identity == identity:
+                # 其它线程已经抢先打开了同一个文件
+                to_close = new_archive
+            else:
+                if archive is not None:
+                    self._retire(path)
+                self._archives[path] = new_archive
+                archive = new_archive
+                to_close = None
+                while len(self._archives) > self.max_handles:
+                    oldest_path = next(iter(self._archives))
+                    self._retire(oldest_path)
+                    self.evictions += 1
+            archive.refs += 1
+        if to_close is not None:
+            to_close.close()
+        return archive
+
+    def _release(self, archive):
+        with self._lock:
+            archive.refs -= 1
+            should_close = archive.retired and archive.refs == 0
+        if should_close:
+            archive.close()
+
+    def _retire(self, path):
+        """从缓存中移除（调用方需持有锁）；无人使用时立即关闭。"""
+        archive = self._archives.pop(path)
+        archive.retired = True
+        if archive.refs == 0:
+            archive.close()
+
+    def invalidate(self, path):
+        """丢弃 path 的缓存句柄（例如文件即将被删除或移动时）。"""
+        with self._lock:
+            if path in self._archives:
+                self._retire(path)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            for path in list(self._archives):
+                self._retire(path)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "open_handles": len(self._archives),
+                "max_handles": self.max_handles,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+
+archive_cache = ArchiveHandleCache(config.ARCHIVE_CACHE_MAX_HANDLES)
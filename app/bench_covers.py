@@ -0,0 +1,88 @@
+"""
+封面生成基准测试：比较旧做法（完整解码、每个尺寸都从原图缩放、JPEG 质量 95）
+与 covers.render_covers（draft 解码 + 逐级缩放，渐进式 JPEG / WebP）的单本耗时和输出大小。
+
+用法: python bench_covers.py [漫画压缩包或图片 ...] [--repeat N]
+不指定文件时使用一张生成的 4000x6000 JPEG 作为样本。
+"""
+import io
+import os
+import sys
+import time
+import argparse
+from PIL import Image
+
+import config
+import covers
+import page_derivatives
+import scanner
+
+def legacy_render(image_data):
+    """原扫描流程中的封面生成方式，仅用于对比。"""
+    img = Image.open(io.BytesIO(image_data)).convert("RGB")
+    encoded = {}
+    for size_name, width in config.COVER_SIZES.items():
+        w, h = img.size
+        resized = img.resize((width, int(width * h / w)), Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        resized.save(output, "JPEG", quality=95)
+        encoded[size_name] = output.getvalue()
+    return encoded
+
+def synthetic_sample(size=(4000, 6000)):
+    noise = Image.effect_noise((size[0] // 8, size[1] // 8), 64).resize(size, Image.Resampling.BICUBIC)
+    gradient = Image.linear_gradient('L').resize(size)
+    img = Image.merge('RGB', (noise, gradient, noise.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    output = io.BytesIO()
+    img.save(output, "JPEG", quality=92)
+    return output.getvalue()
+
+def load_samples(paths):
+    samples = []
+    for path in paths:
+        if os.path.splitext(path)[1].lower() in config.ALLOWED_EXTENSIONS:
+            data = scanner.get_first_image(path)
+        else:
+            with open(path, 'rb') as f:
+                data = f.read()
+        if data:
+            samples.append((os.path.basename(path), data))
+        else:
+            print(f"跳过无法读取的文件: {path}")
+    return samples
+
+def bench(render, samples, repeat):
+    elapsed = 0.0
+    written = 0
+    for _ in range(repeat):
+        for _, data in samples:
+            started = time.perf_counter()
+            encoded = render(data)
+            elapsed += time.perf_counter() - started
+            written += sum(len(part) for part in encoded.values())
+    runs = repeat * len(samples)
+    return elapsed * 1000 / runs, written / runs
+
+def main():
+    parser = argparse.ArgumentParser(description="封面生成基准测试")
+    parser.add_argument('paths', nargs='*', help="漫画压缩包或图片文件")
+    parser.add_argument('--repeat', type=int, default=3, help="每个样本重复的次数")
+    args = parser.parse_args()
+
+    samples = load_samples(args.paths) if args.paths else [("synthetic-4000x6000.jpg", synthetic_sample())]
+    if not samples:
+        sys.exit("没有可用的样本。")
+
+    methods = [("旧做法 (JPEG q95)", legacy_render)]
+    for fmt in ('jpeg', 'webp'):
+        if fmt in page_derivatives.SUPPORTED_FORMATS:
+            methods.append((f"covers ({fmt} q{config.COVER_QUALITY})", lambda data, fmt=fmt: covers.render_covers(data, fmt)))
+
+    print(f"样本 {len(samples)} 个，每个重复 {args.repeat} 次，尺寸 {config.COVER_SIZES}")
+    print(f"{'方法':<24}{'每本耗时 (ms)':>16}{'每本写入 (KB)':>16}")
+    for name, render in methods:
+        ms, size = bench(render, samples, args.repeat)
+        print(f"{name:<24}{ms:>16.1f}{size / 1024:>16.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,9 @@ import json
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
 WEB_DIRECTORY = os.path.join(APP_DIR, 'web')
 COVERS_DIRECTORY = os.path.join(WEB_DIRECTORY, 'covers')
+CACHE_DIRECTORY = os.path.join(APP_DIR, 'cache')
+RAR_CACHE_DIRECTORY = os.path.join(CACHE_DIRECTORY, 'rar')
+DERIVATIVE_CACHE_DIRECTORY = os.path.join(CACHE_DIRECTORY, 'pages')
 
 # --- 配置文件路径 ---
 CONFIG_FILE = os.path.join(APP_DIR, 'config.json')
@@ -16,9 +19,99 @@ COVER_SIZES = {
     "large": 540
 }
 
+# --- 封面生成配置 ---
+# 封面的各个尺寸默认在第一次被请求时才生成；扫描时只登记封面，
+# 列在 COVER_WARMUP_SIZES 中的尺寸会在扫描时提前生成（例如 ['thumbnail'] 预热书架网格）
+COVER_WARMUP_SIZES = []
+# 扫描时缩放封面的进程数、同时在途（已读取第一页、等待缩放）的漫画数上限，
+# 以及每攒够多少条封面写一次数据库
+COVER_WORKERS = os.cpu_count() or 2
+COVER_MAX_IN_FLIGHT = COVER_WORKERS * 2
+COVER_DB_BATCH = 64
+# 请求时同时生成封面的数量上限
+COVER_LAZY_MAX_CONCURRENT = COVER_WORKERS
+# 封面的编码格式 (jpeg/webp，JPEG 为渐进式) 和编码质量
+COVER_FORMAT = 'jpeg'
+COVER_QUALITY = 85
+# 引用数归零的封面保留多久（秒）后才被回收，期间有漫画重新引用同一源图时可直接复用
+COVER_GC_GRACE_S = 3600
+
+# --- 数据库配置 ---
+# 等待其他连接释放写锁的最长时间（毫秒）
+DB_BUSY_TIMEOUT_MS = 10000
+# 每个连接的内存映射读取上限和页缓存大小
+DB_MMAP_SIZE = 256 * 1024 ** 2
+DB_CACHE_SIZE_KB = 16 * 1024
+# 连接池中保留的空闲连接数
+DB_POOL_MAX_IDLE = 8
+# 写线程收到第一个写操作后继续收集同批操作的时间窗口（毫秒）和单个事务的操作数上限
+DB_WRITE_BATCH_WINDOW_MS = 5
+DB_WRITE_MAX_BATCH = 256
+# 阅读进度先缓存在内存中，每隔多少秒批量写入一次（即崩溃时最多丢失的进度时长），
+# 以及缓冲的漫画数达到多少时提前写入
+PROGRESS_FLUSH_INTERVAL_S = 2
+PROGRESS_MAX_PENDING = 256
+# 数据库定期维护（清理孤立行、ANALYZE、增量 vacuum）的间隔和启动后首次运行的延迟（秒），间隔设为 0 可关闭
+MAINTENANCE_INTERVAL_S = 24 * 3600
+MAINTENANCE_INITIAL_DELAY_S = 10 * 60
+# 每次增量 vacuum 最多回收的空闲页数，0 表示全部回收
+MAINTENANCE_VACUUM_MAX_PAGES = 0
+
+# --- 列表缓存配置 ---
+# 内存中缓存的 /api/comics 响应数量上限，设为 0 可关闭
+LISTING_CACHE_MAX_ENTRIES = 256
+
 # --- 文件类型配置 ---
 IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp']
-ALLOWED_EXTENSIONS = ['.zip', '.cbz', '.rar']
+RAR_EXTENSIONS = ['.rar', '.cbr']
+ALLOWED_EXTENSIONS = ['.zip', '.cbz'] + RAR_EXTENSIONS
+
+# --- 阅读器缓存配置 ---
+# 同时保持打开的压缩包句柄数量上限（每个句柄占用一个文件描述符）
+ARCHIVE_CACHE_MAX_HANDLES = 32
+# 流式发送页面时每次读取的块大小（字节）
+PAGE_STREAM_CHUNK_SIZE = 256 * 1024
+# 带版本号的页面 URL 的浏览器缓存时长（秒）
+IMMUTABLE_CACHE_MAX_AGE = 365 * 24 * 3600
+# RAR 解压缓存的总大小上限（字节）和后台解压线程数
+RAR_CACHE_MAX_BYTES = 2 * 1024 ** 3
+RAR_EXTRACT_WORKERS = 2
+# 内存中缓存的已解压页面的总大小上限（字节），设为 0 可关闭；单页超过其 1/4 时不缓存
+PAGE_CACHE_MAX_BYTES = 256 * 1024 ** 2
+
+# --- 页面缩放与转码配置 ---
+# 缩放后页面的磁盘缓存大小上限（字节）
+DERIVATIVE_CACHE_MAX_BYTES = 1024 ** 3
+# 缩放与编码的工作线程数
+DERIVATIVE_WORKERS = max(2, (os.cpu_count() or 2) // 2)
+# 请求的宽度会向上取整到该步长的倍数，并限制在范围内，以提高缓存命中率
+DERIVATIVE_WIDTH_STEP = 160
+DERIVATIVE_MIN_WIDTH = 320
+DERIVATIVE_MAX_WIDTH = 3840
+# 未指定格式时缩放结果使用的格式 (webp/jpeg/avif) 与编码质量
+DERIVATIVE_DEFAULT_FORMAT = 'webp'
+DERIVATIVE_QUALITY = 85
+
+# --- 页面请求调度配置 ---
+# 同时读取/发送页面的请求数上限，其余请求按优先级排队
+PAGE_SCHEDULER_MAX_ACTIVE = 4
+# 读者位置超过某页这么多页后，该页仍在排队的请求会被取消
+PAGE_SCHEDULER_CANCEL_BEHIND = 3
+# 排队等待名额的最长时间（秒），超时的请求返回 503，由客户端稍后重试
+PAGE_SCHEDULER_ACQUIRE_TIMEOUT_S = 30
+# RAR 页面请求等待整卷解压的最长时间（秒）；等待解压时不占用名额
+RAR_PAGE_WAIT_TIMEOUT_S = 120
+
+# --- 预读配置 ---
+# 根据阅读进度在后台预热当前位置之后的页数（设为 0 可关闭）
+PREFETCH_PAGES_AHEAD = 6
+# 距离末尾不超过该页数时，预热同目录下一卷的前几页
+PREFETCH_NEXT_VOLUME_THRESHOLD = 5
+PREFETCH_NEXT_VOLUME_PAGES = 3
+# 预热使用的后台线程数
+PREFETCH_WORKERS = 2
+# 预热等待调度名额的最长时间（秒），超时则跳过该页，也让退出时不必久等
+PREFETCH_ACQUIRE_TIMEOUT_S = 2
 
 # --- 配置管理函数 ---
 def get_config():
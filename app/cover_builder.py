@@ -0,0 +1,110 @@
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future
+
+import config
+import covers
+import database
+import scanner
+
+_COVER_FILENAME = re.compile(r'^([0-9a-f]{40})(\.[a-z]+)$')
+
+# --- 按需生成封面 ---
+class CoverBuilder:
+    """
+    封面文件在第一次被请求时才生成：covers/<尺寸>/<哈希><扩展名> 不存在时，
+    从引用该哈希的漫画中读取第一页并只生成这一个尺寸。
+    同一文件的并发请求只生成一次，其余请求等待同一结果 (single-flight)；
+    同时进行的生成数不超过 max_concurrent，避免书架首次加载时占满 CPU。
+    """
+    def __init__(self, max_concurrent):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrent))
+        self.builds = 0
+        self.coalesced = 0
+        self.failures = 0
+        self.total_build_ms = 0.0
+        self.max_build_ms = 0.0
+
+    def ensure(self, size_name, filename):
+        """生成 covers/<size_name>/<filename>，成功（或文件已存在）时返回 True。"""
+        match = _COVER_FILENAME.match(filename)
+        if size_name not in config.COVER_SIZES or not match:
+            return False
+        key = (size_name, filename)
+        with self._lock:
+            future = self._pending.get(key)
+            building = future is None
+            if building:
+                future = self._pending[key] = Future()
+            else:
+                self.coalesced += 1
+        if not building:
+            return future.result()
+
+        try:
+            with self._slots:
+                built = self._build(size_name, match.group(1), match.group(2))
+        except BaseException as e:
+            with self._lock:
+                self._pending.pop(key, None)
+                self.failures += 1
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._pending.pop(key, None)
+            if not built:
+                self.failures += 1
+        future.set_result(built)
+        return built
+
+    def _build(self, size_name, cover_hash, ext):
+        # 等待期间其他请求可能已经生成了同一文件
+        if os.path.exists(os.path.join(config.COVERS_DIRECTORY, size_name, cover_hash + ext)):
+            return True
+        fmt = covers.format_for_extension(ext)
+        if fmt is None:
+            return False
+        conn = database.get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM covers WHERE hash = ? AND ext = ?", (cover_hash, ext))
+            if cursor.fetchone() is None:
+                return False
+            cursor.execute("SELECT title, local_path FROM comics WHERE cover_hash = ? AND local_path IS NOT NULL", (cover_hash,))
+            sources = cursor.fetchall()
+        finally:
+            conn.close()
+
+        started = time.perf_counter()
+        for source in sources:
+            image_data = scanner.get_first_image(source['local_path'])
+            # 压缩包在登记后被替换过时，第一页已不是这个哈希对应的图片
+            if not image_data or covers.content_hash(image_data) != cover_hash:
+                continue
+            if covers.generate_covers(source['title'], image_data, cover_hash, config.COVERS_DIRECTORY, [size_name], fmt) is None:
+                return False
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self.builds += 1
+                self.total_build_ms += elapsed_ms
+                self.max_build_ms = max(self.max_build_ms, elapsed_ms)
+            return True
+        return False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "building": len(self._pending),
+                "builds": self.builds,
+                "coalesced": self.coalesced,
+                "failures": self.failures,
+                "avg_build_ms": round(self.total_build_ms / self.builds, 2) if self.builds else 0.0,
+                "max_build_ms": round(self.max_build_ms, 2)
+            }
+
+
+cover_builder = CoverBuilder(config.COVER_LAZY_MAX_CONCURRENT)
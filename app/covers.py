@@ -0,0 +1,176 @@
+import io
+import os
+import time
+import hashlib
+from PIL import Image
+
+import config
+import page_derivatives
+
+# 格式名 -> (Pillow 格式, 扩展名)
+_COVER_FORMATS = {
+    'jpeg': ('JPEG', '.jpg'),
+    'webp': ('WEBP', '.webp')
+}
+
+def cover_format():
+    """配置的封面格式；Pillow 不支持 WebP 时退回 JPEG。"""
+    fmt = page_derivatives.normalize_format(config.COVER_FORMAT) or 'jpeg'
+    return fmt if fmt in _COVER_FORMATS else 'jpeg'
+
+def cover_extension(fmt=None):
+    return _COVER_FORMATS[fmt or cover_format()][1]
+
+def format_for_extension(ext):
+    """封面扩展名对应的格式名，未知扩展名返回 None。"""
+    return next((fmt for fmt, (_, known_ext) in _COVER_FORMATS.items() if known_ext == ext), None)
+
+# --- 内容寻址 ---
+# 封面文件以源图（第一页）字节的哈希命名：covers/<尺寸>/<哈希><扩展名>。
+# 同一源图的漫画共享同一组文件，改名或移动漫画不需要动文件；
+# covers 表记录每组文件及引用它的漫画数（由 comics.cover_hash 上的触发器维护）。
+# 登记的封面不一定已有文件：各尺寸在第一次被请求时才生成，见 cover_builder.py。
+def content_hash(image_data):
+    return hashlib.sha1(image_data).hexdigest()
+
+def cover_urls(cover_hash, ext):
+    """{尺寸名: 相对 URL}，即 comics.local_cover_path_* 中保存的值。"""
+    return {size_name: f"covers/{size_name}/{cover_hash}{ext}" for size_name in config.COVER_SIZES}
+
+def remove_legacy_covers(legacy_url, covers_directory):
+    """
+    删除旧版本按漫画名保存的封面。旧的文件名由 sanitize_filename 得到，不同的标题可能共用同一个文件，
+    无法确认其内容就是这本漫画的第一页，因此不改名沿用，改为按哈希登记后由 cover_builder 重新生成。
+    """
+    legacy_name = os.path.basename(legacy_url)
+    for size_name in config.COVER_SIZES:
+        try:
+            os.remove(os.path.join(covers_directory, size_name, legacy_name))
+        except OSError:
+            pass
+
+def assign_covers(cursor, assignments):
+    """
+    写线程中执行：把 (comic_id, cover_hash, ext) 登记到 covers 表并设置到漫画上，
+    引用计数由触发器随 comics.cover_hash 的变化增减。
+    漫画原先使用的旧版封面在改为按哈希登记之后，已没有漫画引用时才删除其文件。
+    """
+    legacy_urls = set()
+    for comic_id, _, _ in assignments:
+        cursor.execute(
+            "SELECT local_cover_path_thumbnail FROM comics WHERE id = ? AND cover_hash IS NULL",
+            (comic_id,)
+        )
+        row = cursor.fetchone()
+        if row and row['local_cover_path_thumbnail']:
+            legacy_urls.add(row['local_cover_path_thumbnail'])
+
+    now = time.time()
+    cursor.executemany(
+        "INSERT OR IGNORE INTO covers (hash, ext, released_at) VALUES (?, ?, ?)",
+        [(cover_hash, ext, now) for _, cover_hash, ext in assignments]
+    )
+    rows = []
+    for comic_id, cover_hash, ext in assignments:
+        urls = cover_urls(cover_hash, ext)
+        rows.append((cover_hash, urls['thumbnail'], urls['medium'], urls['large'], comic_id))
+    cursor.executemany("""
+        UPDATE comics SET cover_hash = ?,
+        local_cover_path_thumbnail = ?, local_cover_path_medium = ?, local_cover_path_large = ?
+        WHERE id = ?
+    """, rows)
+
+    for legacy_url in legacy_urls:
+        cursor.execute("SELECT 1 FROM comics WHERE local_cover_path_thumbnail = ? LIMIT 1", (legacy_url,))
+        if cursor.fetchone() is None:
+            remove_legacy_covers(legacy_url, config.COVERS_DIRECTORY)
+
+def collect_garbage(cursor, covers_directory, grace_s):
+    """
+    写线程中执行：删除引用数为 0 且已释放超过 grace_s 秒的封面及其文件，
+    只查询这些行，不遍历封面目录。返回 (删除的封面数, 删除的文件数)。
+    宽限期避免刚被扫描判定为可复用的封面在登记前被回收。
+    """
+    cursor.execute(
+        "SELECT hash, ext FROM covers WHERE ref_count <= 0 AND released_at <= ?",
+        (time.time() - grace_s,)
+    )
+    released = cursor.fetchall()
+    removed_files = 0
+    for row in released:
+        for size_name in config.COVER_SIZES:
+            try:
+                os.remove(os.path.join(covers_directory, size_name, row['hash'] + row['ext']))
+                removed_files += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"  - 无法删除封面 {row['hash']} ({size_name}): {e}")
+    cursor.executemany("DELETE FROM covers WHERE hash = ? AND ref_count <= 0", [(row['hash'],) for row in released])
+    return len(released), removed_files
+
+# --- 封面生成 ---
+def render_covers(image_data, fmt=None, quality=None, size_names=None):
+    """
+    把第一页图片缩放为 COVER_SIZES 中的各个尺寸（或其中的 size_names）并编码，返回 {尺寸名: 编码后的字节}。
+    JPEG 在解码时就按 1/2、1/4、1/8 缩小到不小于最大封面的尺寸，其他格式先用 reduce 粗缩；
+    各尺寸从大到小依次由上一级缩放得到，而不是每次都从原图缩放。
+    """
+    fmt = fmt or cover_format()
+    quality = quality or config.COVER_QUALITY
+    pil_format = _COVER_FORMATS[fmt][0]
+    sizes = sorted(
+        ((name, width) for name, width in config.COVER_SIZES.items() if size_names is None or name in size_names),
+        key=lambda item: item[1], reverse=True
+    )
+    if not sizes:
+        return {}
+
+    img = Image.open(io.BytesIO(image_data))
+    w, h = img.size
+    largest = sizes[0][1]
+    img.draft('RGB', (largest, max(1, int(largest * h / w))))
+    img = img.convert('RGB')
+
+    encoded = {}
+    for size_name, width in sizes:
+        # 高度按原图比例计算，与解码时缩小了多少无关
+        target_size = (width, max(1, int(width * h / w)))
+        img = img.resize(target_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        output = io.BytesIO()
+        if pil_format == 'JPEG':
+            img.save(output, pil_format, quality=quality, progressive=True, optimize=True)
+        else:
+            img.save(output, pil_format, quality=quality, method=4)
+        encoded[size_name] = output.getvalue()
+    return encoded
+
+def generate_covers(comic_name, image_data, cover_hash, covers_directory, size_names=None, fmt=None):
+    """
+    生成各尺寸（或 size_names 中的尺寸）的封面，以 cover_hash 命名写入 covers_directory，
+    全部成功时返回扩展名，否则返回 None；size_names 为空时不生成任何文件，只返回扩展名。
+    会在扫描的封面进程池中执行，因此只依赖参数和配置，不读取数据库。
+    文件先写入临时文件再改名，同一源图被并发生成时也不会读到写了一半的文件。
+    """
+    fmt = fmt or cover_format()
+    try:
+        encoded = render_covers(image_data, fmt, size_names=size_names)
+    except Exception as e:
+        print(f"  - 无法生成封面 {comic_name}: {e}")
+        return None
+
+    ext = cover_extension(fmt)
+    for size_name, data in encoded.items():
+        size_directory = os.path.join(covers_directory, size_name)
+        # 新增的尺寸没有经过扫描时的目录初始化
+        os.makedirs(size_directory, exist_ok=True)
+        output_path = os.path.join(size_directory, cover_hash + ext)
+        temp_path = f"{output_path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, output_path)
+        except OSError as e:
+            print(f"  - 无法保存封面 {comic_name} ({size_name}): {e}")
+            return None
+    return ext
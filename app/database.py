@@ -2,28 +2,390 @@ import sqlite3
 import os
 import json
 import time
+import threading
+
+import config
 
 # --- 数据库和文件路径定义 ---
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_FILE = os.path.join(APP_DIR, 'comics.db')
 
 # --- 数据库管理 ---
+class PooledConnection(sqlite3.Connection):
+    """
+    由连接池管理的连接。close() 不会真正关闭连接，而是回滚未提交的事务后放回连接池，
+    因此调用方仍按 "获取 -> 使用 -> close()" 的方式使用即可。
+    """
+    pool = None
+    idle = False
+
+    def close(self):
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.release(self)
+
+
+class ConnectionPool:
+    """
+    SQLite 连接池。新连接统一设置增量 auto_vacuum、WAL、synchronous=NORMAL、mmap、页缓存、
+    外键约束和忙等待超时；空闲连接最多保留 max_idle 个，多出的直接关闭。
+    """
+    def __init__(self, max_idle):
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle = []
+        self.created = 0
+        self.reused = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            DB_FILE, timeout=config.DB_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False, factory=PooledConnection
+        )
+        # 新建的数据库使用增量 auto_vacuum，由定期维护回收空闲页，必须在切换 WAL 之前设置；
+        # 已有数据库上不生效，在首次维护时通过一次完整的 VACUUM 切换
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        # WAL 模式下读不阻塞写、写不阻塞读，设置后保存在数据库文件中
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA busy_timeout = {int(config.DB_BUSY_TIMEOUT_MS)}")
+        conn.execute(f"PRAGMA mmap_size = {int(config.DB_MMAP_SIZE)}")
+        conn.execute(f"PRAGMA cache_size = -{int(config.DB_CACHE_SIZE_KB)}")
+        conn.execute("PRAGMA foreign_keys = ON")
+        # 让 INSERT OR REPLACE 删除旧行时也触发删除触发器，摘要、搜索索引和计数才不会漂移
+        conn.execute("PRAGMA recursive_triggers = ON")
+        conn.pool = self
+        with self._lock:
+            self.created += 1
+        return conn
+
+    def acquire(self):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+            if conn is not None:
+                self.reused += 1
+        if conn is None:
+            conn = self._connect()
+        conn.idle = False
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def release(self, conn):
+        if conn.idle:
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            sqlite3.Connection.close(conn)
+            return
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                conn.idle = True
+                self._idle.append(conn)
+                return
+        sqlite3.Connection.close(conn)
+
+    def close_all(self):
+        """关闭所有空闲连接（程序退出时调用）。"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            sqlite3.Connection.close(conn)
+
+    def stats(self):
+        with self._lock:
+            return {"idle": len(self._idle), "max_idle": self.max_idle, "created": self.created, "reused": self.reused}
+
+
+connection_pool = ConnectionPool(config.DB_POOL_MAX_IDLE)
+
 def get_db_connection():
-    """创建并返回一个数据库连接，并设置 row_factory 以便按列名访问。"""
-    conn = sqlite3.connect(DB_FILE, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """从连接池取得一个连接，row_factory 为 sqlite3.Row 以便按列名访问。用完后调用 close() 归还。"""
+    return connection_pool.acquire()
 
 # --- 数据库初始化 ---
+def _add_missing_columns(cursor, table, columns):
+    """为已存在的表添加缺失的列，用于升级旧版本创建的数据库。返回新添加的列名列表。"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    existing = {row['name'] for row in cursor.fetchall()}
+    added = []
+    for name, column_type in columns.items():
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+            print(f"已为表 {table} 添加列 {name}。")
+            added.append(name)
+    return added
+
+# --- 漫画摘要列 ---
+# comics.effective_tags: 有效标签 (source ∪ added − removed)，按名称排序后以逗号连接
+# comics.folder_names: 所属文件夹名称，按名称排序后以逗号连接
+# 两列由下面的触发器在标签/文件夹关系变化时维护，列表查询无需再连接四张表。
+def _effective_tags_sql(comic_id):
+    return f"""(SELECT GROUP_CONCAT(name, ',') FROM (
+        SELECT DISTINCT t.name FROM comic_tags ct JOIN tags t ON t.id = ct.tag_id
+        WHERE ct.comic_id = {comic_id} AND ct.type IN ('source', 'added')
+            AND NOT EXISTS (SELECT 1 FROM comic_tags r WHERE r.comic_id = {comic_id} AND r.tag_id = ct.tag_id AND r.type = 'removed')
+        ORDER BY t.name))"""
+
+def _folder_names_sql(comic_id):
+    return f"""(SELECT GROUP_CONCAT(name, ',') FROM (
+        SELECT DISTINCT f.name FROM comic_folders cf JOIN folders f ON f.id = cf.folder_id
+        WHERE cf.comic_id = {comic_id}
+        ORDER BY f.name))"""
+
+def _summary_triggers():
+    """返回 (触发器名, 触发时机, 语句) 列表。"""
+    def refresh_tags(comic_id):
+        return f"UPDATE comics SET effective_tags = {_effective_tags_sql(comic_id)} WHERE id = {comic_id};"
+
+    def refresh_folders(comic_id):
+        return f"UPDATE comics SET folder_names = {_folder_names_sql(comic_id)} WHERE id = {comic_id};"
+
+    def refresh_tags_of(tag_id):
+        return f"""UPDATE comics SET effective_tags = {_effective_tags_sql('comics.id')}
+            WHERE id IN (SELECT comic_id FROM comic_tags WHERE tag_id = {tag_id});"""
+
+    def refresh_folders_of(folder_id):
+        return f"""UPDATE comics SET folder_names = {_folder_names_sql('comics.id')}
+            WHERE id IN (SELECT comic_id FROM comic_folders WHERE folder_id = {folder_id});"""
+
+    return [
+        ('trg_comic_tags_insert_summary', 'AFTER INSERT ON comic_tags', refresh_tags('NEW.comic_id')),
+        ('trg_comic_tags_delete_summary', 'AFTER DELETE ON comic_tags', refresh_tags('OLD.comic_id')),
+        ('trg_comic_tags_update_summary', 'AFTER UPDATE ON comic_tags', refresh_tags('OLD.comic_id') + refresh_tags('NEW.comic_id')),
+        ('trg_tags_rename_summary', 'AFTER UPDATE OF name ON tags', refresh_tags_of('NEW.id')),
+        ('trg_tags_delete_summary', 'AFTER DELETE ON tags', refresh_tags_of('OLD.id')),
+        ('trg_comic_folders_insert_summary', 'AFTER INSERT ON comic_folders', refresh_folders('NEW.comic_id')),
+        ('trg_comic_folders_delete_summary', 'AFTER DELETE ON comic_folders', refresh_folders('OLD.comic_id')),
+        ('trg_comic_folders_update_summary', 'AFTER UPDATE ON comic_folders', refresh_folders('OLD.comic_id') + refresh_folders('NEW.comic_id')),
+        ('trg_folders_rename_summary', 'AFTER UPDATE OF name ON folders', refresh_folders_of('NEW.id')),
+        ('trg_folders_delete_summary', 'AFTER DELETE ON folders', refresh_folders_of('OLD.id')),
+    ]
+
+def _create_summary_triggers(cursor):
+    """每次启动都重建触发器，使旧数据库也能用上最新的定义。"""
+    for name, timing, body in _summary_triggers():
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(f"CREATE TRIGGER {name} {timing} BEGIN {body} END")
+
+# --- 全文搜索索引 ---
+# comic_search 是以 comics.id 为行号的 FTS5 表，索引 title、displayName 和有效标签。
+# 使用 trigram 分词器按三字组建立索引，中日文标题无需分词也能做子串匹配。
+# SQLite 未编译 FTS5 或不支持 trigram 时该表不存在，搜索退回 LIKE。
+SEARCH_INDEX_AVAILABLE = False
+
+# bm25 权重：标题、显示名称、标签
+SEARCH_RANK_WEIGHTS = (10.0, 10.0, 2.0)
+
+_SEARCH_TRIGGERS = [
+    # 插入前先清掉可能残留的同一行号，索引与 comics 不同步时也不会插入重复行
+    ('trg_comics_insert_search', 'AFTER INSERT ON comics', """
+        DELETE FROM comic_search WHERE rowid = NEW.id;
+        INSERT INTO comic_search (rowid, title, displayName, tags) VALUES (NEW.id, NEW.title, NEW.displayName, NEW.effective_tags);"""),
+    ('trg_comics_update_search', 'AFTER UPDATE OF title, displayName, effective_tags ON comics', """
+        UPDATE comic_search SET title = NEW.title, displayName = NEW.displayName, tags = NEW.effective_tags WHERE rowid = NEW.id;"""),
+    ('trg_comics_delete_search', 'AFTER DELETE ON comics', """
+        DELETE FROM comic_search WHERE rowid = OLD.id;"""),
+]
+
+def _create_search_index(cursor):
+    """创建全文搜索表和维护它的触发器，返回该表是否为新建。不支持时返回 None。"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'comic_search'")
+    created = cursor.fetchone() is None
+    try:
+        cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS comic_search USING fts5(title, displayName, tags, tokenize = 'trigram')")
+    except sqlite3.OperationalError as e:
+        print(f"当前 SQLite 不支持 FTS5 trigram 分词，搜索将使用 LIKE: {e}")
+        return None
+    weights = ', '.join(str(w) for w in SEARCH_RANK_WEIGHTS)
+    cursor.execute(f"INSERT INTO comic_search (comic_search, rank) VALUES ('rank', 'bm25({weights})')")
+    for name, timing, body in _SEARCH_TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(f"CREATE TRIGGER {name} {timing} BEGIN {body} END")
+    return created
+
+def rebuild_search_index(cursor):
+    """根据 comics 表重新生成全文搜索索引。"""
+    if not SEARCH_INDEX_AVAILABLE:
+        return
+    cursor.execute("DELETE FROM comic_search")
+    cursor.execute("INSERT INTO comic_search (rowid, title, displayName, tags) SELECT id, title, displayName, effective_tags FROM comics")
+
+# --- 书架计数 ---
+# library_counters 保存每个筛选条件下的漫画数量，folders.comic_count 保存每个文件夹的漫画数量，
+# 均由触发器随写入增量维护，统计接口和无搜索词时的列表总数只需读取一行。
+LIBRARY_FILTERS = {
+    'all': "1",
+    'favorites': "{row}.is_favorite = 1",
+    'web': "{row}.online_url IS NOT NULL",
+    'downloaded': "{row}.local_path IS NOT NULL",
+    'undownloaded': "{row}.online_url IS NOT NULL AND {row}.local_path IS NULL"
+}
+
+def _counter_delta_sql(*terms):
+    """terms 为 (符号, 行别名)，生成按筛选条件累加各行贡献的 CASE 表达式。"""
+    cases = []
+    for name, condition in LIBRARY_FILTERS.items():
+        delta = ' '.join(f"{sign} ({condition.format(row=row)})" for sign, row in terms)
+        cases.append(f"WHEN '{name}' THEN {delta}")
+    return f"UPDATE library_counters SET value = value + CASE name {' '.join(cases)} ELSE 0 END;"
+
+_COUNTER_TRIGGERS = [
+    ('trg_comics_insert_counters', 'AFTER INSERT ON comics', _counter_delta_sql(('+', 'NEW'))),
+    ('trg_comics_delete_counters', 'AFTER DELETE ON comics', _counter_delta_sql(('-', 'OLD'))),
+    ('trg_comics_update_counters', 'AFTER UPDATE OF is_favorite, online_url, local_path ON comics', _counter_delta_sql(('+', 'NEW'), ('-', 'OLD'))),
+    ('trg_comic_folders_insert_counters', 'AFTER INSERT ON comic_folders',
+        "UPDATE folders SET comic_count = comic_count + 1 WHERE id = NEW.folder_id;"),
+    ('trg_comic_folders_delete_counters', 'AFTER DELETE ON comic_folders',
+        "UPDATE folders SET comic_count = comic_count - 1 WHERE id = OLD.folder_id;"),
+    ('trg_comic_folders_update_counters', 'AFTER UPDATE OF folder_id ON comic_folders',
+        "UPDATE folders SET comic_count = comic_count - 1 WHERE id = OLD.folder_id; UPDATE folders SET comic_count = comic_count + 1 WHERE id = NEW.folder_id;"),
+]
+
+# 封面引用计数，见 covers.py；计数归零时记下时间，供回收时判断宽限期
+_RELEASE_COVER_SQL = (
+    "UPDATE covers SET ref_count = ref_count - 1, "
+    "released_at = CASE WHEN ref_count <= 1 THEN (julianday('now') - 2440587.5) * 86400.0 ELSE released_at END "
+    "WHERE hash = OLD.cover_hash;"
+)
+_RETAIN_COVER_SQL = "UPDATE covers SET ref_count = ref_count + 1, released_at = NULL WHERE hash = NEW.cover_hash;"
+
+_COVER_TRIGGERS = [
+    ('trg_comics_insert_cover_ref', 'AFTER INSERT ON comics WHEN NEW.cover_hash IS NOT NULL', _RETAIN_COVER_SQL),
+    ('trg_comics_delete_cover_ref', 'AFTER DELETE ON comics WHEN OLD.cover_hash IS NOT NULL', _RELEASE_COVER_SQL),
+    ('trg_comics_update_cover_ref', 'AFTER UPDATE OF cover_hash ON comics WHEN OLD.cover_hash IS NOT NEW.cover_hash',
+        _RELEASE_COVER_SQL + ' ' + _RETAIN_COVER_SQL),
+]
+
+def rebuild_library_counters(cursor):
+    """按当前数据重新统计所有计数。"""
+    for name, condition in LIBRARY_FILTERS.items():
+        cursor.execute(
+            f"INSERT OR REPLACE INTO library_counters (name, value) SELECT ?, COUNT(*) FROM comics c WHERE {condition.format(row='c')}",
+            (name,)
+        )
+    cursor.execute("UPDATE folders SET comic_count = (SELECT COUNT(*) FROM comic_folders cf WHERE cf.folder_id = folders.id)")
+
+def get_library_counters(cursor):
+    """返回 (筛选条件 -> 数量, 文件夹名称 -> 数量)；文件夹只包含至少有一本漫画的。"""
+    cursor.execute("SELECT name, value FROM library_counters")
+    counters = {row['name']: row['value'] for row in cursor.fetchall()}
+    cursor.execute("SELECT name, comic_count FROM folders WHERE comic_count > 0")
+    folders = {row['name']: row['comic_count'] for row in cursor.fetchall()}
+    return counters, folders
+
+def count_for_filter(cursor, filter_by):
+    """读取某个筛选条件（或文件夹名称）下的漫画数量。"""
+    if filter_by in LIBRARY_FILTERS:
+        cursor.execute("SELECT value FROM library_counters WHERE name = ?", (filter_by,))
+    else:
+        cursor.execute("SELECT comic_count FROM folders WHERE name = ?", (filter_by,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+def rebuild_comic_summary(cursor):
+    """根据标签和文件夹关系重新计算所有漫画的摘要列。"""
+    cursor.execute(f"UPDATE comics SET effective_tags = {_effective_tags_sql('comics.id')}, folder_names = {_folder_names_sql('comics.id')}")
+
+def _column_definition(column):
+    """由 PRAGMA table_info 的一行还原列定义。"""
+    definition = f"{column['name']} {column['type']}".strip()
+    if column['notnull']:
+        definition += " NOT NULL"
+    if column['dflt_value'] is not None:
+        definition += f" DEFAULT {column['dflt_value']}"
+    return definition
+
+def _migrate_to_comic_ids(conn):
+    """
+    把以 title 为主键的旧数据库迁移为整数 comic_id 主键，title 改为唯一约束。
+    comics 的 id 沿用旧的 rowid；关联表改为以 comic_id 引用漫画，
+    找不到对应漫画的残留行在迁移时丢弃。
+    按 SQLite 推荐的方式在关闭外键约束的情况下重建表，迁移后检查外键一致性。
+    返回是否执行了迁移。
+    """
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_info(comics)")
+    columns = cursor.fetchall()
+    if not columns or any(column['name'] == 'id' for column in columns):
+        return False
+
+    print("正在把漫画主键迁移为整数 comic_id...")
+    cursor.execute("PRAGMA foreign_keys = OFF")
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        # 旧触发器引用 comic_title，迁移后由 init_db 按新定义重建
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        for row in cursor.fetchall():
+            cursor.execute(f"DROP TRIGGER IF EXISTS {row['name']}")
+
+        other_columns = [column for column in columns if column['name'] != 'title']
+        column_names = ', '.join(column['name'] for column in other_columns)
+        cursor.execute(f"""
+            CREATE TABLE comics_migrated (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL UNIQUE,
+                {', '.join(_column_definition(column) for column in other_columns)}
+            )
+        """)
+        cursor.execute(f"INSERT INTO comics_migrated (id, title, {column_names}) SELECT rowid, title, {column_names} FROM comics")
+
+        for table, key_columns in (('comic_tags', ['tag_id', 'type']), ('comic_folders', ['folder_id']), ('comic_pages', ['page_index'])):
+            cursor.execute(f"PRAGMA table_info({table})")
+            child_columns = [column for column in cursor.fetchall() if column['name'] != 'comic_title']
+            if not child_columns:
+                continue
+            references = ''.join(
+                f", FOREIGN KEY ({column}) REFERENCES {parent} (id) ON DELETE CASCADE"
+                for column, parent in (('tag_id', 'tags'), ('folder_id', 'folders')) if column in key_columns
+            )
+            child_names = ', '.join(column['name'] for column in child_columns)
+            cursor.execute(f"""
+                CREATE TABLE {table}_migrated (
+                    comic_id INTEGER NOT NULL,
+                    {', '.join(_column_definition(column) for column in child_columns)},
+                    PRIMARY KEY (comic_id, {', '.join(key_columns)}),
+                    FOREIGN KEY (comic_id) REFERENCES comics (id) ON DELETE CASCADE{references}
+                )
+            """)
+            cursor.execute(f"""
+                INSERT OR IGNORE INTO {table}_migrated (comic_id, {child_names})
+                SELECT c.id, {', '.join('o.' + column['name'] for column in child_columns)}
+                FROM {table} o JOIN comics_migrated c ON c.title = o.comic_title
+            """)
+            cursor.execute(f"DROP TABLE {table}")
+            cursor.execute(f"ALTER TABLE {table}_migrated RENAME TO {table}")
+
+        cursor.execute("DROP TABLE comics")
+        cursor.execute("ALTER TABLE comics_migrated RENAME TO comics")
+        cursor.execute("PRAGMA foreign_key_check")
+        problems = cursor.fetchall()
+        if problems:
+            raise sqlite3.IntegrityError(f"迁移后外键检查失败: {len(problems)} 行")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.execute("PRAGMA foreign_keys = ON")
+    print("漫画主键迁移完成。")
+    return True
+
 def init_db():
     """初始化数据库，创建表和索引（如果不存在）。"""
     conn = get_db_connection()
     cursor = conn.cursor()
 
+    # 旧版本以 title 为主键，先迁移为整数 comic_id
+    migrated = _migrate_to_comic_ids(conn)
+
     # 创建表
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS comics (
-        title TEXT PRIMARY KEY,
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL UNIQUE,
         displayName TEXT,
         is_favorite INTEGER DEFAULT 0,
         currentPage INTEGER DEFAULT 0,
@@ -58,35 +420,131 @@ def init_db():
 
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS comic_folders (
-        comic_title TEXT,
+        comic_id INTEGER NOT NULL,
         folder_id INTEGER,
-        PRIMARY KEY (comic_title, folder_id),
-        FOREIGN KEY (comic_title) REFERENCES comics (title) ON DELETE CASCADE,
+        PRIMARY KEY (comic_id, folder_id),
+        FOREIGN KEY (comic_id) REFERENCES comics (id) ON DELETE CASCADE,
         FOREIGN KEY (folder_id) REFERENCES folders (id) ON DELETE CASCADE
     )
     """)
 
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS comic_tags (
-        comic_title TEXT,
+        comic_id INTEGER NOT NULL,
         tag_id INTEGER,
         type TEXT,
-        PRIMARY KEY (comic_title, tag_id, type),
-        FOREIGN KEY (comic_title) REFERENCES comics (title) ON DELETE CASCADE,
+        PRIMARY KEY (comic_id, tag_id, type),
+        FOREIGN KEY (comic_id) REFERENCES comics (id) ON DELETE CASCADE,
         FOREIGN KEY (tag_id) REFERENCES tags (id) ON DELETE CASCADE
     )
     """)
 
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS comic_pages (
+        comic_id INTEGER NOT NULL,
+        page_index INTEGER,
+        entry_name TEXT NOT NULL,
+        header_offset INTEGER,
+        compress_size INTEGER,
+        file_size INTEGER,
+        compress_type INTEGER,
+        crc INTEGER,
+        width INTEGER,
+        height INTEGER,
+        PRIMARY KEY (comic_id, page_index),
+        FOREIGN KEY (comic_id) REFERENCES comics (id) ON DELETE CASCADE
+    )
+    """)
+
+    # 增量扫描使用的文件和目录索引，见 scanner._walk_directory
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS file_index (
+        path TEXT PRIMARY KEY,
+        dir TEXT NOT NULL,
+        size INTEGER,
+        mtime_ns INTEGER,
+        inode INTEGER
+    ) WITHOUT ROWID
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS dir_index (
+        path TEXT PRIMARY KEY,
+        parent TEXT,
+        mtime_ns INTEGER
+    ) WITHOUT ROWID
+    """)
+
+    # 内容寻址的封面文件，hash 为源图哈希，ref_count 为 cover_hash 指向它的漫画数
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS covers (
+        hash TEXT PRIMARY KEY,
+        ext TEXT NOT NULL,
+        ref_count INTEGER NOT NULL DEFAULT 0,
+        released_at REAL
+    ) WITHOUT ROWID
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS library_counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+
+    # 为旧数据库补齐新增的列
+    comics_added = _add_missing_columns(cursor, 'comics', {
+        'archive_mtime_ns': 'INTEGER',
+        'archive_size': 'INTEGER',
+        'effective_tags': 'TEXT',
+        'folder_names': 'TEXT',
+        'cover_hash': 'TEXT'
+    })
+    folders_added = _add_missing_columns(cursor, 'folders', {
+        'comic_count': 'INTEGER NOT NULL DEFAULT 0'
+    })
+    _add_missing_columns(cursor, 'comic_pages', {
+        'width': 'INTEGER',
+        'height': 'INTEGER'
+    })
+
     # 创建索引以提高查询性能
     print("正在检查并创建数据库索引...")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_comics_date_added ON comics (date_added)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_comics_displayName ON comics (displayName)")
+    # 排序列与 id 组成的复合索引同时服务于排序和游标分页的范围条件，取代旧的单列索引
+    for old_index in ('idx_comics_date_added', 'idx_comics_displayName', 'idx_comics_date_added_title', 'idx_comics_displayName_title'):
+        cursor.execute(f"DROP INDEX IF EXISTS {old_index}")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_comics_date_added_id ON comics (date_added, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_comics_displayName_id ON comics (displayName, id)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_comics_is_favorite ON comics (is_favorite)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_comics_local_path ON comics (local_path)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_comic_tags_comic_title ON comic_tags (comic_title)")
+    # 关联表的主键以 comic_id 开头，按漫画查找无需额外索引；这里只需反向查找的索引
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_comic_tags_tag_id ON comic_tags (tag_id)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_comic_folders_comic_title ON comic_folders (comic_title)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_comic_folders_folder_id ON comic_folders (folder_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_file_index_dir ON file_index (dir)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_covers_released ON covers (released_at) WHERE ref_count <= 0")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_comics_cover_hash ON comics (cover_hash)")
+
+    # 维护标签/文件夹摘要列；刚添加这两列的旧数据库需要先回填一次
+    _create_summary_triggers(cursor)
+    if 'effective_tags' in comics_added:
+        print("正在生成漫画的标签/文件夹摘要...")
+        rebuild_comic_summary(cursor)
+
+    # 全文搜索索引依赖摘要列，需在其之后建立
+    global SEARCH_INDEX_AVAILABLE
+    search_index_created = _create_search_index(cursor)
+    SEARCH_INDEX_AVAILABLE = search_index_created is not None
+    if search_index_created or migrated:
+        print("正在建立全文搜索索引...")
+        rebuild_search_index(cursor)
+
+    for name, timing, body in _COUNTER_TRIGGERS + _COVER_TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(f"CREATE TRIGGER {name} {timing} BEGIN {body} END")
+    cursor.execute("SELECT COUNT(*) FROM library_counters")
+    if folders_added or cursor.fetchone()[0] != len(LIBRARY_FILTERS):
+        print("正在统计书架计数...")
+        rebuild_library_counters(cursor)
     
     conn.commit()
     conn.close()
@@ -130,32 +588,34 @@ def load_unified_comics():
 
         # 预加载所有标签和文件夹关系以提高效率
         c.execute("""
-            SELECT ct.comic_title, t.name, ct.type 
+            SELECT ct.comic_id, t.name, ct.type 
             FROM comic_tags ct JOIN tags t ON ct.tag_id = t.id
         """)
         tags_rows = c.fetchall()
         tags_map = {}
         for row in tags_rows:
-            if row['comic_title'] not in tags_map:
-                tags_map[row['comic_title']] = {'source': [], 'added': [], 'removed': []}
-            tags_map[row['comic_title']][row['type']].append(row['name'])
+            if row['comic_id'] not in tags_map:
+                tags_map[row['comic_id']] = {'source': [], 'added': [], 'removed': []}
+            tags_map[row['comic_id']][row['type']].append(row['name'])
 
         c.execute("""
-            SELECT cf.comic_title, f.name 
+            SELECT cf.comic_id, f.name 
             FROM comic_folders cf JOIN folders f ON cf.folder_id = f.id
         """)
         folders_rows = c.fetchall()
         comic_folders_map = {}
         for row in folders_rows:
-            if row['comic_title'] not in comic_folders_map:
-                comic_folders_map[row['comic_title']] = []
-            comic_folders_map[row['comic_title']].append(row['name'])
+            if row['comic_id'] not in comic_folders_map:
+                comic_folders_map[row['comic_id']] = []
+            comic_folders_map[row['comic_id']].append(row['name'])
 
         conn.close()
 
         for row in comics_rows:
             title = row['title']
+            comic_id = row['id']
             comics_map[title] = {
+                "id": comic_id,
                 "title": title,
                 "displayName": row['displayName'],
                 "is_favorite": bool(row['is_favorite']),
@@ -175,10 +635,10 @@ def load_unified_comics():
                     "url": row['online_url'],
                     "cover_url": row['online_cover_url']
                 } if row['online_url'] else None,
-                "source_tags": tags_map.get(title, {}).get('source', []),
-                "added_tags": tags_map.get(title, {}).get('added', []),
-                "removed_tags": tags_map.get(title, {}).get('removed', []),
-                "folders": comic_folders_map.get(title, [])
+                "source_tags": tags_map.get(comic_id, {}).get('source', []),
+                "added_tags": tags_map.get(comic_id, {}).get('added', []),
+                "removed_tags": tags_map.get(comic_id, {}).get('removed', []),
+                "folders": comic_folders_map.get(comic_id, [])
             }
         return comics_map
     except Exception as e:
@@ -0,0 +1,215 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import config
+import database
+
+_STOP = object()
+
+class _Standalone:
+    """标记必须在事务之外单独执行的写操作（如 VACUUM）。"""
+    def __init__(self, operation):
+        self.operation = operation
+
+# --- 单写线程 ---
+class DatabaseWriter:
+    """
+    所有数据库写操作都交给同一个后台线程执行。
+    调用方提交 operation(cursor, *args)，得到一个 Future；写线程把一个批处理窗口内
+    排队的操作合并进同一个事务提交，每个操作在各自的 SAVEPOINT 中执行，
+    某个操作出错只回滚它自己，不影响同批的其他操作。
+    读请求继续使用连接池中的连接，在 WAL 模式下不会被写事务阻塞。
+    每次提交了写操作的事务都会让书库版本号 generation 加一，供读缓存判断是否过期。
+    """
+    def __init__(self, batch_window_ms, max_batch):
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._cursor = None
+        self._carry = None
+        self.submitted = 0
+        self.committed = 0
+        self.failed = 0
+        self.batches = 0
+        self.batched_operations = 0
+        self.max_batch_seen = 0
+        self.commit_failures = 0
+        self.total_commit_ms = 0.0
+        self.generation = 0
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, operation, *args):
+        """排队一个写操作，返回在其所在事务提交后完成的 Future。"""
+        future = Future()
+        if threading.current_thread() is self._thread:
+            # 写操作内部再提交写操作时直接在当前事务中执行，避免自己等待自己
+            try:
+                future.set_result(operation(self._cursor, *args))
+            except BaseException as e:
+                future.set_exception(e)
+            return future
+        self._ensure_started()
+        with self._lock:
+            self.submitted += 1
+        self._queue.put((operation, args, future))
+        return future
+
+    def run(self, operation, *args):
+        """提交写操作并等待其提交完成，返回操作的返回值或抛出其异常。"""
+        return self.submit(operation, *args).result()
+
+    def run_standalone(self, operation, *args):
+        """
+        在写线程上、任何事务之外执行 operation(cursor, *args) 并等待结果，
+        用于 VACUUM、incremental_vacuum 和 wal_checkpoint 这类不能放在事务中的语句。
+        它与其他写操作排在同一队列里，执行期间不会有别的写事务。
+        """
+        return self.submit(_Standalone(operation), *args).result()
+
+    def _run(self):
+        conn = database.get_db_connection()
+        self._cursor = conn.cursor()
+        try:
+            while True:
+                item, self._carry = self._carry or self._queue.get(), None
+                if item is _STOP:
+                    return
+                if isinstance(item[0], _Standalone):
+                    self._apply_standalone(item)
+                    continue
+                batch = [item]
+                stopping = False
+                deadline = time.monotonic() + self.batch_window
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    if isinstance(item[0], _Standalone):
+                        # 先提交已收集的这一批，再单独执行
+                        self._carry = item
+                        break
+                    batch.append(item)
+                self._apply(conn, batch)
+                if stopping:
+                    return
+        finally:
+            conn.close()
+
+    def _apply_standalone(self, item):
+        standalone, args, future = item
+        if not future.set_running_or_notify_cancel():
+            return
+        conn = self._cursor.connection
+        try:
+            result = standalone.operation(self._cursor, *args)
+            if conn.in_transaction:
+                conn.commit()
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            with self._lock:
+                self.failed += 1
+            future.set_exception(e)
+            return
+        with self._lock:
+            self.committed += 1
+            self.generation += 1
+        future.set_result(result)
+
+    def _apply(self, conn, batch):
+        """在一个事务中依次执行一批写操作，提交后再完成各自的 Future。"""
+        cursor = self._cursor
+        outcomes = []
+        started = time.perf_counter()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            for operation, args, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                cursor.execute("SAVEPOINT write_op")
+                try:
+                    result = operation(cursor, *args)
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO write_op")
+                    cursor.execute("RELEASE write_op")
+                    outcomes.append((future, None, e))
+                else:
+                    cursor.execute("RELEASE write_op")
+                    outcomes.append((future, result, None))
+            conn.commit()
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            print(f"[DB Writer] 批量写入 {len(batch)} 个操作的事务失败: {e}")
+            with self._lock:
+                self.commit_failures += 1
+                self.failed += len(batch)
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.batches += 1
+            self.batched_operations += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            self.total_commit_ms += elapsed_ms
+            for _, _, error in outcomes:
+                if error is None:
+                    self.committed += 1
+                else:
+                    self.failed += 1
+            if any(error is None for _, _, error in outcomes):
+                self.generation += 1
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def bump_generation(self):
+        """不经过写线程、但会改变读取结果的修改（如缓冲中的阅读进度）调用此方法让读缓存失效。"""
+        with self._lock:
+            self.generation += 1
+
+    def stop(self, timeout=10):
+        """写完队列中剩余的操作后停止写线程。"""
+        with self._lock:
+            thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "submitted": self.submitted,
+                "committed": self.committed,
+                "failed": self.failed,
+                "batches": self.batches,
+                "avg_batch_size": round(self.batched_operations / self.batches, 2) if self.batches else 0.0,
+                "max_batch_size": self.max_batch_seen,
+                "avg_transaction_ms": round(self.total_commit_ms / self.batches, 2) if self.batches else 0.0,
+                "commit_failures": self.commit_failures,
+                "generation": self.generation
+            }
+
+
+db_writer = DatabaseWriter(config.DB_WRITE_BATCH_WINDOW_MS, config.DB_WRITE_MAX_BATCH)
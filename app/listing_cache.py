@@ -0,0 +1,72 @@
+import threading
+from collections import OrderedDict
+
+import config
+
+# --- 漫画列表响应缓存 ---
+class ListingCache:
+    """
+    缓存 /api/comics 序列化后的响应体，键为规范化后的查询参数。
+    每个条目记录生成时的书库版本号 (db_writer.generation)，
+    任何写入都会让版本号前进，版本号不一致的条目在下次读取时丢弃。
+    """
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    def get(self, key, generation):
+        """返回 (响应体, ETag)；未缓存或已过期时返回 None。"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] != generation:
+                del self._entries[key]
+                self.stale += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key, generation, body, etag):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (generation, body, etag)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(len(entry[1]) for entry in self._entries.values()),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "stale": self.stale,
+                "not_modified": self.not_modified,
+                "evictions": self.evictions
+            }
+
+
+listing_cache = ListingCache(config.LISTING_CACHE_MAX_ENTRIES)
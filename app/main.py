@@ -6,6 +6,10 @@ from flask import Flask
 import database
 import scanner
 import watchdog_service
+from db_writer import db_writer
+from progress_buffer import progress_buffer
+from prefetcher import prefetcher
+from maintenance import maintenance
 from config import WEB_DIRECTORY
 from routes import bp
 
@@ -30,6 +34,9 @@ if __name__ == '__main__':
     # 启动文件系统监控
     observer = watchdog_service.start_file_monitoring()
 
+    # 启动数据库定期维护
+    maintenance.start()
+
     # 准备在浏览器中打开 URL
     url = "http://127.0.0.1:5000"
     threading.Timer(1.5, lambda: webbrowser.open_new(url)).start()
@@ -45,3 +52,9 @@ if __name__ == '__main__':
             observer.stop()
             observer.join()
             print("[Monitor] File system monitoring stopped.")
+        # 停止后台预热，避免退出时等待仍在排队的预热线程
+        prefetcher.stop()
+        # 先写完缓冲中的阅读进度和队列中剩余的写操作，再关闭连接
+        progress_buffer.stop()
+        db_writer.stop()
+        database.connection_pool.close_all()
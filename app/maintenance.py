@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+import traceback
+
+import config
+import covers
+import database
+from db_writer import db_writer
+
+# 清理孤立行的语句：(报告中的名称, SQL)
+_ORPHAN_SWEEPS = [
+    ("comic_tags", "DELETE FROM comic_tags WHERE comic_id NOT IN (SELECT id FROM comics) OR tag_id NOT IN (SELECT id FROM tags)"),
+    ("comic_folders", "DELETE FROM comic_folders WHERE comic_id NOT IN (SELECT id FROM comics) OR folder_id NOT IN (SELECT id FROM folders)"),
+    ("comic_pages", "DELETE FROM comic_pages WHERE comic_id NOT IN (SELECT id FROM comics)"),
+    ("comic_search", "DELETE FROM comic_search WHERE rowid NOT IN (SELECT id FROM comics)"),
+    ("tags", "DELETE FROM tags WHERE id NOT IN (SELECT tag_id FROM comic_tags)")
+]
+
+def _sweep_orphans(cursor):
+    removed = {}
+    for name, sql in _ORPHAN_SWEEPS:
+        if name == "comic_search" and not database.SEARCH_INDEX_AVAILABLE:
+            continue
+        cursor.execute(sql)
+        removed[name] = cursor.rowcount
+    return removed
+
+def _analyze(cursor):
+    cursor.execute("ANALYZE")
+    cursor.execute("PRAGMA optimize")
+
+def _vacuum(cursor, max_pages):
+    """
+    数据库已是增量 auto_vacuum 时回收空闲页（max_pages 为 0 表示全部回收）；
+    旧数据库需要先切换模式并执行一次完整的 VACUUM 才能生效。返回使用的方式。
+    """
+    cursor.execute("PRAGMA auto_vacuum")
+    if cursor.fetchone()[0] != 2:
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        cursor.execute("VACUUM")
+        return "full"
+    # incremental_vacuum 每回收一页返回一行，需要读完才会执行完毕
+    cursor.execute(f"PRAGMA incremental_vacuum({int(max_pages)})" if max_pages > 0 else "PRAGMA incremental_vacuum")
+    cursor.fetchall()
+    return "incremental"
+
+def _checkpoint(cursor):
+    """把 WAL 写回主文件并截断，使文件大小反映回收的空间。"""
+    cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    busy, log_pages, checkpointed = cursor.fetchone()
+    return {"busy": bool(busy), "wal_pages": log_pages, "checkpointed_pages": checkpointed}
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def database_sizes():
+    conn = database.get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA page_size")
+        page_size = cursor.fetchone()[0]
+        cursor.execute("PRAGMA page_count")
+        page_count = cursor.fetchone()[0]
+        cursor.execute("PRAGMA freelist_count")
+        freelist_count = cursor.fetchone()[0]
+    finally:
+        conn.close()
+    return {
+        "db_bytes": _file_size(database.DB_FILE),
+        "wal_bytes": _file_size(database.DB_FILE + "-wal"),
+        "page_size": page_size,
+        "page_count": page_count,
+        "freelist_pages": freelist_count
+    }
+
+# --- 数据库定期维护 ---
+class DatabaseMaintenance:
+    """
+    后台定期维护数据库：清理孤立的关系行和未被引用的标签，回收不再被引用的封面文件，
+    执行 ANALYZE / PRAGMA optimize 更新查询计划统计，
+    用增量 vacuum 回收空闲页并截断 WAL。
+    所有修改都交给写线程执行，与其他写操作串行；每次运行记录前后大小和各步骤耗时。
+    """
+    def __init__(self, interval_s, initial_delay_s, vacuum_max_pages):
+        self.interval = interval_s
+        self.initial_delay = initial_delay_s
+        self.vacuum_max_pages = vacuum_max_pages
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._thread = None
+        self.running = False
+        self.next_run_at = None
+        self.last_report = None
+        self.runs = 0
+        self.errors = 0
+
+    def start(self):
+        """启动后台定时线程；interval 不大于 0 时不启动。"""
+        if self.interval <= 0:
+            print("[Maintenance] 定期维护已关闭。")
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._schedule, name='db-maintenance', daemon=True)
+            self._thread.start()
+
+    def _schedule(self):
+        delay = self.initial_delay
+        while True:
+            with self._lock:
+                self.next_run_at = time.time() + delay
+            time.sleep(delay)
+            self.run()
+            delay = self.interval
+
+    def run_in_background(self):
+        """立即在后台执行一次维护；已有维护在运行时返回 False。"""
+        if self.running:
+            return False
+        threading.Thread(target=self.run, name='db-maintenance-manual', daemon=True).start()
+        return True
+
+    def _timed(self, steps, name, operation, *args):
+        started = time.perf_counter()
+        result = operation(*args)
+        steps[name] = {"ms": round((time.perf_counter() - started) * 1000, 2)}
+        return result
+
+    def run(self):
+        """执行一次完整的维护并返回报告；已有维护在运行时返回 None。"""
+        if not self._run_lock.acquire(blocking=False):
+            return None
+        self.running = True
+        started_at = time.time()
+        started = time.perf_counter()
+        report = {"started_at": started_at, "steps": {}}
+        steps = report["steps"]
+        try:
+            print("[Maintenance] 开始数据库维护...")
+            report["before"] = database_sizes()
+            removed = self._timed(steps, "sweep", db_writer.run, _sweep_orphans)
+            steps["sweep"]["removed"] = removed
+            released, deleted_files = self._timed(
+                steps, "covers", db_writer.run, covers.collect_garbage, config.COVERS_DIRECTORY, config.COVER_GC_GRACE_S
+            )
+            steps["covers"].update({"released": released, "deleted_files": deleted_files})
+            self._timed(steps, "analyze", db_writer.run, _analyze)
+            mode = self._timed(steps, "vacuum", db_writer.run_standalone, _vacuum, self.vacuum_max_pages)
+            steps["vacuum"]["mode"] = mode
+            checkpoint = self._timed(steps, "checkpoint", db_writer.run_standalone, _checkpoint)
+            steps["checkpoint"].update(checkpoint)
+            report["after"] = database_sizes()
+            report["status"] = "success"
+            print(f"[Maintenance] 维护完成: 清理孤立行 {sum(removed.values())} 条，"
+                  f"数据库 {report['before']['db_bytes']} -> {report['after']['db_bytes']} 字节。")
+        except Exception as e:
+            report["status"] = "error"
+            report["error"] = str(e)
+            with self._lock:
+                self.errors += 1
+            print(f"--- 数据库维护出错: {e} ---")
+            traceback.print_exc()
+        finally:
+            report["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            with self._lock:
+                self.runs += 1
+                self.last_report = report
+            self.running = False
+            self._run_lock.release()
+        return report
+
+    def stats(self):
+        with self._lock:
+            return {
+                "running": self.running,
+                "interval_s": self.interval,
+                "next_run_at": self.next_run_at,
+                "runs": self.runs,
+                "errors": self.errors,
+                "last_run": self.last_report
+            }
+
+
+maintenance = DatabaseMaintenance(
+    config.MAINTENANCE_INTERVAL_S,
+    config.MAINTENANCE_INITIAL_DELAY_S,
+    config.MAINTENANCE_VACUUM_MAX_PAGES
+)
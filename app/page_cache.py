@@ -0,0 +1,93 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import config
+
+# --- 内存页面缓存 ---
+class PageCache:
+    """
+    进程内共享的页面字节 LRU 缓存，按总字节数限制大小。
+    键为页面 ETag（由内容决定），因此压缩包内容变化后旧条目只会自然淘汰。
+    同一页面的并发未命中只加载一次，其余请求等待同一结果 (single-flight)。
+    """
+    def __init__(self, max_bytes, max_entry_bytes=None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes if max_entry_bytes is not None else max_bytes // 4
+        self._lock = threading.Lock()
+        self._pages = OrderedDict()
+        self._bytes = 0
+        self._pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def cacheable(self, size):
+        """大小超过单条上限的页面不进入缓存，由调用方直接流式发送。"""
+        return self.max_bytes > 0 and size is not None and size <= self.max_entry_bytes
+
+    def get(self, key, load):
+        """返回页面字节；未命中时调用 load() 加载并缓存，同一键的并发加载只执行一次。"""
+        with self._lock:
+            data = self._pages.get(key)
+            if data is not None:
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return data
+            self.misses += 1
+            future = self._pending.get(key)
+            loading = future is None
+            if loading:
+                future = self._pending[key] = Future()
+            else:
+                self.coalesced += 1
+        if not loading:
+            return future.result()
+
+        try:
+            data = load()
+        except BaseException as e:
+            with self._lock:
+                self._pending.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._pending.pop(key, None)
+            self._store(key, data)
+        future.set_result(data)
+        return data
+
+    def _store(self, key, data):
+        """调用方需持有锁。"""
+        if not self.cacheable(len(data)):
+            return
+        self._bytes += len(data) - len(self._pages.pop(key, b''))
+        self._pages[key] = data
+        while self._bytes > self.max_bytes and self._pages:
+            _, evicted = self._pages.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "pages": len(self._pages),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "loading": len(self._pending),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions
+            }
+
+
+page_cache = PageCache(config.PAGE_CACHE_MAX_BYTES)
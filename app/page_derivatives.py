@@ -0,0 +1,220 @@
+import os
+import io
+import math
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, features
+
+import config
+
+# 格式名 -> (Pillow 格式, MIME 类型, 扩展名)
+_FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg'),
+    'webp': ('WEBP', 'image/webp', 'webp'),
+    'avif': ('AVIF', 'image/avif', 'avif'),
+}
+
+def _check_feature(name):
+    try:
+        return bool(features.check(name))
+    except Exception:
+        return False
+
+SUPPORTED_FORMATS = ['jpeg'] + [fmt for fmt in ('webp', 'avif') if _check_feature(fmt)]
+
+# 标记文件：原图已不大于请求宽度且未要求转码，直接发送原图即可
+_ORIGINAL_MARKER = 'orig'
+
+# --- 请求参数 ---
+def normalize_width(width):
+    """把请求的宽度向上取整到 DERIVATIVE_WIDTH_STEP 的倍数并限制范围；无效值返回 None。"""
+    if not width or width <= 0:
+        return None
+    step = config.DERIVATIVE_WIDTH_STEP
+    width = math.ceil(width / step) * step
+    return max(config.DERIVATIVE_MIN_WIDTH, min(width, config.DERIVATIVE_MAX_WIDTH))
+
+def normalize_format(fmt):
+    """规范化请求的输出格式；Pillow 不支持的格式退回 JPEG，未指定时返回 None。"""
+    if not fmt:
+        return None
+    fmt = fmt.lower()
+    if fmt == 'jpg':
+        fmt = 'jpeg'
+    return fmt if fmt in SUPPORTED_FORMATS else 'jpeg'
+
+def derivative_etag(page_etag, width, fmt):
+    return hashlib.sha1(f"{page_etag}\0{width or 0}\0{fmt or ''}\0{config.DERIVATIVE_QUALITY}".encode('utf-8')).hexdigest()[:24]
+
+# --- 缩放与编码 ---
+def render_page(data, width, fmt):
+    """
+    把原图缩放到不超过 width 的宽度并编码为 fmt。
+    原图不比目标宽且不需要转码时返回 None，表示直接发送原图。
+    """
+    img = Image.open(io.BytesIO(data))
+    needs_resize = width is not None and img.width > width
+    if not needs_resize and fmt is None:
+        return None
+    if needs_resize:
+        target_size = (width, max(1, round(img.height * width / img.width)))
+        # JPEG 可以在解码时按 1/2、1/4、1/8 缩小，省去大部分解码开销
+        img.draft(img.mode, target_size)
+        img = img.resize(target_size, Image.Resampling.LANCZOS)
+    pil_format = _FORMATS[fmt or normalize_format(config.DERIVATIVE_DEFAULT_FORMAT)][0]
+    has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+    if pil_format == 'JPEG' or not has_alpha:
+        img = img.convert('RGB')
+    elif img.mode != 'RGBA':
+        img = img.convert('RGBA')
+    output = io.BytesIO()
+    img.save(output, pil_format, quality=config.DERIVATIVE_QUALITY)
+    return output.getvalue()
+
+# --- 缩放结果缓存 ---
+class DerivativeCache:
+    """
+    以内容寻址的缩放结果磁盘缓存：文件名由原页面 ETag、目标宽度和格式决定，
+    原页面不变时缓存一直有效。总大小超过上限时按最近使用淘汰。
+    缩放在独立的线程池中执行，同一结果的并发请求只生成一次。
+    """
+    def __init__(self, directory, max_bytes, workers):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='page-derivative')
+        self._lock = threading.Lock()
+        self._files = None
+        self._bytes = 0
+        self._pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _load_index(self):
+        """首次使用时按修改时间恢复磁盘上已有的缓存文件（调用方需持有锁）。"""
+        if self._files is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for root, _, files in os.walk(self.directory):
+            for file in files:
+                path = os.path.join(root, file)
+                if file.endswith('.tmp'):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                found.append((st.st_mtime, os.path.relpath(path, self.directory), st.st_size))
+        self._files = OrderedDict((name, size) for _, name, size in sorted(found))
+        self._bytes = sum(self._files.values())
+
+    def _relative_path(self, key, fmt):
+        extension = _FORMATS[fmt][2] if fmt else _ORIGINAL_MARKER
+        return os.path.join(key[:2], f"{key}.{extension}")
+
+    def get(self, key, load_source, width, fmt):
+        """
+        返回 (文件路径, MIME 类型)；结果等同于原图时返回 (None, None)。
+        load_source 为读取原页面字节的函数，只在缓存未命中时调用。
+        """
+        if fmt:
+            candidates = [self._relative_path(key, fmt)]
+        else:
+            candidates = [self._relative_path(key, normalize_format(config.DERIVATIVE_DEFAULT_FORMAT)), self._relative_path(key, None)]
+        with self._lock:
+            self._load_index()
+            for name in candidates:
+                if name in self._files:
+                    self._files.move_to_end(name)
+                    self.hits += 1
+                    return self._result(name)
+            self.misses += 1
+            future = self._pending.get(key)
+            if future is None:
+                future = self._executor.submit(self._generate, key, load_source, width, fmt)
+                self._pending[key] = future
+        return self._result(future.result())
+
+    def open_file(self, key, load_source, width, fmt):
+        """
+        与 get 相同，但返回已打开的文件 (文件, MIME 类型)，调用方负责关闭。
+        文件打开后即使被淘汰也能继续读取；打开前恰好被淘汰时重新生成一次。
+        """
+        for attempt in range(2):
+            path, mimetype = self.get(key, load_source, width, fmt)
+            if path is None:
+                return None, None
+            try:
+                return open(path, 'rb'), mimetype
+            except FileNotFoundError:
+                if attempt:
+                    raise
+                with self._lock:
+                    size = self._files.pop(os.path.relpath(path, self.directory), None)
+                    if size is not None:
+                        self._bytes -= size
+
+    def _result(self, name):
+        if name.endswith('.' + _ORIGINAL_MARKER):
+            return None, None
+        fmt = next(f for f, (_, _, ext) in _FORMATS.items() if name.endswith('.' + ext))
+        return os.path.join(self.directory, name), _FORMATS[fmt][1]
+
+    def _generate(self, key, load_source, width, fmt):
+        try:
+            data = render_page(load_source(), width, fmt)
+            if data is None:
+                name = self._relative_path(key, None)
+                data = b''
+            else:
+                name = self._relative_path(key, fmt or normalize_format(config.DERIVATIVE_DEFAULT_FORMAT))
+            path = os.path.join(self.directory, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+            with self._lock:
+                self._bytes += len(data) - self._files.pop(name, 0)
+                self._files[name] = len(data)
+                self._evict()
+            return name
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def _evict(self):
+        """淘汰最久未使用的文件直到总大小不超过上限（调用方需持有锁）。"""
+        while self._bytes > self.max_bytes and len(self._files) > 1:
+            name, size = self._files.popitem(last=False)
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            self._bytes -= size
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "files": len(self._files or {}),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "generating": len(self._pending),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "formats": SUPPORTED_FORMATS
+            }
+
+
+derivative_cache = DerivativeCache(config.DERIVATIVE_CACHE_DIRECTORY, config.DERIVATIVE_CACHE_MAX_BYTES, config.DERIVATIVE_WORKERS)
@@ -0,0 +1,152 @@
+import itertools
+import threading
+from collections import OrderedDict
+
+import config
+
+# 优先级提示 -> 优先级等级（数值越小越先处理）
+PRIORITY_CLASSES = {
+    'visible': 0,
+    'normal': 1,
+    'prefetch': 2
+}
+
+class PageRequestCancelled(Exception):
+    """排队中的页面请求因读者已经翻过该页而被取消。"""
+
+class PageRequestTimeout(PageRequestCancelled):
+    """排队中的页面请求在限定时间内没有等到名额。"""
+
+
+class PageTicket:
+    def __init__(self, scheduler, comic, page_index, priority_class, seq):
+        self.scheduler = scheduler
+        self.comic = comic
+        self.page_index = page_index
+        self.priority_class = priority_class
+        self.seq = seq
+        self.granted = False
+        self.cancelled = False
+        self.released = False
+
+    def release(self):
+        """归还名额；可重复调用。"""
+        if not self.released:
+            self.released = True
+            self.scheduler._release()
+
+
+# --- 页面请求调度 ---
+class PageScheduler:
+    """
+    限制同时读取页面的请求数，并按优先级分配名额：
+    先按优先级提示 (visible > normal > prefetch)，再按与读者当前位置的距离，
+    位置之后的页面优先于已经翻过的页面。读者位置前进时，
+    仍在排队且已被翻过的非 visible 请求会被取消。
+    """
+    def __init__(self, max_active, cancel_behind, max_positions=64):
+        self.max_active = max(1, max_active)
+        self.cancel_behind = cancel_behind
+        self.max_positions = max_positions
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = []
+        self._positions = OrderedDict()
+        self._seq = itertools.count()
+        self.granted = 0
+        self.queued = 0
+        self.cancelled = 0
+        self.timeouts = 0
+        self.max_queue_length = 0
+
+    def _priority(self, ticket):
+        position = self._positions.get(ticket.comic)
+        if position is None:
+            distance = 0
+        elif ticket.page_index >= position:
+            distance = ticket.page_index - position
+        else:
+            distance = (position - ticket.page_index) * 2
+        return (ticket.priority_class, distance, ticket.seq)
+
+    def acquire(self, comic, page_index, hint=None, timeout=None):
+        """
+        等待并获得一个名额，返回 PageTicket；请求被取消时抛出 PageRequestCancelled，
+        超过 timeout 秒（默认 PAGE_SCHEDULER_ACQUIRE_TIMEOUT_S）仍未获得名额时抛出 PageRequestTimeout。
+        """
+        priority_class = PRIORITY_CLASSES.get(hint or 'normal', PRIORITY_CLASSES['normal'])
+        timeout = config.PAGE_SCHEDULER_ACQUIRE_TIMEOUT_S if timeout is None else timeout
+        with self._cond:
+            ticket = PageTicket(self, comic, page_index, priority_class, next(self._seq))
+            if self._active < self.max_active and not self._waiting:
+                self._active += 1
+                self.granted += 1
+                ticket.granted = True
+                return ticket
+            self._waiting.append(ticket)
+            self.queued += 1
+            self.max_queue_length = max(self.max_queue_length, len(self._waiting))
+            if not self._cond.wait_for(lambda: ticket.granted or ticket.cancelled, timeout):
+                self._waiting.remove(ticket)
+                self.timeouts += 1
+                raise PageRequestTimeout(f"{comic} 第 {page_index} 页")
+            if ticket.cancelled:
+                raise PageRequestCancelled(f"{comic} 第 {page_index} 页")
+            return ticket
+
+    def _release(self):
+        with self._cond:
+            self._active -= 1
+            self._grant_next()
+
+    def _grant_next(self):
+        """把空出的名额分给优先级最高的等待者（调用方需持有锁）。"""
+        granted_any = False
+        while self._active < self.max_active and self._waiting:
+            ticket = min(self._waiting, key=self._priority)
+            self._waiting.remove(ticket)
+            ticket.granted = True
+            self._active += 1
+            self.granted += 1
+            granted_any = True
+        if granted_any:
+            self._cond.notify_all()
+
+    def update_position(self, comic, page_index):
+        """记录读者在某本漫画中的当前位置，并取消已被翻过的排队请求。"""
+        if page_index is None:
+            return
+        # 位置参与所有等待者的优先级比较，混入其他类型会让分配名额时出错
+        page_index = int(page_index)
+        with self._cond:
+            self._positions[comic] = page_index
+            self._positions.move_to_end(comic)
+            while len(self._positions) > self.max_positions:
+                self._positions.popitem(last=False)
+            stale = [
+                t for t in self._waiting
+                if t.comic == comic and t.priority_class != PRIORITY_CLASSES['visible']
+                and t.page_index < page_index - self.cancel_behind
+            ]
+            for ticket in stale:
+                self._waiting.remove(ticket)
+                ticket.cancelled = True
+                self.cancelled += 1
+            if stale:
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "active": self._active,
+                "max_active": self.max_active,
+                "waiting": len(self._waiting),
+                "granted": self.granted,
+                "queued": self.queued,
+                "cancelled": self.cancelled,
+                "timeouts": self.timeouts,
+                "max_queue_length": self.max_queue_length
+            }
+
+
+page_scheduler = PageScheduler(config.PAGE_SCHEDULER_MAX_ACTIVE, config.PAGE_SCHEDULER_CANCEL_BEHIND)
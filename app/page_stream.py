@@ -0,0 +1,198 @@
+import os
+import struct
+import hashlib
+import zipfile
+from datetime import datetime, timezone
+from flask import Response, request
+
+import config
+from archive_cache import archive_cache
+from rar_cache import rar_cache, is_rar
+from page_cache import page_cache
+
+# ZIP 本地文件头: 签名(4) ... 文件名长度(2) 扩展字段长度(2)，共 30 字节
+_LOCAL_HEADER = struct.Struct('<4s22xHH')
+_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+
+# --- 页面流式传输 ---
+def page_mimetype(entry_name):
+    """根据条目扩展名推断图片 MIME 类型。"""
+    return f'image/{os.path.splitext(entry_name)[1][1:].lower()}'
+
+def _stored_data_offset(f, header_offset):
+    """读取本地文件头，返回 STORED 条目数据在压缩包中的起始偏移。"""
+    f.seek(header_offset)
+    header = f.read(_LOCAL_HEADER.size)
+    if len(header) != _LOCAL_HEADER.size:
+        return None
+    signature, name_length, extra_length = _LOCAL_HEADER.unpack(header)
+    if signature != _LOCAL_HEADER_SIGNATURE:
+        return None
+    return header_offset + _LOCAL_HEADER.size + name_length + extra_length
+
+def _iter_file_slice(f, start, length):
+    """从已打开的文件中按块读取 [start, start + length)，结束后关闭文件。"""
+    try:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(config.PAGE_STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+def _iter_zip_entry(comic_path, entry_name, start, length):
+    """借出缓存的压缩包句柄，边解压边输出条目的 [start, start + length)。"""
+    with archive_cache.open(comic_path) as archive:
+        info = archive.entries.get(entry_name)
+        if info is None:
+            return
+        with archive.zip.open(info) as entry:
+            if start:
+                entry.seek(start)
+            remaining = length
+            while remaining > 0:
+                chunk = entry.read(min(config.PAGE_STREAM_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+def _load_page_bytes(comic_path, page):
+    if is_rar(comic_path):
+        with rar_cache.open_page(comic_path, page['entry_name']) as f:
+            return f.read()
+    with archive_cache.open(comic_path) as archive:
+        info = archive.entries.get(page['entry_name'])
+        if info is None:
+            raise FileNotFoundError(page['entry_name'])
+        return archive.zip.read(info)
+
+def read_page_bytes(comic_path, page, etag=None):
+    """
+    读取一页的完整内容，供缩放、转码等需要完整解码的处理使用。
+    提供 ETag 时经过内存页面缓存，重复读取同一页不必再次解压。
+    """
+    if etag is None or not page_cache.cacheable(page['file_size']):
+        return _load_page_bytes(comic_path, page)
+    return page_cache.get(etag, lambda: _load_page_bytes(comic_path, page))
+
+def _requested_range(total_length, etag=None):
+    """
+    解析单段 Range 请求头，返回 (start, stop)；没有 Range、为多段请求
+    或 If-Range 与当前 ETag 不符时返回 None。范围无法满足时抛出 ValueError。
+    """
+    rng = request.range
+    if rng is None or rng.units != 'bytes' or len(rng.ranges) != 1:
+        return None
+    if_range = request.if_range
+    if if_range.etag is not None and if_range.etag != etag:
+        return None
+    if if_range.date is not None:
+        return None
+    byte_range = rng.range_for_length(total_length)
+    if byte_range is None:
+        raise ValueError("Range 无法满足")
+    return byte_range
+
+def _open_stored_entry(comic_path, page):
+    """
+    对未压缩 (ZIP_STORED) 的页面直接打开压缩包并定位到数据偏移，
+    压缩包指纹与清单不一致或文件头异常时返回 (None, None)。
+    """
+    if page['compress_type'] != zipfile.ZIP_STORED or page['header_offset'] is None:
+        return None, None
+    f = open(comic_path, 'rb')
+    try:
+        st = os.fstat(f.fileno())
+        if (st.st_mtime_ns, st.st_size) != (page['archive_mtime_ns'], page['archive_size']):
+            f.close()
+            return None, None
+        data_offset = _stored_data_offset(f, page['header_offset'])
+    except Exception:
+        f.close()
+        raise
+    if data_offset is None or data_offset + page['file_size'] > st.st_size:
+        f.close()
+        return None, None
+    return f, data_offset
+
+# --- 条件请求 ---
+def page_etag(comic_id, page):
+    """由漫画 id、条目名、原始大小和 CRC 构成强 ETag，页面内容不变时 ETag 不变。"""
+    key = f"{comic_id}\0{page['entry_name']}\0{page['file_size']}\0{page['crc']}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:24]
+
+def apply_cache_headers(response, etag, last_modified_ns=None, immutable=False):
+    """
+    为页面或封面响应加上校验器。URL 中携带了与当前内容一致的版本号时
+    可以永久缓存，否则要求浏览器每次用 ETag 重新验证。
+    """
+    response.set_etag(etag)
+    if last_modified_ns is not None:
+        response.last_modified = datetime.fromtimestamp(last_modified_ns // 1_000_000_000, timezone.utc)
+    if immutable:
+        response.headers['Cache-Control'] = f'public, max-age={config.IMMUTABLE_CACHE_MAX_AGE}, immutable'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def not_modified_response(etag, last_modified_ns=None, immutable=False):
+    """
+    请求的校验器与当前内容一致时返回 304 响应，否则返回 None。
+    只依赖数据库中的清单和一次 stat，不需要打开压缩包。
+    """
+    if request.if_none_match:
+        if not request.if_none_match.contains_weak(etag):
+            return None
+    elif request.if_modified_since is None or last_modified_ns is None:
+        return None
+    elif last_modified_ns // 1_000_000_000 > int(request.if_modified_since.timestamp()):
+        return None
+    return apply_cache_headers(Response(status=304), etag, last_modified_ns, immutable)
+
+def send_page(comic_path, page, etag=None, cache_key=None):
+    """
+    以流的形式发送一页图片，支持单段 HTTP Range。
+    STORED 条目直接从其在压缩包中的偏移读取；DEFLATE 条目和 RAR 页面
+    优先从内存页面缓存发送，过大的页面才分块解压或从 RAR 解压缓存中读取。
+    page 需要包含 entry_name、header_offset、compress_type、file_size
+    以及建立清单时的 archive_mtime_ns/archive_size。
+    etag 用于 If-Range 校验；cache_key 为页面缓存的键，未提供时沿用 etag。
+    """
+    if cache_key is None:
+        cache_key = etag
+    total_length = page['file_size']
+    try:
+        byte_range = _requested_range(total_length, etag)
+    except ValueError:
+        response = Response(status=416)
+        response.headers['Content-Range'] = f'bytes */{total_length}'
+        return response
+    start, stop = byte_range if byte_range else (0, total_length)
+    length = stop - start
+
+    f = None
+    if not is_rar(comic_path):
+        f, data_offset = _open_stored_entry(comic_path, page)
+    if f is not None:
+        body = _iter_file_slice(f, data_offset + start, length)
+    elif cache_key is not None and page_cache.cacheable(total_length):
+        data = read_page_bytes(comic_path, page, cache_key)
+        body = [data if byte_range is None else data[start:stop]]
+    elif is_rar(comic_path):
+        f = rar_cache.open_page(comic_path, page['entry_name'])
+        body = _iter_file_slice(f, start, length)
+    else:
+        body = _iter_zip_entry(comic_path, page['entry_name'], start, length)
+
+    response = Response(body, status=206 if byte_range else 200,
+                        mimetype=page_mimetype(page['entry_name']), direct_passthrough=True)
+    response.headers['Content-Length'] = str(length)
+    response.headers['Accept-Ranges'] = 'bytes'
+    if byte_range:
+        response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{total_length}'
+    return response
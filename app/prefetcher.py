@@ -0,0 +1,200 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+import database
+import page_stream
+import page_derivatives
+from page_cache import page_cache
+from rar_cache import rar_cache, is_rar
+from page_scheduler import page_scheduler, PageRequestCancelled
+
+def _natural_key(name):
+    """按自然顺序排序文件名，使 "第2卷" 排在 "第10卷" 之前。"""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', name)]
+
+def next_volume_path(comic_path):
+    """返回同一目录下按文件名排序的下一卷压缩包路径，没有时返回 None。"""
+    directory, name = os.path.split(comic_path)
+    try:
+        siblings = [
+            entry.name for entry in os.scandir(directory)
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in config.ALLOWED_EXTENSIONS
+        ]
+    except OSError:
+        return None
+    siblings.sort(key=_natural_key)
+    try:
+        position = siblings.index(name)
+    except ValueError:
+        return None
+    if position + 1 >= len(siblings):
+        return None
+    return os.path.join(directory, siblings[position + 1])
+
+# --- 预读 ---
+class ReadAheadPrefetcher:
+    """
+    根据阅读进度在后台预热页面：把当前位置之后的若干页解压进内存页面缓存，
+    并按该漫画最近请求的宽度/格式生成缩放结果；接近末尾时预热同目录下一卷的前几页。
+    预热以 prefetch 优先级占用页面调度器的名额，不会挤占前台请求；
+    同一漫画有更新的位置时，旧的预热任务会提前结束。
+    """
+    def __init__(self, pages_ahead, next_volume_pages, next_volume_threshold, workers, acquire_timeout, max_comics=64):
+        self.pages_ahead = pages_ahead
+        self.next_volume_pages = next_volume_pages
+        self.next_volume_threshold = next_volume_threshold
+        self.acquire_timeout = acquire_timeout
+        self.max_comics = max_comics
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='page-prefetch')
+        self._lock = threading.Lock()
+        self._generations = OrderedDict()
+        self._variants = OrderedDict()
+        self._stopped = False
+        self.scheduled = 0
+        self.warmed_pages = 0
+        self.warmed_derivatives = 0
+        self.superseded = 0
+        self.errors = 0
+
+    def _remember(self, mapping, key, value):
+        """调用方需持有锁。"""
+        mapping[key] = value
+        mapping.move_to_end(key)
+        while len(mapping) > self.max_comics:
+            mapping.popitem(last=False)
+
+    def note_variant(self, comic_id, width, fmt):
+        """记录阅读器请求该漫画页面时使用的宽度/格式，预热时生成相同的缩放结果。"""
+        with self._lock:
+            self._remember(self._variants, comic_id, (width, fmt))
+
+    def on_progress(self, comic_path, page):
+        """阅读进度更新时调用，在后台开始预热。"""
+        if self.pages_ahead <= 0 and self.next_volume_pages <= 0:
+            return
+        with self._lock:
+            if self._stopped:
+                return
+            generation = self._generations.get(comic_path, 0) + 1
+            self._remember(self._generations, comic_path, generation)
+            self.scheduled += 1
+        self._executor.submit(self._warm, comic_path, page, generation)
+
+    def _is_current(self, comic_path, generation):
+        with self._lock:
+            current = not self._stopped and self._generations.get(comic_path) == generation
+            if not current:
+                self.superseded += 1
+            return current
+
+    def _load_pages(self, comic_path, first, last):
+        """读取压缩包清单中 [first, last] 的页面行；清单缺失或已过期时返回 (None, [])。"""
+        conn = database.get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, totalPages, archive_mtime_ns, archive_size FROM comics WHERE local_path = ?", (comic_path,))
+            comic = cursor.fetchone()
+            if not comic:
+                return None, []
+            st = os.stat(comic_path)
+            if (comic['archive_mtime_ns'], comic['archive_size']) != (st.st_mtime_ns, st.st_size):
+                return comic, []
+            cursor.execute("""
+                SELECT p.page_index, c.local_path, c.archive_mtime_ns, c.archive_size,
+                    p.entry_name, p.header_offset, p.compress_type, p.file_size, p.crc
+                FROM comic_pages p JOIN comics c ON p.comic_id = c.id
+                WHERE p.comic_id = ? AND p.page_index BETWEEN ? AND ?
+                ORDER BY p.page_index
+            """, (comic['id'], first, last))
+            return comic, cursor.fetchall()
+        finally:
+            conn.close()
+
+    def _warm(self, comic_path, page, generation):
+        try:
+            comic, rows = self._load_pages(comic_path, page + 1, page + self.pages_ahead)
+            if comic is None:
+                return
+            for row in rows:
+                if not self._is_current(comic_path, generation):
+                    return
+                self._warm_page(comic['id'], row)
+
+            if self.next_volume_pages <= 0 or page < (comic['totalPages'] or 0) - 1 - self.next_volume_threshold:
+                return
+            next_path = next_volume_path(comic_path)
+            if next_path is None:
+                return
+            if is_rar(next_path):
+                rar_cache.prefetch(next_path)
+            next_comic, rows = self._load_pages(next_path, 0, self.next_volume_pages - 1)
+            if next_comic is None:
+                return
+            with self._lock:
+                variant = self._variants.get(comic['id'])
+                if variant is not None and next_comic['id'] not in self._variants:
+                    self._remember(self._variants, next_comic['id'], variant)
+            for row in rows:
+                if not self._is_current(comic_path, generation):
+                    return
+                self._warm_page(next_comic['id'], row)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            print(f"[Prefetch] 预热 {os.path.basename(comic_path)} 失败: {e}")
+
+    def _warm_page(self, comic_id, row):
+        """在 prefetch 优先级的调度名额内把一页解压进内存缓存，并生成对应的缩放结果。"""
+        try:
+            ticket = page_scheduler.acquire(comic_id, row['page_index'], 'prefetch', self.acquire_timeout)
+        except PageRequestCancelled:
+            # 被取消或等待超时（PageRequestTimeout）都直接跳过该页
+            return
+        try:
+            etag = page_stream.page_etag(comic_id, row)
+            with self._lock:
+                variant = self._variants.get(comic_id)
+            if page_cache.cacheable(row['file_size']):
+                page_stream.read_page_bytes(row['local_path'], row, etag)
+                with self._lock:
+                    self.warmed_pages += 1
+            if variant is not None:
+                width, fmt = variant
+                page_derivatives.derivative_cache.get(
+                    page_derivatives.derivative_etag(etag, width, fmt),
+                    lambda: page_stream.read_page_bytes(row['local_path'], row, etag), width, fmt
+                )
+                with self._lock:
+                    self.warmed_derivatives += 1
+        finally:
+            ticket.release()
+
+    def stop(self):
+        """停止预热：丢弃尚未开始的任务，等待正在执行的任务在当前页结束后退出。"""
+        with self._lock:
+            self._stopped = True
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pages_ahead": self.pages_ahead,
+                "scheduled": self.scheduled,
+                "warmed_pages": self.warmed_pages,
+                "warmed_derivatives": self.warmed_derivatives,
+                "superseded": self.superseded,
+                "errors": self.errors
+            }
+
+
+prefetcher = ReadAheadPrefetcher(
+    config.PREFETCH_PAGES_AHEAD,
+    config.PREFETCH_NEXT_VOLUME_PAGES,
+    config.PREFETCH_NEXT_VOLUME_THRESHOLD,
+    config.PREFETCH_WORKERS,
+    config.PREFETCH_ACQUIRE_TIMEOUT_S
+)
@@ -0,0 +1,128 @@
+import threading
+import time
+
+import config
+from db_writer import db_writer
+
+# --- 阅读进度写回缓冲 ---
+class ProgressBuffer:
+    """
+    翻页时的阅读进度先记在内存里，每本漫画只保留最新的页码，
+    由后台线程每隔 flush_interval 秒一次性交给写线程写入；
+    待写入的漫画数达到 max_pending 时提前写入，程序退出时写完剩余部分。
+    进程崩溃时最多丢失最近 flush_interval 秒内的进度。
+    """
+    def __init__(self, flush_interval, max_pending):
+        self.flush_interval = flush_interval
+        self.max_pending = max(1, max_pending)
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self._last_flush = None
+        self.updates = 0
+        self.coalesced = 0
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.errors = 0
+        self.max_flush_ms = 0.0
+
+    def _ensure_started(self):
+        """调用方需持有锁。"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='progress-flush', daemon=True)
+            self._thread.start()
+
+    def record(self, comic_id, page):
+        """记录某本漫画的最新阅读页码，不做任何磁盘写入。"""
+        with self._lock:
+            self.updates += 1
+            if comic_id in self._pending:
+                self.coalesced += 1
+            self._pending[comic_id] = page
+            # 列表和详情会显示缓冲中的页码，缓存的列表响应需要随之失效
+            db_writer.bump_generation()
+            if not self._stopped:
+                self._ensure_started()
+            if len(self._pending) >= self.max_pending:
+                self._wakeup.set()
+
+    def current_page(self, comic_id, stored_page):
+        """返回尚未写入的最新页码，没有时返回数据库中的值。"""
+        with self._lock:
+            return self._pending.get(comic_id, stored_page)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stopped:
+                return
+            self.flush()
+
+    def flush(self, wait=False):
+        """把缓冲中的进度交给写线程；wait 为 True 时等待写入提交。"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            last_flush = self._last_flush
+        if not batch:
+            # 没有新进度时仍等待上一次写入完成，保证返回时进度都已落盘
+            if wait and last_flush is not None:
+                last_flush.exception()
+            return
+
+        started = time.perf_counter()
+
+        def write_progress(cursor):
+            cursor.executemany(
+                "UPDATE comics SET currentPage = ? WHERE id = ?",
+                [(page, comic_id) for comic_id, page in batch.items()]
+            )
+
+        def done(future):
+            error = future.exception()
+            with self._lock:
+                if error is None:
+                    self.flushes += 1
+                    self.flushed_rows += len(batch)
+                    self.max_flush_ms = max(self.max_flush_ms, (time.perf_counter() - started) * 1000)
+                    return
+                self.errors += 1
+                # 写入失败时放回缓冲，等待下次重试；期间有更新的页码则以新的为准
+                for comic_id, page in batch.items():
+                    self._pending.setdefault(comic_id, page)
+            print(f"[Progress] 写入 {len(batch)} 条阅读进度失败: {error}")
+
+        future = db_writer.submit(write_progress)
+        future.add_done_callback(done)
+        with self._lock:
+            self._last_flush = future
+        if wait:
+            future.exception()
+
+    def stop(self):
+        """停止后台线程并写完剩余的进度。"""
+        with self._lock:
+            self._stopped = True
+            thread = self._thread
+        self._wakeup.set()
+        if thread is not None and thread.is_alive():
+            thread.join(self.flush_interval + 5)
+        self.flush(wait=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "flush_interval_s": self.flush_interval,
+                "updates": self.updates,
+                "coalesced": self.coalesced,
+                "flushes": self.flushes,
+                "flushed_rows": self.flushed_rows,
+                "errors": self.errors,
+                "max_flush_ms": round(self.max_flush_ms, 2)
+            }
+
+
+progress_buffer = ProgressBuffer(config.PROGRESS_FLUSH_INTERVAL_S, config.PROGRESS_MAX_PENDING)
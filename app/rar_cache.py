@@ -0,0 +1,205 @@
+import io
+import os
+import time
+import shutil
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import rarfile
+from werkzeug.security import safe_join
+
+import config
+
+def is_rar(comic_path):
+    return os.path.splitext(comic_path)[1].lower() in config.RAR_EXTENSIONS
+
+def _directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            try:
+                total += os.path.getsize(os.path.join(root, file))
+            except OSError:
+                pass
+    return total
+
+class _PinnedFile(io.BufferedReader):
+    """从解压缓存中打开的页面文件；关闭时解除对所在卷的占用。"""
+    def __init__(self, path, release):
+        super().__init__(io.FileIO(path, 'rb'))
+        self._release = release
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            release, self._release = self._release, None
+            if release is not None:
+                release()
+
+# --- RAR 解压缓存 ---
+class RarExtractionCache:
+    """
+    RAR 漫画的磁盘解压缓存。固实压缩的 RAR 无法随机访问，
+    因此每个卷只在后台完整解压一次（同一压缩包的并发请求共享同一次解压），
+    之后的页面直接从缓存目录读取。缓存总大小超过上限时按最近访问时间淘汰；
+    正在被读取的卷（open_page 返回的文件尚未关闭）不会被淘汰。
+    """
+    def __init__(self, directory, max_bytes, workers):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='rar-extract')
+        self._lock = threading.Lock()
+        self._volumes = None
+        self._pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _load_index(self):
+        """首次使用时扫描缓存目录，恢复上次运行留下的已解压卷（调用方需持有锁）。"""
+        if self._volumes is not None:
+            return
+        self._volumes = {}
+        os.makedirs(self.directory, exist_ok=True)
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(('.partial', '.evicted')):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.isdir(path):
+                self._volumes[name] = {"size": _directory_size(path), "last_access": os.path.getmtime(path), "pins": 0}
+
+    def _key(self, comic_path):
+        st = os.stat(comic_path)
+        key = f"{os.path.abspath(comic_path)}\0{st.st_mtime_ns}\0{st.st_size}"
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()[:24]
+
+    def prefetch(self, comic_path):
+        """确保该卷已解压或正在后台解压，返回对应的 Future。"""
+        key = self._key(comic_path)
+        with self._lock:
+            self._load_index()
+            return self._submit(key, comic_path)
+
+    def _submit(self, key, comic_path):
+        """调用方需持有锁。已解压时返回 None。"""
+        if key in self._volumes:
+            return None
+        future = self._pending.get(key)
+        if future is None:
+            future = self._executor.submit(self._extract, key, comic_path)
+            self._pending[key] = future
+        return future
+
+    def wait_ready(self, comic_path, timeout=None):
+        """等待该卷解压完成（已解压时立即返回），超时抛出 concurrent.futures.TimeoutError。"""
+        future = self.prefetch(comic_path)
+        if future is not None:
+            future.result(timeout=timeout)
+
+    def open_page(self, comic_path, entry_name, timeout=None):
+        """
+        打开某一页在缓存中的文件，必要时等待该卷解压完成。
+        返回的文件关闭之前该卷不会被淘汰，调用方需要负责关闭。
+        """
+        key = self._key(comic_path)
+        counted = False
+        while True:
+            with self._lock:
+                self._load_index()
+                volume = self._volumes.get(key)
+                if volume is not None:
+                    volume['last_access'] = time.time()
+                    volume['pins'] += 1
+                    if not counted:
+                        self.hits += 1
+                    break
+                if not counted:
+                    self.misses += 1
+                    counted = True
+                future = self._submit(key, comic_path)
+            # 解压完成后回到循环开头占用该卷；其间被淘汰时会重新解压
+            future.result(timeout=timeout)
+
+        try:
+            page_file = safe_join(os.path.join(self.directory, key), *entry_name.replace('\\', '/').split('/'))
+            if page_file is None or not os.path.isfile(page_file):
+                raise FileNotFoundError(entry_name)
+            return _PinnedFile(page_file, lambda: self._unpin(key))
+        except BaseException:
+            self._unpin(key)
+            raise
+
+    def _unpin(self, key):
+        with self._lock:
+            volume = self._volumes.get(key)
+            if volume is None:
+                return
+            volume['pins'] -= 1
+            # 之前因被占用而没能淘汰的卷，在最后一个读取结束后再尝试
+            if volume['pins'] == 0:
+                self._evict(keep=None)
+
+    def _extract(self, key, comic_path):
+        final_dir = os.path.join(self.directory, key)
+        partial_dir = final_dir + '.partial'
+        try:
+            shutil.rmtree(partial_dir, ignore_errors=True)
+            started = time.time()
+            with rarfile.RarFile(comic_path, 'r') as r:
+                r.extractall(partial_dir)
+            os.replace(partial_dir, final_dir)
+            size = _directory_size(final_dir)
+            print(f"[RarCache] 已解压 {os.path.basename(comic_path)} ({size / 1048576:.1f} MB, {time.time() - started:.1f}s)")
+            with self._lock:
+                self._volumes[key] = {"size": size, "last_access": time.time(), "pins": 0}
+                self._evict(keep=key)
+        except Exception:
+            shutil.rmtree(partial_dir, ignore_errors=True)
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def _evict(self, keep):
+        """
+        按最近访问时间淘汰已解压的卷，直到总大小不超过上限（调用方需持有锁）。
+        跳过正在被读取的卷；目录没能移走（例如 Windows 上仍有文件被打开）时保留记录，
+        下次淘汰时再试，使记录的总大小与磁盘占用一致。
+        """
+        total = sum(v['size'] for v in self._volumes.values())
+        for key, volume in sorted(self._volumes.items(), key=lambda item: item[1]['last_access']):
+            if total <= self.max_bytes:
+                break
+            if key == keep or volume['pins'] > 0:
+                continue
+            volume_dir = os.path.join(self.directory, key)
+            # 先整体改名再删除：改名失败时该卷保持完整可用，不会只删掉一部分页面
+            try:
+                os.replace(volume_dir, volume_dir + '.evicted')
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"[RarCache] 暂时无法删除 {volume_dir}: {e}")
+                continue
+            shutil.rmtree(volume_dir + '.evicted', ignore_errors=True)
+            del self._volumes[key]
+            total -= volume['size']
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            volumes = self._volumes or {}
+            return {
+                "volumes": len(volumes),
+                "bytes": sum(v['size'] for v in volumes.values()),
+                "max_bytes": self.max_bytes,
+                "extracting": len(self._pending),
+                "pinned": sum(1 for v in volumes.values() if v['pins'] > 0),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+
+rar_cache = RarExtractionCache(config.RAR_CACHE_DIRECTORY, config.RAR_CACHE_MAX_BYTES, config.RAR_EXTRACT_WORKERS)
@@ -1,67 +1,158 @@
 import os
-import zipfile
+import re
 import json
+import base64
+import hashlib
 import threading
-import io
 import time
 import traceback
+from concurrent.futures import TimeoutError as FutureTimeoutError
 import send2trash
 from flask import (
     Blueprint,
     jsonify,
     send_from_directory,
     request,
-    send_file
+    send_file,
+    Response
 )
+from werkzeug.security import safe_join
+from werkzeug.wsgi import ClosingIterator
 
 import database
 import scanner
 import config
+import page_stream
+import page_derivatives
+import covers
+from archive_cache import archive_cache
+from rar_cache import rar_cache, is_rar
+from page_cache import page_cache
+from page_scheduler import page_scheduler, PageRequestCancelled, PageRequestTimeout
+from prefetcher import prefetcher
+from db_writer import db_writer
+from progress_buffer import progress_buffer
+from listing_cache import listing_cache
+from cover_builder import cover_builder
+from maintenance import maintenance, database_sizes as maintenance_sizes
 
 # 创建一个蓝图对象
 bp = Blueprint('api', __name__, url_prefix='')
 
-# --- 安全性检查 ---
-def is_safe_path(path):
-    app_config = config.get_config()
-    abs_path = os.path.abspath(path)
-    return any(abs_path.startswith(os.path.abspath(folder)) for folder in app_config.get('managed_folders', []))
-
 # --- API 路由 ---
 @bp.route('/api/scan/progress')
 def get_scan_progress():
     return jsonify(scanner.scan_progress)
 
+@bp.route('/api/scan/cancel', methods=['POST'])
+def cancel_scan():
+    if not scanner.cancel_scan():
+        return jsonify({"status": "error", "message": "当前没有正在进行的扫描"}), 409
+    return jsonify({"status": "success", "message": "正在取消扫描"})
+
 @bp.route('/')
 def index():
     return send_from_directory(config.WEB_DIRECTORY, 'index.html')
 
-def _get_unified_comics(search_term='', filter_by='all', sort_by='date', sort_order='desc', limit=30, offset=0):
+# 搜索词："..." 为短语，其余按空白分隔
+_SEARCH_TOKEN = re.compile(r'"([^"]*)"|(\S+)')
+
+def _search_clauses(search_term, query_params):
+    """
+    把搜索词转换为 WHERE 子句，返回 (是否使用全文索引, 子句列表)。
+    多个词需同时匹配；以 * 结尾的词只匹配标题或显示名称的开头。
+    不少于 3 个字符的词走 FTS5 trigram 索引，更短的词无法由三字组索引匹配，退回 LIKE。
+    """
+    fts_terms, clauses = [], []
+    for i, match in enumerate(_SEARCH_TOKEN.finditer(search_term)):
+        phrase, word = match.groups()
+        prefix = word is not None and word.endswith('*')
+        term = (phrase if phrase is not None else word.rstrip('*')).strip()
+        if not term:
+            continue
+        if database.SEARCH_INDEX_AVAILABLE and len(term) >= 3:
+            quoted = '"' + term.replace('"', '""') + '"'
+            fts_terms.append(f"{{title displayName}} : ^{quoted}" if prefix else quoted)
+            continue
+        key = f"search_{i}"
+        escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        if prefix:
+            query_params[key] = f"{escaped}%"
+            clauses.append(f"(c.title LIKE :{key} ESCAPE '\\' OR c.displayName LIKE :{key} ESCAPE '\\')")
+        else:
+            query_params[key] = f"%{escaped}%"
+            clauses.append(f"(c.title LIKE :{key} ESCAPE '\\' OR c.displayName LIKE :{key} ESCAPE '\\' OR IFNULL(c.effective_tags, '') LIKE :{key} ESCAPE '\\')")
+    if fts_terms:
+        query_params['fts'] = ' AND '.join(fts_terms)
+        clauses.append("comic_search MATCH :fts")
+    return bool(fts_terms), clauses
+
+# 排序方式 -> (排序列, 行中对应的字段)；其余排序方式按添加时间排序
+_SORT_COLUMNS = {
+    'date': ('c.date_added', 'date_added'),
+    'name': ('c.displayName', 'displayName')
+}
+
+def _encode_cursor(data):
+    payload = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+def _decode_cursor(token):
+    """解析分页游标，格式无效时抛出 ValueError。"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except ValueError:
+        raise ValueError("无效的分页游标")
+    if not isinstance(data, dict):
+        raise ValueError("无效的分页游标")
+    return data
+
+def _listing_fingerprint(search_term, filter_by, sort_by, sort_order):
+    """游标只能用于生成它的同一组搜索、过滤和排序条件。"""
+    key = f"{search_term}\0{filter_by}\0{sort_by}\0{sort_order}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+
+def _keyset_clauses(column, sort_order, query_params, key, comic_id):
+    """
+    返回排在游标 (key, comic_id) 之后的行所在的各段条件，按排序先后排列。
+    SQLite 中 NULL 在升序时排最前、降序时排最后；把 NULL 段单独查询，
+    每段都是 (排序列, id) 索引上的一次范围查找，不会退化为从头扫描。
+    """
+    query_params['cursor_key'] = key
+    query_params['cursor_id'] = comic_id
+    if sort_order == 'asc':
+        if key is None:
+            return [f"{column} IS NULL AND c.id > :cursor_id", f"{column} IS NOT NULL"]
+        return [f"({column}, c.id) > (:cursor_key, :cursor_id)"]
+    if key is None:
+        return [f"{column} IS NULL AND c.id < :cursor_id"]
+    return [f"({column}, c.id) < (:cursor_key, :cursor_id)", f"{column} IS NULL"]
+
+def _get_unified_comics(search_term='', filter_by='all', sort_by='date', sort_order='desc', limit=30, offset=0, cursor_token=None):
     """
     从数据库加载漫画数据，并转换为前端期望的格式，支持搜索、过滤、排序和分页。
+    返回 (漫画列表, 总数, 下一页游标)。传入 cursor_token 时按游标续读，
+    不再统计总数（返回 None）；没有更多数据时下一页游标为 None。
     """
+    fingerprint = _listing_fingerprint(search_term, filter_by, sort_by, sort_order)
+    position = _decode_cursor(cursor_token) if cursor_token else None
+    if position is not None and position.get('v') != fingerprint:
+        raise ValueError("分页游标与当前的搜索或排序条件不匹配")
+
     conn = database.get_db_connection()
     cursor = conn.cursor()
 
-    base_query = """
+    # 有效标签和文件夹名称由触发器维护在 comics 的摘要列中，列表查询只需扫描一张表
+    select_sql = """
         SELECT
-            c.title, c.displayName, c.is_favorite, c.currentPage, c.totalPages, c.date_added,
+            c.id, c.title, c.displayName, c.is_favorite, c.currentPage, c.totalPages, c.date_added,
             c.local_path, c.local_cover_path_thumbnail, c.local_cover_path_medium, c.local_cover_path_large,
-            c.online_url, c.online_cover_url,
-            GROUP_CONCAT(DISTINCT CASE WHEN ct.type = 'source' THEN t.name ELSE NULL END) as source_tags,
-            GROUP_CONCAT(DISTINCT CASE WHEN ct.type = 'added' THEN t.name ELSE NULL END) as added_tags,
-            GROUP_CONCAT(DISTINCT CASE WHEN ct.type = 'removed' THEN t.name ELSE NULL END) as removed_tags,
-            GROUP_CONCAT(DISTINCT f.name) as folders
-        FROM comics c
-        LEFT JOIN comic_tags ct ON c.title = ct.comic_title
-        LEFT JOIN tags t ON ct.tag_id = t.id
-        LEFT JOIN comic_folders cf ON c.title = cf.comic_title
-        LEFT JOIN folders f ON cf.folder_id = f.id
+            c.online_url, c.online_cover_url, c.effective_tags, c.folder_names
     """
+    from_sql = " FROM comics c"
     
     query_params = {}
     where_clauses = []
-    having_clauses = []
 
     if filter_by == 'favorites':
         where_clauses.append("c.is_favorite = 1")
@@ -72,48 +163,67 @@ def _get_unified_comics(search_term='', filter_by='all', sort_by='date', sort_or
     elif filter_by == 'undownloaded':
         where_clauses.append("c.online_url IS NOT NULL AND c.local_path IS NULL")
     elif filter_by != 'all':
-        where_clauses.append("c.title IN (SELECT cf.comic_title FROM comic_folders cf JOIN folders f ON cf.folder_id = f.id WHERE f.name = :filter_by)")
+        where_clauses.append("c.id IN (SELECT cf.comic_id FROM comic_folders cf JOIN folders f ON cf.folder_id = f.id WHERE f.name = :filter_by)")
         query_params['filter_by'] = filter_by
 
+    use_search_index = False
     if search_term:
-        having_clauses.append("(c.displayName LIKE :search OR IFNULL(source_tags, '') LIKE :search OR IFNULL(added_tags, '') LIKE :search)")
-        query_params['search'] = f"%{search_term}%"
-
-    query_body = base_query
-    if where_clauses:
-        query_body += " WHERE " + " AND ".join(where_clauses)
-    query_body += " GROUP BY c.title"
-    if having_clauses:
-        query_body += " HAVING " + " AND ".join(having_clauses)
-
-    count_query = f"SELECT COUNT(*) FROM ({query_body})"
-    cursor.execute(count_query, query_params)
-    total_count = cursor.fetchone()[0]
-
-    order_by_clause = ""
-    if sort_by == 'name':
-        order_by_clause = f" ORDER BY c.displayName {sort_order}"
-    elif sort_by == 'date':
-        order_by_clause = f" ORDER BY c.date_added {sort_order}"
-
-    limit_clause = " LIMIT :limit OFFSET :offset"
-    final_query = query_body + order_by_clause + limit_clause
-
-    final_params = query_params.copy()
-    final_params['limit'] = limit
-    final_params['offset'] = offset
-    
-    cursor.execute(final_query, final_params)
-    rows = cursor.fetchall()
+        use_search_index, search_clauses = _search_clauses(search_term, query_params)
+        where_clauses.extend(search_clauses)
+    if use_search_index:
+        from_sql += " JOIN comic_search ON comic_search.rowid = c.id"
+
+    total_count = None
+    if position is None and not search_term:
+        total_count = database.count_for_filter(cursor, filter_by)
+    elif position is None:
+        where_sql = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+        cursor.execute("SELECT COUNT(*)" + from_sql + where_sql, query_params)
+        total_count = cursor.fetchone()[0]
+
+    # 相关度排序：rank 越小越相关。rank 无法建立索引，游标中记录的是已读取的行数
+    rank_order = sort_by == 'relevance' and use_search_index
+    sort_column, sort_field = _SORT_COLUMNS.get(sort_by, _SORT_COLUMNS['date'])
+    segments = [None]
+    if rank_order:
+        order_by_clause = " ORDER BY comic_search.rank" + (" DESC" if sort_order == 'asc' else "") + f", c.id {sort_order}"
+        if position is not None:
+            offset = int(position.get('n', 0))
+    else:
+        order_by_clause = f" ORDER BY {sort_column} {sort_order}, c.id {sort_order}"
+        if position is not None:
+            if not isinstance(position.get('i'), int):
+                raise ValueError("无效的分页游标")
+            segments = _keyset_clauses(sort_column, sort_order, query_params, position.get('k'), position['i'])
+            offset = 0
+
+    rows = []
+    for segment in segments:
+        segment_clauses = where_clauses + ([segment] if segment else [])
+        where_sql = " WHERE " + " AND ".join(segment_clauses) if segment_clauses else ""
+        final_query = select_sql + from_sql + where_sql + order_by_clause + " LIMIT :limit OFFSET :offset"
+
+        final_params = query_params.copy()
+        final_params['limit'] = limit - len(rows)
+        final_params['offset'] = offset
+
+        cursor.execute(final_query, final_params)
+        rows.extend(cursor.fetchall())
+        if len(rows) >= limit:
+            break
     conn.close()
 
+    next_cursor = None
+    if rows and len(rows) == limit:
+        if rank_order:
+            next_cursor = _encode_cursor({"v": fingerprint, "n": offset + len(rows)})
+        else:
+            next_cursor = _encode_cursor({"v": fingerprint, "k": rows[-1][sort_field], "i": rows[-1]['id']})
+
     frontend_comics = []
     for row in rows:
-        source_tags = set(row['source_tags'].split(',')) if row['source_tags'] else set()
-        added_tags = set(row['added_tags'].split(',')) if row['added_tags'] else set()
-        removed_tags = set(row['removed_tags'].split(',')) if row['removed_tags'] else set()
-        final_tags = sorted(list((source_tags.union(added_tags)) - removed_tags))
-        folders_list = sorted(list(set(row['folders'].split(',')))) if row['folders'] else []
+        final_tags = row['effective_tags'].split(',') if row['effective_tags'] else []
+        folders_list = row['folder_names'].split(',') if row['folder_names'] else []
         sources = []
         if row['local_path']:
             sources.append({"type": "local", "path": row['local_path']})
@@ -121,12 +231,13 @@ def _get_unified_comics(search_term='', filter_by='all', sort_by='date', sort_or
             sources.append({"type": "online", "url": row['online_url']})
 
         frontend_comics.append({
+            "id": row['id'],
             "title": row['title'],
             "displayName": row['displayName'],
             "is_favorite": bool(row['is_favorite']),
             "tags": final_tags,
             "folders": folders_list,
-            "currentPage": row['currentPage'],
+            "currentPage": progress_buffer.current_page(row['id'], row['currentPage']),
             "totalPages": row['totalPages'],
             "date_added": row['date_added'],
             "cover_paths_local": {
@@ -138,47 +249,82 @@ def _get_unified_comics(search_term='', filter_by='all', sort_by='date', sort_or
             "sources": sources
         })
 
-    return frontend_comics, total_count
+    return frontend_comics, total_count, next_cursor
+
+def _normalize_sort(sort_by, search_term):
+    """与 _get_unified_comics 一致：有搜索词时保留相关度排序，其余无效的排序字段按添加时间排序。"""
+    if sort_by == 'relevance' and search_term:
+        return sort_by
+    return sort_by if sort_by in _SORT_COLUMNS else 'date'
+
+def _listing_cache_key(page, limit, sort_by, sort_order, search_term, filter_by, cursor_token):
+    """
+    缓存键，参数需已由 get_comics 规范化（与查询和游标指纹使用同一组值），
+    游标续读时页码不影响结果。
+    """
+    return (None if cursor_token else page, limit, sort_by, sort_order, search_term, filter_by, cursor_token)
 
 @bp.route('/api/comics', methods=['GET'])
 def get_comics():
     try:
         page = request.args.get('page', 1, type=int)
         limit = request.args.get('limit', 30, type=int)
-        sort_by = request.args.get('sort_by', 'date', type=str)
-        sort_order = request.args.get('sort_order', 'desc', type=str)
-        search_term = request.args.get('search', '', type=str).lower()
+        sort_order = 'asc' if request.args.get('sort_order', 'desc', type=str).lower() == 'asc' else 'desc'
+        # 搜索词和排序方式只在这里规范化一次，缓存键、查询和游标指纹都使用同样的值
+        search_term = request.args.get('search', '', type=str).lower().strip()
+        sort_by = _normalize_sort(request.args.get('sort_by', 'date', type=str), search_term)
         filter_by = request.args.get('filter', 'all', type=str)
+        cursor_token = request.args.get('cursor', None, type=str)
         offset = (page - 1) * limit
 
-        paginated_comics, total_filtered_comics = _get_unified_comics(
-            search_term=search_term, filter_by=filter_by, sort_by=sort_by,
-            sort_order=sort_order, limit=limit, offset=offset
-        )
-        
-        if not paginated_comics and total_filtered_comics == 0:
-            conn = database.get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT 1 FROM comics LIMIT 1")
-            is_empty = cursor.fetchone() is None
-            conn.close()
-            if is_empty:
-                print("统一漫画数据库为空，尝试执行初次扫描...")
-                scanner.scan_comics()
-                paginated_comics, total_filtered_comics = _get_unified_comics(
+        # 先读取版本号再查询：查询期间发生的写入会让这次缓存的结果立即过期
+        generation = db_writer.generation
+        cache_key = _listing_cache_key(page, limit, sort_by, sort_order, search_term, filter_by, cursor_token)
+        cached = listing_cache.get(cache_key, generation)
+        if cached is None:
+            try:
+                paginated_comics, total_filtered_comics, next_cursor = _get_unified_comics(
                     search_term=search_term, filter_by=filter_by, sort_by=sort_by,
-                    sort_order=sort_order, limit=limit, offset=offset
+                    sort_order=sort_order, limit=limit, offset=offset, cursor_token=cursor_token
                 )
+            except ValueError as e:
+                return jsonify({"status": "error", "message": str(e)}), 400
 
-        response = jsonify({
-            "comics": paginated_comics,
-            "total_comics": total_filtered_comics,
-            "page": page,
-            "limit": limit
-        })
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
+            if not paginated_comics and total_filtered_comics == 0:
+                conn = database.get_db_connection()
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1 FROM comics LIMIT 1")
+                is_empty = cursor.fetchone() is None
+                conn.close()
+                if is_empty:
+                    print("统一漫画数据库为空，尝试执行初次扫描...")
+                    scanner.scan_comics()
+                    generation = db_writer.generation
+                    paginated_comics, total_filtered_comics, next_cursor = _get_unified_comics(
+                        search_term=search_term, filter_by=filter_by, sort_by=sort_by,
+                        sort_order=sort_order, limit=limit, offset=offset
+                    )
+
+            body = jsonify({
+                "comics": paginated_comics,
+                "total_comics": total_filtered_comics,
+                "page": page,
+                "limit": limit,
+                "next": next_cursor
+            }).get_data()
+            etag = hashlib.sha1(body).hexdigest()[:24]
+            listing_cache.put(cache_key, generation, body, etag)
+        else:
+            body, etag = cached
+
+        # 浏览器每次都用 ETag 重新验证，书库未变化时得到 304
+        if request.if_none_match and request.if_none_match.contains_weak(etag):
+            listing_cache.record_not_modified()
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
         return response
     except Exception as e:
         print(f"--- ERROR in get_comics: {e} ---")
@@ -190,29 +336,23 @@ def get_comic_stats():
     try:
         conn = database.get_db_connection()
         cursor = conn.cursor()
-        stats = { "folders": {} }
-        stats['all'] = cursor.execute("SELECT COUNT(*) FROM comics").fetchone()[0]
-        stats['favorites'] = cursor.execute("SELECT COUNT(*) FROM comics WHERE is_favorite = 1").fetchone()[0]
-        stats['web'] = cursor.execute("SELECT COUNT(*) FROM comics WHERE online_url IS NOT NULL").fetchone()[0]
-        stats['downloaded'] = cursor.execute("SELECT COUNT(*) FROM comics WHERE local_path IS NOT NULL").fetchone()[0]
-        stats['undownloaded'] = cursor.execute("SELECT COUNT(*) FROM comics WHERE online_url IS NOT NULL AND local_path IS NULL").fetchone()[0]
-        cursor.execute("SELECT f.name, COUNT(cf.comic_title) FROM folders f JOIN comic_folders cf ON f.id = cf.folder_id GROUP BY f.name")
-        for row in cursor.fetchall():
-            stats['folders'][row[0]] = row[1]
+        counters, folders = database.get_library_counters(cursor)
         conn.close()
+        stats = {name: counters.get(name, 0) for name in database.LIBRARY_FILTERS}
+        stats['folders'] = folders
         return jsonify(stats)
     except Exception as e:
         print(f"Error getting stats from DB: {e}")
         return jsonify({"all": 0, "favorites": 0, "web": 0, "downloaded": 0, "undownloaded": 0, "folders": {}})
 
-@bp.route('/api/comic/<string:title>')
-def get_comic_details(title):
+@bp.route('/api/comic/<int:comic_id>')
+def get_comic_details(comic_id):
     try:
         conn = database.get_db_connection()
         cursor = conn.cursor()
         cursor.execute("""
             SELECT
-                c.title, c.displayName, c.is_favorite, c.currentPage, c.totalPages, c.date_added,
+                c.id, c.title, c.displayName, c.is_favorite, c.currentPage, c.totalPages, c.date_added,
                 c.local_path, c.local_source_folder, 
                 c.local_cover_path_thumbnail, c.local_cover_path_medium, c.local_cover_path_large,
                 c.online_url, c.online_cover_url,
@@ -221,20 +361,20 @@ def get_comic_details(title):
                 GROUP_CONCAT(DISTINCT CASE WHEN ct.type = 'removed' THEN t.name ELSE NULL END) as removed_tags,
                 GROUP_CONCAT(DISTINCT f.name) as folders
             FROM comics c
-            LEFT JOIN comic_tags ct ON c.title = ct.comic_title
+            LEFT JOIN comic_tags ct ON c.id = ct.comic_id
             LEFT JOIN tags t ON ct.tag_id = t.id
-            LEFT JOIN comic_folders cf ON c.title = cf.comic_title
+            LEFT JOIN comic_folders cf ON c.id = cf.comic_id
             LEFT JOIN folders f ON cf.folder_id = f.id
-            WHERE c.title = ?
-            GROUP BY c.title
-        """, (title,))
+            WHERE c.id = ?
+            GROUP BY c.id
+        """, (comic_id,))
         row = cursor.fetchone()
         conn.close()
         if not row:
             return jsonify({"status": "error", "message": "漫画未找到"}), 404
         comic_details = {
-            "title": row['title'], "displayName": row['displayName'], "is_favorite": bool(row['is_favorite']),
-            "currentPage": row['currentPage'], "totalPages": row['totalPages'], "date_added": row['date_added'],
+            "id": row['id'], "title": row['title'], "displayName": row['displayName'], "is_favorite": bool(row['is_favorite']),
+            "currentPage": progress_buffer.current_page(row['id'], row['currentPage']), "totalPages": row['totalPages'], "date_added": row['date_added'],
             "local_info": {
                 "path": row['local_path'], "source_folder": row['local_source_folder'],
                 "cover_paths": {
@@ -254,21 +394,18 @@ def get_comic_details(title):
         traceback.print_exc()
         return jsonify({"status": "error", "message": str(e)}), 500
 
-@bp.route('/api/comic/<string:title>/display_name', methods=['PUT'])
-def update_comic_display_name(title):
+@bp.route('/api/comic/<int:comic_id>/display_name', methods=['PUT'])
+def update_comic_display_name(comic_id):
     data = request.json
     new_display_name = data.get('displayName')
     if not new_display_name:
         return jsonify({"status": "error", "message": "缺少新的显示名称"}), 400
     try:
-        conn = database.get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE comics SET displayName = ? WHERE title = ?", (new_display_name, title))
-        conn.commit()
-        if cursor.rowcount == 0:
-            conn.close()
+        def rename(cursor):
+            cursor.execute("UPDATE comics SET displayName = ? WHERE id = ?", (new_display_name, comic_id))
+            return cursor.rowcount
+        if db_writer.run(rename) == 0:
             return jsonify({"status": "error", "message": "漫画未找到"}), 404
-        conn.close()
         return jsonify({"status": "success", "message": "显示名称已更新"})
     except Exception as e:
         print(f"Error updating display name in DB: {e}")
@@ -291,15 +428,13 @@ def api_add_folder():
         "tag_includes": json.dumps(new_folder_data.get('tag_includes', []))
     }
     try:
-        conn = database.get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO folders (name, auto, name_includes, tag_includes) VALUES (?, ?, ?, ?)",
-            (new_folder['name'], new_folder['auto'], new_folder['name_includes'], new_folder['tag_includes'])
-        )
-        conn.commit()
-        new_folder['id'] = cursor.lastrowid
-        conn.close()
+        def insert_folder(cursor):
+            cursor.execute(
+                "INSERT INTO folders (name, auto, name_includes, tag_includes) VALUES (?, ?, ?, ?)",
+                (new_folder['name'], new_folder['auto'], new_folder['name_includes'], new_folder['tag_includes'])
+            )
+            return cursor.lastrowid
+        new_folder['id'] = db_writer.run(insert_folder)
         return jsonify({"status": "success", "folder": new_folder_data}), 201
     except Exception as e:
         return jsonify({"status": "error", "message": "文件夹已存在或发生其他错误: " + str(e)}), 409
@@ -307,31 +442,32 @@ def api_add_folder():
 @bp.route('/api/folders/<string:folder_name>', methods=['PUT'])
 def api_update_folder(folder_name):
     data = request.json
-    try:
-        conn = database.get_db_connection()
-        cursor = conn.cursor()
+    update_fields = {}
+    if 'auto' in data: update_fields['auto'] = bool(data['auto'])
+    if 'name_includes' in data: update_fields['name_includes'] = json.dumps(data['name_includes'])
+    if 'tag_includes' in data: update_fields['tag_includes'] = json.dumps(data['tag_includes'])
+    new_name = data.get('name')
+
+    def update_folder(cursor):
         cursor.execute("SELECT id FROM folders WHERE name = ?", (folder_name,))
-        folder_row = cursor.fetchone()
-        if not folder_row:
-            conn.close()
-            return jsonify({"status": "error", "message": "文件夹未找到"}), 404
-        update_fields = {}
-        if 'auto' in data: update_fields['auto'] = bool(data['auto'])
-        if 'name_includes' in data: update_fields['name_includes'] = json.dumps(data['name_includes'])
-        if 'tag_includes' in data: update_fields['tag_includes'] = json.dumps(data['tag_includes'])
-        new_name = data.get('name')
+        if not cursor.fetchone():
+            return "文件夹未找到", 404
         if new_name and new_name != folder_name:
             cursor.execute("SELECT id FROM folders WHERE name = ?", (new_name,))
             if cursor.fetchone():
-                conn.close()
-                return jsonify({"status": "error", "message": "该文件夹名称已存在"}), 409
+                return "该文件夹名称已存在", 409
             update_fields['name'] = new_name
         if update_fields:
             set_clause = ", ".join([f"{key} = ?" for key in update_fields.keys()])
             params = list(update_fields.values()) + [folder_name]
             cursor.execute(f"UPDATE folders SET {set_clause} WHERE name = ?", tuple(params))
-            conn.commit()
-        conn.close()
+        return None
+
+    try:
+        error = db_writer.run(update_folder)
+        if error is not None:
+            message, status_code = error
+            return jsonify({"status": "error", "message": message}), status_code
         updated_folder_data = next((f for f in database.get_folders() if f['name'] == (new_name or folder_name)), None)
         return jsonify({"status": "success", "folder": updated_folder_data})
     except Exception as e:
@@ -339,19 +475,18 @@ def api_update_folder(folder_name):
 
 @bp.route('/api/folders/<string:folder_name>', methods=['DELETE'])
 def api_delete_folder(folder_name):
-    try:
-        conn = database.get_db_connection()
-        cursor = conn.cursor()
+    def delete_folder(cursor):
         cursor.execute("SELECT id FROM folders WHERE name = ?", (folder_name,))
         folder_row = cursor.fetchone()
         if not folder_row:
-            conn.close()
+            return False
+        cursor.execute("DELETE FROM comic_folders WHERE folder_id = ?", (folder_row['id'],))
+        cursor.execute("DELETE FROM folders WHERE id = ?", (folder_row['id'],))
+        return True
+
+    try:
+        if not db_writer.run(delete_folder):
             return jsonify({"status": "error", "message": "文件夹未找到"}), 404
-        folder_id = folder_row['id']
-        cursor.execute("DELETE FROM comic_folders WHERE folder_id = ?", (folder_id,))
-        cursor.execute("DELETE FROM folders WHERE id = ?", (folder_id,))
-        conn.commit()
-        conn.close()
         return jsonify({"status": "success"})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -359,36 +494,27 @@ def api_delete_folder(folder_name):
 @bp.route('/api/comic/delete_single', methods=['POST'])
 def delete_single_comic():
     data = request.json
-    title = data.get('title')
-    if not title:
-        return jsonify({"status": "error", "message": "缺少标题"}), 400
+    comic_id = data.get('id')
+    if not isinstance(comic_id, int):
+        return jsonify({"status": "error", "message": "缺少漫画 id"}), 400
     try:
         conn = database.get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT local_path, local_cover_path_thumbnail FROM comics WHERE title = ?", (title,))
+        cursor.execute("SELECT title, local_path FROM comics WHERE id = ?", (comic_id,))
         row = cursor.fetchone()
+        conn.close()
         if not row:
-            conn.close()
             return jsonify({"status": "error", "message": "漫画未找到"}), 404
         if row['local_path'] and os.path.exists(row['local_path']):
+            archive_cache.invalidate(row['local_path'])
             try:
                 send2trash.send2trash(row['local_path'])
                 print(f"已将本地漫画文件移动到回收站: {row['local_path']}")
             except OSError as e:
                 print(f"移动本地漫画文件到回收站时出错 {row['local_path']}: {e}")
-        if row['local_cover_path_thumbnail']:
-            base_cover_path = os.path.basename(row['local_cover_path_thumbnail'])
-            for size_name in config.COVER_SIZES.keys():
-                cover_path = os.path.join(config.COVERS_DIRECTORY, size_name, base_cover_path)
-                if os.path.exists(cover_path):
-                    try:
-                        os.remove(cover_path)
-                    except OSError as e:
-                        print(f"删除封面文件时出错 {cover_path}: {e}")
-        cursor.execute("DELETE FROM comics WHERE title = ?", (title,))
-        conn.commit()
-        conn.close()
-        return jsonify({"status": "success", "message": f"成功删除漫画 '{title}'。"})
+        # 封面文件可能被其他漫画共用，随引用计数归零后由 covers.collect_garbage 回收
+        db_writer.run(lambda cursor: cursor.execute("DELETE FROM comics WHERE id = ?", (comic_id,)))
+        return jsonify({"status": "success", "message": f"成功删除漫画 '{row['title']}'。"})
     except Exception as e:
         print(f"--- ERROR in delete_single_comic: {e} ---")
         traceback.print_exc()
@@ -399,13 +525,12 @@ def tampermonkey_sync():
     data = request.json
     if not data:
         return jsonify({"status": "error", "message": "No data received"}), 400
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    try:
-        comic_srcs = data.get('comicSrcs', {})
-        comic_links = data.get('comicLinks', {})
-        comic_tags_from_script = data.get('comicTags', {})
-        online_titles_from_script = set(comic_srcs.keys())
+    comic_srcs = data.get('comicSrcs', {})
+    comic_links = data.get('comicLinks', {})
+    comic_tags_from_script = data.get('comicTags', {})
+    online_titles_from_script = set(comic_srcs.keys())
+
+    def sync(cursor):
         cursor.execute("SELECT title FROM comics WHERE online_url IS NOT NULL AND local_path IS NULL")
         db_online_only_titles = {row['title'] for row in cursor.fetchall()}
         titles_to_remove = db_online_only_titles - online_titles_from_script
@@ -428,7 +553,9 @@ def tampermonkey_sync():
             """, (title, title, time.time(), url, cover_url))
             online_tags = comic_tags_from_script.get(title, [])
             if online_tags:
-                cursor.execute("DELETE FROM comic_tags WHERE type = 'source' AND comic_title = ?", (title,))
+                cursor.execute("SELECT id FROM comics WHERE title = ?", (title,))
+                comic_id = cursor.fetchone()['id']
+                cursor.execute("DELETE FROM comic_tags WHERE type = 'source' AND comic_id = ?", (comic_id,))
                 tags_to_insert = []
                 for tag_name in set(online_tags):
                     if tag_name not in tag_id_map:
@@ -437,21 +564,21 @@ def tampermonkey_sync():
                         tag_id_map[tag_name] = tag_id
                     else:
                         tag_id = tag_id_map[tag_name]
-                    tags_to_insert.append((title, tag_id, 'source'))
+                    tags_to_insert.append((comic_id, tag_id, 'source'))
                 if tags_to_insert:
-                    cursor.executemany("INSERT OR IGNORE INTO comic_tags (comic_title, tag_id, type) VALUES (?, ?, ?)", tags_to_insert)
+                    cursor.executemany("INSERT OR IGNORE INTO comic_tags (comic_id, tag_id, type) VALUES (?, ?, ?)", tags_to_insert)
             updated_count += 1
-        scanner.auto_classify_comics(conn)
-        conn.commit()
+        scanner.auto_classify_comics(cursor)
+        return updated_count
+
+    try:
+        updated_count = db_writer.run(sync)
         print(f"油猴脚本数据同步完成，更新/新增 {updated_count} 条在线漫画信息。")
         return jsonify({"status": "success", "message": "Data synced successfully."})
     except Exception as e:
-        conn.rollback()
         print(f"--- ERROR in tampermonkey_sync: {e} ---")
         traceback.print_exc()
         return jsonify({"status": "error", "message": str(e)}), 500
-    finally:
-        if conn: conn.close()
 
 @bp.route('/api/scan', methods=['POST'])
 def refresh_comics():
@@ -463,8 +590,9 @@ def cleanup_database():
     try:
         conn = database.get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT title, local_path, local_cover_path_thumbnail, online_url FROM comics WHERE local_path IS NOT NULL")
+        cursor.execute("SELECT id, title, local_path, online_url FROM comics WHERE local_path IS NOT NULL")
         rows = cursor.fetchall()
+        conn.close()
         cleaned_count = 0
         comics_to_remove = []
         comics_to_update = []
@@ -472,28 +600,22 @@ def cleanup_database():
             if not os.path.exists(row['local_path']):
                 print(f"  - 正在处理丢失的本地漫画: {row['title']}")
                 cleaned_count += 1
-                if row['local_cover_path_thumbnail']:
-                    base_cover_path = os.path.basename(row['local_cover_path_thumbnail'])
-                    for size_name in config.COVER_SIZES.keys():
-                        cover_path = os.path.join(config.COVERS_DIRECTORY, size_name, base_cover_path)
-                        if os.path.exists(cover_path):
-                            try:
-                                os.remove(cover_path)
-                                print(f"    - 已删除封面 ({size_name})")
-                            except OSError as e:
-                                print(f"    - 无法删除封面 ({size_name}): {e}")
                 if row['online_url']:
-                    comics_to_update.append(row['title'])
+                    comics_to_update.append(row['id'])
                 else:
-                    comics_to_remove.append(row['title'])
-        if comics_to_update:
-            placeholders = ','.join('?' for _ in comics_to_update)
-            cursor.execute(f"UPDATE comics SET local_path = NULL, local_source_folder = NULL, local_cover_path_thumbnail = NULL, local_cover_path_medium = NULL, local_cover_path_large = NULL WHERE title IN ({placeholders})", tuple(comics_to_update))
-        if comics_to_remove:
-            placeholders = ','.join('?' for _ in comics_to_remove)
-            cursor.execute(f"DELETE FROM comics WHERE title IN ({placeholders})", tuple(comics_to_remove))
-        conn.commit()
-        conn.close()
+                    comics_to_remove.append(row['id'])
+        def apply_cleanup(cursor):
+            if comics_to_update:
+                placeholders = ','.join('?' for _ in comics_to_update)
+                cursor.execute(f"UPDATE comics SET local_path = NULL, local_source_folder = NULL, cover_hash = NULL, local_cover_path_thumbnail = NULL, local_cover_path_medium = NULL, local_cover_path_large = NULL WHERE id IN ({placeholders})", tuple(comics_to_update))
+            if comics_to_remove:
+                placeholders = ','.join('?' for _ in comics_to_remove)
+                cursor.execute(f"DELETE FROM comics WHERE id IN ({placeholders})", tuple(comics_to_remove))
+            # 顺便校正触发器维护的标签/文件夹摘要列、全文搜索索引和书架计数
+            database.rebuild_comic_summary(cursor)
+            database.rebuild_search_index(cursor)
+            database.rebuild_library_counters(cursor)
+        db_writer.run(apply_cleanup)
         message = f"清理完成。共处理 {cleaned_count} 个无效条目。"
         print(message)
         return jsonify({"status": "success", "message": message, "cleaned_count": cleaned_count})
@@ -535,25 +657,23 @@ def manage_folders():
         if folder_path in app_config['managed_folders']:
             app_config['managed_folders'].remove(folder_path)
             config.save_config(app_config)
-            try:
-                conn = database.get_db_connection()
-                cursor = conn.cursor()
+            def detach_folder(cursor):
                 path_pattern = folder_path + '%'
-                cursor.execute("SELECT title, online_url FROM comics WHERE local_source_folder LIKE ?", (path_pattern,))
+                cursor.execute("SELECT id, online_url FROM comics WHERE local_source_folder LIKE ?", (path_pattern,))
                 rows = cursor.fetchall()
                 comics_to_remove = []
                 comics_to_update = []
                 for row in rows:
-                    if row['online_url']: comics_to_update.append(row['title'])
-                    else: comics_to_remove.append(row['title'])
+                    if row['online_url']: comics_to_update.append(row['id'])
+                    else: comics_to_remove.append(row['id'])
                 if comics_to_update:
                     placeholders = ','.join('?' for _ in comics_to_update)
-                    cursor.execute(f"UPDATE comics SET local_path = NULL, local_source_folder = NULL WHERE title IN ({placeholders})", tuple(comics_to_update))
+                    cursor.execute(f"UPDATE comics SET local_path = NULL, local_source_folder = NULL WHERE id IN ({placeholders})", tuple(comics_to_update))
                 if comics_to_remove:
                     placeholders = ','.join('?' for _ in comics_to_remove)
-                    cursor.execute(f"DELETE FROM comics WHERE title IN ({placeholders})", tuple(comics_to_remove))
-                conn.commit()
-                conn.close()
+                    cursor.execute(f"DELETE FROM comics WHERE id IN ({placeholders})", tuple(comics_to_remove))
+            try:
+                db_writer.run(detach_folder)
                 cleanup_database()
                 return jsonify({"status": "success", "message": "文件夹已移除"})
             except Exception as e:
@@ -581,17 +701,16 @@ def relocate_folder():
         cursor = conn.cursor()
         old_path_norm = os.path.normpath(old_path)
         new_path_norm = os.path.normpath(new_path)
-        cursor.execute("SELECT title, local_path, local_source_folder FROM comics WHERE local_path LIKE ?", (old_path_norm + '%',))
+        cursor.execute("SELECT id, local_path, local_source_folder FROM comics WHERE local_path LIKE ?", (old_path_norm + '%',))
         rows = cursor.fetchall()
+        conn.close()
         updates = []
         for row in rows:
             new_comic_path = os.path.join(new_path_norm, os.path.relpath(os.path.normpath(row['local_path']), old_path_norm))
             new_source_folder = new_path if os.path.normpath(row['local_source_folder']) == old_path_norm else row['local_source_folder']
-            updates.append((new_comic_path, new_source_folder, row['title']))
+            updates.append((new_comic_path, new_source_folder, row['id']))
         if updates:
-            cursor.executemany("UPDATE comics SET local_path = ?, local_source_folder = ? WHERE title = ?", updates)
-            conn.commit()
-        conn.close()
+            db_writer.run(lambda cursor: cursor.executemany("UPDATE comics SET local_path = ?, local_source_folder = ? WHERE id = ?", updates))
         message = f"路径已成功迁移。在 {len(updates)} 本漫画中更新了路径。"
         print(message)
         return jsonify({"status": "success", "message": message, "updated_count": len(updates)})
@@ -601,22 +720,18 @@ def relocate_folder():
 @bp.route('/api/comics/favorite', methods=['POST'])
 def handle_favorite():
     data = request.json
-    titles_to_update = data.get('titles', [])
+    ids_to_update = data.get('ids', [])
     set_to = data.get('favorite')
-    if not isinstance(titles_to_update, list):
-        return jsonify({"status": "error", "message": "无效的请求格式，需要 titles 列表"}), 400
-    if not titles_to_update:
+    if not isinstance(ids_to_update, list):
+        return jsonify({"status": "error", "message": "无效的请求格式，需要 ids 列表"}), 400
+    if not ids_to_update:
         return jsonify({"status": "success"})
     try:
-        conn = database.get_db_connection()
-        cursor = conn.cursor()
-        placeholders = ','.join('?' for _ in titles_to_update)
+        placeholders = ','.join('?' for _ in ids_to_update)
         if set_to is None:
-            cursor.execute(f"UPDATE comics SET is_favorite = NOT is_favorite WHERE title IN ({placeholders})", tuple(titles_to_update))
+            db_writer.run(lambda cursor: cursor.execute(f"UPDATE comics SET is_favorite = NOT is_favorite WHERE id IN ({placeholders})", tuple(ids_to_update)))
         else:
-            cursor.execute(f"UPDATE comics SET is_favorite = ? WHERE title IN ({placeholders})", (bool(set_to),) + tuple(titles_to_update))
-        conn.commit()
-        conn.close()
+            db_writer.run(lambda cursor: cursor.execute(f"UPDATE comics SET is_favorite = ? WHERE id IN ({placeholders})", (bool(set_to),) + tuple(ids_to_update)))
         return jsonify({"status": "success"})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -624,49 +739,45 @@ def handle_favorite():
 @bp.route('/api/comics/delete_full', methods=['POST'])
 def delete_full_comics():
     data = request.json
-    titles_to_delete = data.get('titles', [])
-    if not isinstance(titles_to_delete, list):
-        return jsonify({"status": "error", "message": "Invalid request format, 'titles' list required"}), 400
-    if not titles_to_delete:
+    ids_to_delete = data.get('ids', [])
+    if not isinstance(ids_to_delete, list):
+        return jsonify({"status": "error", "message": "Invalid request format, 'ids' list required"}), 400
+    if not ids_to_delete:
         return jsonify({"status": "success", "deleted_count": 0})
     try:
         conn = database.get_db_connection()
         cursor = conn.cursor()
-        placeholders = ','.join('?' for _ in titles_to_delete)
-        cursor.execute(f"SELECT title, local_path, local_cover_path_thumbnail FROM comics WHERE title IN ({placeholders})", tuple(titles_to_delete))
+        placeholders = ','.join('?' for _ in ids_to_delete)
+        cursor.execute(f"SELECT local_path FROM comics WHERE id IN ({placeholders})", tuple(ids_to_delete))
         rows = cursor.fetchall()
+        conn.close()
         for row in rows:
             if row['local_path'] and os.path.exists(row['local_path']):
+                archive_cache.invalidate(row['local_path'])
                 try:
                     send2trash.send2trash(row['local_path'])
                     print(f"已将本地漫画文件移动到回收站: {row['local_path']}")
                 except OSError as e:
                     print(f"移动本地漫画文件到回收站时出错 {row['local_path']}: {e}")
-            if row['local_cover_path_thumbnail']:
-                base_cover_path = os.path.basename(row['local_cover_path_thumbnail'])
-                for size_name in config.COVER_SIZES.keys():
-                    cover_path = os.path.join(config.COVERS_DIRECTORY, size_name, base_cover_path)
-                    if os.path.exists(cover_path):
-                        try: os.remove(cover_path)
-                        except OSError as e: print(f"Error deleting cover file {cover_path}: {e}")
-        cursor.execute(f"DELETE FROM comics WHERE title IN ({placeholders})", tuple(titles_to_delete))
-        deleted_count = cursor.rowcount
-        conn.commit()
-        conn.close()
+        def delete_comics(cursor):
+            cursor.execute(f"DELETE FROM comics WHERE id IN ({placeholders})", tuple(ids_to_delete))
+            return cursor.rowcount
+        deleted_count = db_writer.run(delete_comics)
         return jsonify({"status": "success", "message": f"Successfully deleted {deleted_count} comics.", "deleted_count": deleted_count})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
-@bp.route('/api/comic/<string:title>/tags', methods=['POST'])
-def handle_single_tag(title):
+@bp.route('/api/comic/<int:comic_id>/tags', methods=['POST'])
+def handle_single_tag(comic_id):
     data = request.json
     action = data.get('action')
     tag_name = data.get('tag')
     if not all([action, tag_name]):
         return jsonify({"status": "error", "message": "需要提供 'action' 和 'tag'"}), 400
-    try:
-        conn = database.get_db_connection()
-        cursor = conn.cursor()
+    if action not in ('add', 'remove'):
+        return jsonify({"status": "error", "message": "无效的 'action'"}), 400
+
+    def apply_tag(cursor):
         cursor.execute("SELECT id FROM tags WHERE name = ?", (tag_name,))
         tag_row = cursor.fetchone()
         if not tag_row:
@@ -675,16 +786,14 @@ def handle_single_tag(title):
         else:
             tag_id = tag_row['id']
         if action == 'add':
-            cursor.execute("DELETE FROM comic_tags WHERE comic_title = ? AND tag_id = ? AND type = 'removed'", (title, tag_id))
-            cursor.execute("INSERT OR IGNORE INTO comic_tags (comic_title, tag_id, type) VALUES (?, ?, 'added')", (title, tag_id))
-        elif action == 'remove':
-            cursor.execute("DELETE FROM comic_tags WHERE comic_title = ? AND tag_id = ? AND type = 'added'", (title, tag_id))
-            cursor.execute("INSERT OR IGNORE INTO comic_tags (comic_title, tag_id, type) VALUES (?, ?, 'removed')", (title, tag_id))
+            cursor.execute("DELETE FROM comic_tags WHERE comic_id = ? AND tag_id = ? AND type = 'removed'", (comic_id, tag_id))
+            cursor.execute("INSERT OR IGNORE INTO comic_tags (comic_id, tag_id, type) VALUES (?, ?, 'added')", (comic_id, tag_id))
         else:
-            conn.close()
-            return jsonify({"status": "error", "message": "无效的 'action'"}), 400
-        conn.commit()
-        conn.close()
+            cursor.execute("DELETE FROM comic_tags WHERE comic_id = ? AND tag_id = ? AND type = 'added'", (comic_id, tag_id))
+            cursor.execute("INSERT OR IGNORE INTO comic_tags (comic_id, tag_id, type) VALUES (?, ?, 'removed')", (comic_id, tag_id))
+
+    try:
+        db_writer.run(apply_tag)
         return jsonify({"status": "success"})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -692,23 +801,23 @@ def handle_single_tag(title):
 @bp.route('/api/comics/folder', methods=['POST'])
 def handle_folder_assignment():
     data = request.json
-    titles_to_update = data.get('titles', [])
+    ids_to_update = data.get('ids', [])
     folder_name = data.get('folder')
-    if not isinstance(titles_to_update, list) or not folder_name:
+    if not isinstance(ids_to_update, list) or not folder_name:
         return jsonify({"status": "error", "message": "无效的请求格式"}), 400
-    try:
-        conn = database.get_db_connection()
-        cursor = conn.cursor()
+
+    def assign_folder(cursor):
         cursor.execute("SELECT id FROM folders WHERE name = ?", (folder_name,))
         folder_row = cursor.fetchone()
         if not folder_row:
-            conn.close()
+            return False
+        inserts = [(comic_id, folder_row['id']) for comic_id in ids_to_update]
+        cursor.executemany("INSERT OR IGNORE INTO comic_folders (comic_id, folder_id) VALUES (?, ?)", inserts)
+        return True
+
+    try:
+        if not db_writer.run(assign_folder):
             return jsonify({"status": "error", "message": "文件夹未找到"}), 404
-        folder_id = folder_row['id']
-        inserts = [(title, folder_id) for title in titles_to_update]
-        cursor.executemany("INSERT OR IGNORE INTO comic_folders (comic_title, folder_id) VALUES (?, ?)", inserts)
-        conn.commit()
-        conn.close()
         return jsonify({"status": "success"})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -716,18 +825,14 @@ def handle_folder_assignment():
 @bp.route('/api/comics/folder/remove_all', methods=['POST'])
 def remove_from_all_folders():
     data = request.json
-    titles_to_update = data.get('titles', [])
-    if not isinstance(titles_to_update, list):
+    ids_to_update = data.get('ids', [])
+    if not isinstance(ids_to_update, list):
         return jsonify({"status": "error", "message": "无效的请求格式"}), 400
-    if not titles_to_update:
+    if not ids_to_update:
         return jsonify({"status": "success"})
     try:
-        conn = database.get_db_connection()
-        cursor = conn.cursor()
-        placeholders = ','.join('?' for _ in titles_to_update)
-        cursor.execute(f"DELETE FROM comic_folders WHERE comic_title IN ({placeholders})", tuple(titles_to_update))
-        conn.commit()
-        conn.close()
+        placeholders = ','.join('?' for _ in ids_to_update)
+        db_writer.run(lambda cursor: cursor.execute(f"DELETE FROM comic_folders WHERE comic_id IN ({placeholders})", tuple(ids_to_update)))
         return jsonify({"status": "success"})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -735,110 +840,304 @@ def remove_from_all_folders():
 @bp.route('/api/comics/merge', methods=['POST'])
 def merge_comics():
     data = request.json
-    online_comic_title = data.get('online_comic_title')
-    local_comic_title = data.get('local_comic_title')
-    if not online_comic_title or not local_comic_title:
-        return jsonify({"status": "error", "message": "缺少在线漫画或本地漫画的标题"}), 400
-    try:
-        conn = database.get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT local_path, local_source_folder, local_cover_path_thumbnail, local_cover_path_medium, local_cover_path_large FROM comics WHERE title = ?", (local_comic_title,))
+    online_comic_id = data.get('online_comic_id')
+    local_comic_id = data.get('local_comic_id')
+    if not isinstance(online_comic_id, int) or not isinstance(local_comic_id, int):
+        return jsonify({"status": "error", "message": "缺少在线漫画或本地漫画的 id"}), 400
+
+    def merge(cursor):
+        """返回 (错误信息, 本地漫画标题, 在线漫画标题)。"""
+        cursor.execute("SELECT title, local_path, local_source_folder, cover_hash, local_cover_path_thumbnail, local_cover_path_medium, local_cover_path_large FROM comics WHERE id = ?", (local_comic_id,))
         local_row = cursor.fetchone()
         if not local_row or not local_row['local_path']:
-            conn.close()
-            return jsonify({"status": "error", "message": f"'{local_comic_title}' 不是一个有效的本地漫画"}), 400
+            return "所选的本地漫画无效", None, None
+        cursor.execute("SELECT title FROM comics WHERE id = ? AND online_url IS NOT NULL", (online_comic_id,))
+        online_row = cursor.fetchone()
+        if not online_row:
+            return "所选的在线漫画无效", None, None
         cursor.execute("""
             UPDATE comics SET
-                local_path = ?, local_source_folder = ?,
+                local_path = ?, local_source_folder = ?, cover_hash = ?,
                 local_cover_path_thumbnail = ?, local_cover_path_medium = ?, local_cover_path_large = ?
-            WHERE title = ? AND online_url IS NOT NULL
+            WHERE id = ?
         """, (
-            local_row['local_path'], local_row['local_source_folder'],
+            local_row['local_path'], local_row['local_source_folder'], local_row['cover_hash'],
             local_row['local_cover_path_thumbnail'], local_row['local_cover_path_medium'], local_row['local_cover_path_large'],
-            online_comic_title
+            online_comic_id
         ))
-        if cursor.rowcount == 0:
-            conn.close()
-            return jsonify({"status": "error", "message": f"'{online_comic_title}' 不是一个有效的在线漫画或更新失败"}), 400
-        cursor.execute("DELETE FROM comics WHERE title = ?", (local_comic_title,))
-        conn.commit()
-        conn.close()
-        return jsonify({"status": "success", "message": f"漫画 '{local_comic_title}' 已成功合并到 '{online_comic_title}'。"})
+        cursor.execute("DELETE FROM comics WHERE id = ?", (local_comic_id,))
+        return None, local_row['title'], online_row['title']
+
+    try:
+        error_message, local_title, online_title = db_writer.run(merge)
+        if error_message is not None:
+            return jsonify({"status": "error", "message": error_message}), 400
+        return jsonify({"status": "success", "message": f"漫画 '{local_title}' 已成功合并到 '{online_title}'。"})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
-@bp.route('/api/comic/pages')
-def get_comic_pages():
-    comic_path = request.args.get('path')
-    if not comic_path or not is_safe_path(comic_path): return "无效的漫画路径", 400
+def _load_page_manifest(comic_id):
+    """
+    返回 (local_path, 页面行列表)。数据库中的清单与压缩包的 mtime/size 不一致时先重建；
+    漫画不存在或没有本地文件时返回 (None, None)。
+    """
+    conn = database.get_db_connection()
     try:
-        pages = scanner.get_image_files_from_zip(comic_path)
-        conn = database.get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("UPDATE comics SET totalPages = ? WHERE local_path = ?", (len(pages), comic_path))
-        conn.commit()
+        cursor.execute("SELECT local_path, currentPage, archive_mtime_ns, archive_size FROM comics WHERE id = ?", (comic_id,))
+        row = cursor.fetchone()
+        if not row or not row['local_path']:
+            return None, None
+        page_scheduler.update_position(comic_id, progress_buffer.current_page(comic_id, row['currentPage']))
+        comic_stat = os.stat(row['local_path'])
+        if not scanner.is_manifest_current(row, comic_stat):
+            pages, comic_stat = scanner.load_page_manifest(row['local_path'])
+            db_writer.run(scanner.store_page_manifest, comic_id, pages, comic_stat)
+        cursor.execute("SELECT page_index, entry_name, file_size, crc, width, height FROM comic_pages WHERE comic_id = ? ORDER BY page_index", (comic_id,))
+        return row['local_path'], cursor.fetchall()
+    finally:
         conn.close()
-        return jsonify(pages)
+
+@bp.route('/api/comic/<int:comic_id>/pages')
+def get_comic_pages(comic_id):
+    try:
+        comic_path, pages = _load_page_manifest(comic_id)
+        if comic_path is None:
+            return jsonify({"error": "漫画未找到或没有本地文件。"}), 404
+        if is_rar(comic_path) and pages:
+            # 固实 RAR 只能顺序解压，打开阅读器时就在后台开始解压整卷
+            rar_cache.prefetch(comic_path)
+        return jsonify([
+            {"name": page['entry_name'], "version": page_stream.page_etag(comic_id, page)}
+            for page in pages
+        ])
+    except FileNotFoundError:
+        return jsonify({"error": "漫画文件未找到，可能已被移动或删除。"}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def _fill_page_dimensions(comic_id, comic_path, pages):
+    """
+    为清单中缺少尺寸的页面（旧版本建立的清单或 RAR 漫画）读取图片文件头并写回数据库。
+    返回 页码 -> (宽, 高)，无法识别的页面记为 (0, 0)，避免之后重复尝试。
+    """
+    sizes = {}
+    if is_rar(comic_path):
+        for page in pages:
+            with rar_cache.open_page(comic_path, page['entry_name']) as f:
+                sizes[page['page_index']] = scanner.read_image_size(f)
+    else:
+        with archive_cache.open(comic_path) as archive:
+            for page in pages:
+                info = archive.entries.get(page['entry_name'])
+                if info is None:
+                    continue
+                with archive.zip.open(info) as entry:
+                    sizes[page['page_index']] = scanner.read_image_size(entry)
+    sizes = {index: (w or 0, h or 0) for index, (w, h) in sizes.items()}
+    db_writer.run(lambda cursor: cursor.executemany(
+        "UPDATE comic_pages SET width = ?, height = ? WHERE comic_id = ? AND page_index = ?",
+        [(w, h, comic_id, index) for index, (w, h) in sizes.items()]
+    ))
+    return sizes
+
+@bp.route('/api/comic/<int:comic_id>/pages/dimensions')
+def get_comic_page_dimensions(comic_id):
+    """一次返回所有页面的像素尺寸 [宽, 高]，供长条模式预先排版占位。未知尺寸为 [0, 0]。"""
+    try:
+        comic_path, pages = _load_page_manifest(comic_id)
+        if comic_path is None:
+            return jsonify({"error": "漫画未找到或没有本地文件。"}), 404
+        sizes = {page['page_index']: (page['width'], page['height']) for page in pages}
+        missing = [page for page in pages if page['width'] is None]
+        if missing:
+            sizes.update(_fill_page_dimensions(comic_id, comic_path, missing))
+        return jsonify({"pages": [[w or 0, h or 0] for w, h in (sizes[page['page_index']] for page in pages)]})
     except FileNotFoundError:
         return jsonify({"error": "漫画文件未找到，可能已被移动或删除。"}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@bp.route('/api/comic/page')
-def get_comic_page():
-    comic_path = request.args.get('path')
-    page_file = request.args.get('page')
-    if not comic_path or not page_file or not is_safe_path(comic_path): return "无效请求", 400
+def _query_page(comic_id, page_index):
+    """按漫画和页码查询页面清单中的一行（连同压缩包路径与指纹）。"""
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT c.local_path, c.archive_mtime_ns, c.archive_size,
+            p.entry_name, p.header_offset, p.compress_type, p.file_size, p.crc
+        FROM comic_pages p JOIN comics c ON p.comic_id = c.id
+        WHERE p.comic_id = ? AND p.page_index = ?
+    """, (comic_id, page_index))
+    row = cursor.fetchone()
+    conn.close()
+    return row
+
+@bp.route('/api/comic/<int:comic_id>/page/<int:page_index>')
+def get_comic_page(comic_id, page_index):
     try:
-        with zipfile.ZipFile(comic_path, 'r') as z:
-            if page_file in z.namelist():
-                image_data = z.read(page_file)
-                return send_file(io.BytesIO(image_data), mimetype=f'image/{os.path.splitext(page_file)[1][1:]}')
-            else:
-                return "页面在压缩包中未找到", 404
+        row = _query_page(comic_id, page_index)
+        if row and row['local_path'] and not scanner.is_manifest_current(row, os.stat(row['local_path'])):
+            # 压缩包在扫描之后被修改过，先重建清单再定位页面
+            _load_page_manifest(comic_id)
+            row = _query_page(comic_id, page_index)
+        if not row or not row['local_path']:
+            return "页面未找到", 404
+        etag = page_stream.page_etag(comic_id, row)
+        immutable = request.args.get('v') == etag
+        width = page_derivatives.normalize_width(request.args.get('w', type=int))
+        fmt = page_derivatives.normalize_format(request.args.get('fmt'))
+        if width or fmt:
+            prefetcher.note_variant(comic_id, width, fmt)
+            return _send_page_derivative(comic_id, page_index, row, etag, width, fmt, immutable)
+        not_modified = page_stream.not_modified_response(etag, row['archive_mtime_ns'], immutable)
+        if not_modified is not None:
+            return not_modified
+        return _scheduled_response(comic_id, page_index, row['local_path'], lambda: page_stream.apply_cache_headers(
+            page_stream.send_page(row['local_path'], row, etag), etag, row['archive_mtime_ns'], immutable
+        ))
     except FileNotFoundError:
         return "漫画文件未找到，可能已被移动或删除。", 404
     except Exception as e:
         print(f"获取漫画页面时发生未知错误: {e}")
         return str(e), 500
 
+def _send_page_derivative(comic_id, page_index, row, page_etag, width, fmt, immutable):
+    """发送缩放/转码后的页面；原图已经足够小且无需转码时直接发送原图。"""
+    etag = page_derivatives.derivative_etag(page_etag, width, fmt)
+    not_modified = page_stream.not_modified_response(etag, row['archive_mtime_ns'], immutable)
+    if not_modified is not None:
+        return not_modified
+
+    def send():
+        # 直接拿到打开的文件再发送，避免路径返回后文件被淘汰
+        f, mimetype = page_derivatives.derivative_cache.open_file(
+            etag, lambda: page_stream.read_page_bytes(row['local_path'], row, page_etag), width, fmt
+        )
+        if f is None:
+            # 原图与原页面共用同一份页面缓存，派生 ETag 只用于校验
+            response = page_stream.send_page(row['local_path'], row, etag, cache_key=page_etag)
+        else:
+            response = send_file(f, mimetype=mimetype, conditional=False, etag=False)
+            response.content_length = os.fstat(f.fileno()).st_size
+        return page_stream.apply_cache_headers(response, etag, row['archive_mtime_ns'], immutable)
+    return _scheduled_response(comic_id, page_index, row['local_path'], send)
+
+def _page_unavailable(status, message):
+    """页面暂时无法发送时的 503 响应，客户端稍后重试。"""
+    response = jsonify({"status": status, "message": message})
+    response.status_code = 503
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+def _scheduled_response(comic_id, page_index, comic_path, send):
+    """
+    在页面调度器分配的名额内生成响应，名额在响应体发送完毕（或连接中断）后才归还。
+    优先级提示来自 X-Page-Priority 请求头或 prio 参数 (visible/normal/prefetch)。
+    RAR 卷在获取名额之前等待解压完成，解压期间不占用名额。
+    """
+    hint = request.headers.get('X-Page-Priority') or request.args.get('prio')
+    if hint == 'visible':
+        page_scheduler.update_position(comic_id, page_index)
+    if is_rar(comic_path):
+        try:
+            rar_cache.wait_ready(comic_path, config.RAR_PAGE_WAIT_TIMEOUT_S)
+        except FutureTimeoutError:
+            return _page_unavailable("timeout", "压缩包仍在解压，请稍后重试")
+    try:
+        ticket = page_scheduler.acquire(comic_id, page_index, hint)
+    except PageRequestTimeout:
+        return _page_unavailable("timeout", "页面请求排队超时，请稍后重试")
+    except PageRequestCancelled:
+        return _page_unavailable("cancelled", "读者已翻过该页，请求已取消")
+    try:
+        response = send()
+    except Exception:
+        ticket.release()
+        raise
+    # direct_passthrough 的响应不会触发 call_on_close，因此直接包装响应体
+    response.response = ClosingIterator(response.response, ticket.release)
+    return response
+
 @bp.route('/api/comic/progress', methods=['POST'])
 def update_progress():
     data = request.json
-    comic_path, page = data.get('path'), data.get('page')
-    if not comic_path or not is_safe_path(comic_path) or page is None: return "无效请求", 400
+    comic_id, page = data.get('id'), data.get('page')
+    if not isinstance(comic_id, int) or page is None:
+        return jsonify({"status": "error", "message": "缺少漫画 id 或页码"}), 400
+    if not isinstance(page, int) or isinstance(page, bool) or page < 0:
+        return jsonify({"status": "error", "message": "页码必须是非负整数"}), 400
     try:
         conn = database.get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("UPDATE comics SET currentPage = ? WHERE local_path = ?", (page, comic_path))
-        conn.commit()
-        if cursor.rowcount == 0:
-            conn.close()
-            return jsonify({"status": "error", "message": "未找到漫画"}), 404
+        cursor.execute("SELECT local_path FROM comics WHERE id = ?", (comic_id,))
+        row = cursor.fetchone()
         conn.close()
+        if not row:
+            return jsonify({"status": "error", "message": "未找到漫画"}), 404
+        page_scheduler.update_position(comic_id, page)
+        progress_buffer.record(comic_id, page)
+        # 只有本地漫画需要预热后续页面
+        if row['local_path']:
+            prefetcher.on_progress(row['local_path'], page)
         return jsonify({"status": "success"})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@bp.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify({
+        "archives": archive_cache.stats(),
+        "rar": rar_cache.stats(),
+        "pages": page_cache.stats(),
+        "derivatives": page_derivatives.derivative_cache.stats(),
+        "scheduler": page_scheduler.stats(),
+        "prefetch": prefetcher.stats(),
+        "database": database.connection_pool.stats(),
+        "writer": db_writer.stats(),
+        "progress": progress_buffer.stats(),
+        "listing": listing_cache.stats(),
+        "covers": cover_builder.stats()
+    })
+
+@bp.route('/api/maintenance', methods=['GET'])
+def get_maintenance_status():
+    """返回数据库维护状态、上次运行的报告和当前的数据库大小。"""
+    status = maintenance.stats()
+    status["current"] = maintenance_sizes()
+    return jsonify(status)
+
+@bp.route('/api/maintenance/run', methods=['POST'])
+def run_maintenance():
+    if not maintenance.run_in_background():
+        return jsonify({"status": "error", "message": "数据库维护正在进行中"}), 409
+    return jsonify({"status": "success", "message": "数据库维护已开始"}), 202
+
 @bp.route('/api/clean_cover_cache', methods=['POST'])
 def clean_cover_cache():
     print("开始清理无效的封面缓存...")
     try:
+        if not os.path.exists(config.COVERS_DIRECTORY):
+            return jsonify({"status": "success", "message": "封面文件夹不存在。", "deleted_files": 0})
+        # 手动清理时不等宽限期，但扫描进行中可能正要复用刚释放的封面，仍保留宽限期
+        grace_s = config.COVER_GC_GRACE_S if scanner.scan_progress['in_progress'] else 0
+        released, deleted_count = db_writer.run(covers.collect_garbage, config.COVERS_DIRECTORY, grace_s)
+
+        # 再清除不在 covers 表中的文件：旧版本遗留的孤立封面，以及写入一半的临时文件
         conn = database.get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT local_cover_path_thumbnail FROM comics WHERE local_cover_path_thumbnail IS NOT NULL")
-        referenced_covers = {os.path.basename(row['local_cover_path_thumbnail']) for row in cursor.fetchall()}
+        cursor.execute("SELECT hash, ext FROM covers")
+        referenced_covers = {row['hash'] + row['ext'] for row in cursor.fetchall()}
+        cursor.execute("SELECT local_cover_path_thumbnail FROM comics WHERE cover_hash IS NULL AND local_cover_path_thumbnail IS NOT NULL")
+        referenced_covers.update(os.path.basename(row['local_cover_path_thumbnail']) for row in cursor.fetchall())
         conn.close()
-        if not os.path.exists(config.COVERS_DIRECTORY):
-            return jsonify({"status": "success", "message": "封面文件夹不存在。", "deleted_files": 0})
         actual_files = set()
-        for size_dir in os.listdir(config.COVERS_DIRECTORY):
-            full_size_dir = os.path.join(config.COVERS_DIRECTORY, size_dir)
-            if os.path.isdir(full_size_dir):
-                for file in os.listdir(full_size_dir):
-                    actual_files.add(file)
+        if not scanner.scan_progress['in_progress']:
+            for size_dir in os.listdir(config.COVERS_DIRECTORY):
+                full_size_dir = os.path.join(config.COVERS_DIRECTORY, size_dir)
+                if os.path.isdir(full_size_dir):
+                    for file in os.listdir(full_size_dir):
+                        actual_files.add(file)
         orphaned_files = actual_files - referenced_covers
-        deleted_count = 0
         for file in orphaned_files:
             for size_name in config.COVER_SIZES.keys():
                 file_path = os.path.join(config.COVERS_DIRECTORY, size_name, file)
@@ -848,8 +1147,8 @@ def clean_cover_cache():
                         deleted_count += 1
                     except OSError as e:
                         print(f"  - 无法删除 {file_path}: {e}")
-        print(f"清理完成。共删除 {deleted_count} 个文件。")
-        return jsonify({"status": "success", "message": "缓存清理完成。", "deleted_files": deleted_count})
+        print(f"清理完成。回收了 {released} 组不再被引用的封面，共删除 {deleted_count} 个文件。")
+        return jsonify({"status": "success", "message": "缓存清理完成。", "deleted_files": deleted_count, "released_covers": released})
     except Exception as e:
         print(f"--- 清理缓存时发生错误: {e} ---")
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -858,15 +1157,14 @@ def clean_cover_cache():
 def clear_all_data():
     print("开始清除所有数据...")
     try:
-        conn = database.get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM comics")
-        cursor.execute("DELETE FROM tags")
-        cursor.execute("DELETE FROM folders")
-        cursor.execute("DELETE FROM comic_tags")
-        cursor.execute("DELETE FROM comic_folders")
-        conn.commit()
-        conn.close()
+        def clear_tables(cursor):
+            cursor.execute("DELETE FROM comics")
+            cursor.execute("DELETE FROM tags")
+            cursor.execute("DELETE FROM folders")
+            cursor.execute("DELETE FROM comic_tags")
+            cursor.execute("DELETE FROM comic_folders")
+            cursor.execute("DELETE FROM covers")
+        db_writer.run(clear_tables)
         print("Cleared all tables in the database.")
         default_config = {"managed_folders": []}
         config.save_config(default_config)
@@ -888,4 +1186,32 @@ def clear_all_data():
 
 @bp.route('/<path:path>')
 def serve_static(path):
+    if path.startswith('covers/'):
+        return _serve_cover(path)
     return send_from_directory(config.WEB_DIRECTORY, path)
+
+def _serve_cover(path):
+    """
+    发送封面图片；ETag 取自文件的 mtime/size，命中时直接返回 304 而不读取文件。
+    已登记但还没有生成的尺寸在这里按需生成。
+    """
+    cover_file = safe_join(config.WEB_DIRECTORY, path)
+    if cover_file is None:
+        return "无效请求", 400
+    try:
+        st = os.stat(cover_file)
+    except OSError:
+        parts = path.split('/')
+        if len(parts) != 3 or not cover_builder.ensure(parts[1], parts[2]):
+            return "封面未找到", 404
+        try:
+            st = os.stat(cover_file)
+        except OSError:
+            return "封面未找到", 404
+    etag = hashlib.sha1(f"{path}\0{st.st_mtime_ns}\0{st.st_size}".encode('utf-8')).hexdigest()[:24]
+    immutable = request.args.get('v') == etag
+    not_modified = page_stream.not_modified_response(etag, st.st_mtime_ns, immutable)
+    if not_modified is not None:
+        return not_modified
+    response = send_from_directory(config.WEB_DIRECTORY, path, etag=False, conditional=False)
+    return page_stream.apply_cache_headers(response, etag, st.st_mtime_ns, immutable)
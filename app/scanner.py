@@ -1,20 +1,28 @@
 import os
 import zipfile
 import json
-import io
 import time
 import traceback
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from PIL import Image
 import rarfile
 
 import database
+import covers
+from db_writer import db_writer
 from config import (
     get_config,
     COVERS_DIRECTORY,
     COVER_SIZES,
+    COVER_WORKERS,
+    COVER_MAX_IN_FLIGHT,
+    COVER_DB_BATCH,
+    COVER_WARMUP_SIZES,
     ALLOWED_EXTENSIONS,
-    IMAGE_EXTENSIONS,
-    WEB_DIRECTORY
+    RAR_EXTENSIONS,
+    IMAGE_EXTENSIONS
 )
 
 # --- 扫描进度跟踪 ---
@@ -25,6 +33,23 @@ scan_progress = {
     "message": ""
 }
 
+class ScanCancelled(Exception):
+    """扫描被 cancel_scan() 取消。"""
+
+_scan_cancel = threading.Event()
+
+def cancel_scan():
+    """请求取消正在进行的扫描，没有扫描在进行时返回 False。"""
+    if not scan_progress['in_progress']:
+        return False
+    _scan_cancel.set()
+    scan_progress['message'] = "正在取消扫描..."
+    return True
+
+def _check_cancelled():
+    if _scan_cancel.is_set():
+        raise ScanCancelled()
+
 # --- 文件名和压缩包处理 ---
 def sanitize_filename(filename):
     """
@@ -48,11 +73,15 @@ def sanitize_filename(filename):
         filename = filename[:200]
     return filename
 
+def is_image_entry(name):
+    """判断压缩包内的条目是否为漫画页面图片。"""
+    return not name.startswith('__MACOSX/') and not name.endswith('/') and any(name.lower().endswith(ext) for ext in IMAGE_EXTENSIONS)
+
 def get_image_files_from_zip(zip_path):
     """从 ZIP 文件中获取所有图片文件的列表。"""
     try:
         with zipfile.ZipFile(zip_path, 'r') as z:
-            return sorted([f for f in z.namelist() if not f.startswith('__MACOSX/') and not f.endswith('/') and any(f.lower().endswith(ext) for ext in IMAGE_EXTENSIONS)])
+            return sorted([f for f in z.namelist() if is_image_entry(f)])
     except FileNotFoundError:
         raise
     except Exception as e:
@@ -74,7 +103,7 @@ def get_image_files_from_rar(rar_path):
     """从 RAR 文件中获取所有图片文件的列表。"""
     try:
         with rarfile.RarFile(rar_path, 'r') as r:
-            return sorted([f.filename for f in r.infolist() if not f.isdir and any(f.filename.lower().endswith(ext) for ext in IMAGE_EXTENSIONS)])
+            return sorted([f.filename for f in r.infolist() if not f.isdir() and is_image_entry(f.filename)])
     except FileNotFoundError:
         raise
     except rarfile.BadRarFile:
@@ -96,6 +125,98 @@ def get_first_image_from_rar(rar_path):
         print(f"无法提取 RAR 封面 {rar_path}: {e}")
     return None
 
+def get_first_image(comic_path):
+    """根据扩展名从 ZIP/CBZ 或 RAR 中提取第一张图片作为封面。"""
+    file_extension = os.path.splitext(comic_path)[1].lower()
+    if file_extension in RAR_EXTENSIONS:
+        return get_first_image_from_rar(comic_path)
+    return get_first_image_from_zip(comic_path)
+
+# --- 页面清单 ---
+def read_image_size(fileobj):
+    """只解析图片文件头获取 (宽, 高)，不解码像素数据；无法识别时返回 (None, None)。"""
+    try:
+        with Image.open(fileobj) as img:
+            return img.size
+    except Exception:
+        return None, None
+
+def read_page_manifest(comic_path):
+    """
+    读取压缩包的中央目录，返回按文件名排序的页面清单。
+    每一项包含条目名、本地文件头偏移、压缩/原始大小、压缩方式、CRC，
+    以及从图片文件头读取的像素尺寸（固实 RAR 无法廉价地逐页读取，尺寸留空）。
+    """
+    file_extension = os.path.splitext(comic_path)[1].lower()
+    if file_extension in RAR_EXTENSIONS:
+        with rarfile.RarFile(comic_path, 'r') as r:
+            infos = [f for f in r.infolist() if not f.isdir() and is_image_entry(f.filename)]
+            return [{
+                "entry_name": f.filename,
+                "header_offset": getattr(f, 'header_offset', None),
+                "compress_size": f.compress_size,
+                "file_size": f.file_size,
+                "compress_type": f.compress_type,
+                "crc": f.CRC,
+                "width": None,
+                "height": None
+            } for f in sorted(infos, key=lambda f: f.filename)]
+    with zipfile.ZipFile(comic_path, 'r') as z:
+        infos = [f for f in z.infolist() if is_image_entry(f.filename)]
+        pages = []
+        for f in sorted(infos, key=lambda f: f.filename):
+            with z.open(f) as entry:
+                width, height = read_image_size(entry)
+            pages.append({
+                "entry_name": f.filename,
+                "header_offset": f.header_offset,
+                "compress_size": f.compress_size,
+                "file_size": f.file_size,
+                "compress_type": f.compress_type,
+                "crc": f.CRC,
+                "width": width,
+                "height": height
+            })
+        return pages
+
+def load_page_manifest(comic_path):
+    """
+    读取压缩包的页面清单和当前指纹，返回 (pages, stat_result)。
+    这一步只读文件，不占用数据库写线程；无法解析的压缩包得到空清单。
+    """
+    st = os.stat(comic_path)
+    try:
+        pages = read_page_manifest(comic_path)
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        print(f"无法读取页面清单 {comic_path}: {e}")
+        pages = []
+    return pages, st
+
+def store_page_manifest(cursor, comic_id, pages, stat_result):
+    """
+    重建一本漫画的页面清单，并记录建立清单时压缩包的 mtime/size，
+    之后只要指纹不变就可以直接信任数据库中的清单。返回页数。
+    """
+    cursor.execute("DELETE FROM comic_pages WHERE comic_id = ?", (comic_id,))
+    cursor.executemany("""
+        INSERT INTO comic_pages (comic_id, page_index, entry_name, header_offset, compress_size, file_size, compress_type, crc, width, height)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (comic_id, i, p['entry_name'], p['header_offset'], p['compress_size'], p['file_size'], p['compress_type'], p['crc'], p['width'], p['height'])
+        for i, p in enumerate(pages)
+    ])
+    cursor.execute(
+        "UPDATE comics SET totalPages = ?, archive_mtime_ns = ?, archive_size = ? WHERE id = ?",
+        (len(pages), stat_result.st_mtime_ns, stat_result.st_size, comic_id)
+    )
+    return len(pages)
+
+def is_manifest_current(row, stat_result):
+    """判断数据库中记录的压缩包指纹是否与磁盘上的文件一致。"""
+    return row['archive_mtime_ns'] == stat_result.st_mtime_ns and row['archive_size'] == stat_result.st_size
+
 # --- 核心扫描和分类逻辑 ---
 def scan_comics(folder_to_scan=None):
     """
@@ -107,6 +228,7 @@ def scan_comics(folder_to_scan=None):
         return
 
     scan_progress['in_progress'] = True
+    _scan_cancel.clear()
     scan_progress['current'] = 0
     scan_progress['total'] = 0
     scan_progress['message'] = "正在开始扫描..."
@@ -118,9 +240,6 @@ def scan_comics(folder_to_scan=None):
         for size_name in COVER_SIZES.keys():
             os.makedirs(os.path.join(COVERS_DIRECTORY, size_name), exist_ok=True)
 
-        conn = database.get_db_connection()
-        cursor = conn.cursor()
-
         scan_folders = [folder_to_scan] if folder_to_scan else config.get('managed_folders', [])
         if not scan_folders:
             print("没有配置漫画库路径，扫描中止。")
@@ -128,138 +247,338 @@ def scan_comics(folder_to_scan=None):
             return
 
         scan_progress['message'] = "正在搜集文件..."
-        disk_comic_paths = set()
-        for folder in scan_folders:
-            if not os.path.isdir(folder):
-                continue
-            for root, _, files in os.walk(folder):
-                for file in files:
-                    if any(file.lower().endswith(ext) for ext in ALLOWED_EXTENSIONS):
-                        disk_comic_paths.add(os.path.join(root, file))
-        
-        paths_to_process = list(disk_comic_paths)
-        scan_progress['total'] = len(paths_to_process)
-
-        cursor.execute("SELECT title, local_path FROM comics WHERE local_path IS NOT NULL")
-        existing_comics = {row['title']: row['local_path'] for row in cursor.fetchall()}
-        existing_local_paths = set(existing_comics.values())
-
-        comics_to_add = []
-        comics_to_update = []
-
-        for i, comic_path in enumerate(paths_to_process):
-            scan_progress['current'] = i + 1
-            comic_name = os.path.splitext(os.path.basename(comic_path))[0]
-            scan_progress['message'] = f"正在快速添加: {comic_name}"
-            
-            if comic_path in existing_local_paths:
-                continue
-
-            source_folder = next((f for f in config.get('managed_folders', []) if comic_path.startswith(f)), None)
-            
-            cursor.execute("SELECT local_path FROM comics WHERE title = ?", (comic_name,))
-            result = cursor.fetchone()
-
-            if result is None:
-                comics_to_add.append((comic_name, comic_name, time.time(), comic_path, source_folder))
-            elif result['local_path'] is None:
-                comics_to_update.append((comic_path, source_folder, comic_name))
-
-        if comics_to_add:
-            cursor.executemany("INSERT INTO comics (title, displayName, date_added, local_path, local_source_folder) VALUES (?, ?, ?, ?, ?)", comics_to_add)
-            print(f"快速添加了 {len(comics_to_add)} 本新漫画。")
-
-        if comics_to_update:
-            cursor.executemany("UPDATE comics SET local_path = ?, local_source_folder = ? WHERE title = ?", comics_to_update)
-            print(f"为 {len(comics_to_update)} 本在线漫画关联了本地文件。")
-        
-        conn.commit()
-
-        cursor.execute("SELECT title, local_path, local_cover_path_thumbnail FROM comics WHERE local_path IS NOT NULL")
-        all_local_comics = cursor.fetchall()
-
-        for i, comic_row in enumerate(all_local_comics):
-            comic_path = comic_row['local_path']
-            if not os.path.exists(comic_path): continue
-
-            comic_name = comic_row['title']
-            scan_progress['current'] = i + 1
-            scan_progress['message'] = f"正在处理封面: {comic_name}"
-            
-            cover_path_thumb = comic_row['local_cover_path_thumbnail']
-            if cover_path_thumb and os.path.exists(os.path.join(WEB_DIRECTORY, cover_path_thumb.replace('/', os.sep))):
-                continue
+        conn = database.get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT path, parent, mtime_ns FROM dir_index")
+        known_dirs = {}
+        known_children = {}
+        for row in cursor.fetchall():
+            known_dirs[row['path']] = row['mtime_ns']
+            known_children.setdefault(row['parent'], []).append(row['path'])
+        conn.close()
 
-            file_extension = os.path.splitext(comic_path)[1].lower()
-            image_data = None
-            if file_extension == '.zip' or file_extension == '.cbz':
-                image_data = get_first_image_from_zip(comic_path)
-            elif file_extension == '.rar':
-                image_data = get_first_image_from_rar(comic_path)
-            if image_data:
+        visited_dirs = {}
+        scan_files = []
+        for folder in scan_folders:
+            if os.path.isdir(folder):
+                _walk_directory(folder, None, known_dirs, known_children, visited_dirs, scan_files)
+
+        # 完整扫描时索引中未访问到的目录都已不存在（或不再受管理）；只扫描单个文件夹时只看该文件夹之下
+        removed_dirs = [
+            path for path in known_dirs
+            if path not in visited_dirs and (folder_to_scan is None or _is_under(path, folder_to_scan))
+        ]
+        changed_dirs = sum(1 for _, _, changed in visited_dirs.values() if changed)
+        print(f"检查了 {len(visited_dirs)} 个目录，其中 {changed_dirs} 个有变化，重新列出了 {len(scan_files)} 个文件。")
+
+        scan_progress['message'] = "正在比对文件索引..."
+        added, linked = db_writer.run(
+            _apply_scan_index, scan_files, visited_dirs, removed_dirs,
+            scan_folders, config.get('managed_folders', [])
+        )
+        if added:
+            print(f"快速添加了 {added} 本新漫画。")
+        if linked:
+            print(f"为 {linked} 本在线漫画关联了本地文件。")
+
+        # 只处理缺少封面或清单与索引中文件大小/修改时间不一致的漫画，不再逐个 stat 全部本地漫画
+        conn = database.get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT c.id, c.title, c.local_path, c.local_cover_path_thumbnail, c.cover_hash, c.archive_mtime_ns, c.archive_size
+            FROM comics c JOIN file_index f ON f.path = c.local_path
+            WHERE c.cover_hash IS NULL
+                OR c.archive_mtime_ns IS NOT f.mtime_ns OR c.archive_size IS NOT f.size
+        """)
+        comics_to_process = cursor.fetchall()
+        # 仍被引用的封面可以直接复用，同一源图不再重复生成
+        cursor.execute("SELECT hash, ext FROM covers WHERE ref_count > 0")
+        known_covers = {row['hash']: row['ext'] for row in cursor.fetchall()}
+        conn.close()
+        scan_progress['total'] = len(comics_to_process)
+        # 清单和封面的写入交给写线程排队，由它合并成批量事务；扫描线程只负责读文件，
+        # 封面的解码和缩放在进程池中并行执行
+        pending_writes = []
+        pipeline = _CoverPipeline(pending_writes, known_covers)
+        try:
+            for i, comic_row in enumerate(comics_to_process):
+                _check_cancelled()
+                comic_path = comic_row['local_path']
+                comic_name = comic_row['title']
                 try:
-                    img = Image.open(io.BytesIO(image_data)).convert("RGB")
-                except Exception as e:
-                    print(f"  - 无法打开封面图片 {comic_name}: {e}")
+                    comic_stat = os.stat(comic_path)
+                except OSError:
+                    pipeline.skip()
                     continue
 
-                cover_filename = f"{sanitize_filename(comic_name)}.jpg"
-                cover_paths = {}
-
-                for size_name, width in COVER_SIZES.items():
+                if not is_manifest_current(comic_row, comic_stat):
+                    scan_progress['message'] = f"正在建立页面清单: {comic_name}"
                     try:
-                        w, h = img.size
-                        aspect_ratio = h / w
-                        new_height = int(width * aspect_ratio)
-                        resized_img = img.resize((width, new_height), Image.Resampling.LANCZOS)
-                        
-                        size_dir = os.path.join(COVERS_DIRECTORY, size_name)
-                        output_path = os.path.join(size_dir, cover_filename)
-                        
-                        resized_img.save(output_path, "JPEG", quality=95)
-                        cover_paths[size_name] = f"covers/{size_name}/{cover_filename}"
-                    except Exception as e:
-                        print(f"  - 无法调整大小或保存封面 {comic_name} ({size_name}): {e}")
-                
-                if len(cover_paths) == len(COVER_SIZES):
-                    cursor.execute("""
-                        UPDATE comics SET 
-                        local_cover_path_thumbnail = ?, 
-                        local_cover_path_medium = ?, 
-                        local_cover_path_large = ?
-                        WHERE title = ?
-                    """, (
-                        cover_paths.get('thumbnail'),
-                        cover_paths.get('medium'),
-                        cover_paths.get('large'),
-                        comic_name
-                    ))
-        
-        conn.commit()
+                        pages, comic_stat = load_page_manifest(comic_path)
+                    except OSError:
+                        pipeline.skip()
+                        continue
+                    pending_writes.append(db_writer.submit(store_page_manifest, comic_row['id'], pages, comic_stat))
+
+                if comic_row['cover_hash']:
+                    pipeline.skip()
+                    continue
+
+                scan_progress['message'] = f"正在处理封面: {comic_name}"
+                image_data = get_first_image(comic_path)
+                if not image_data:
+                    pipeline.skip()
+                    continue
+                # 没有 cover_hash 但有封面路径的是旧版本按漫画名保存的封面，按哈希重新登记后由 assign_covers 删除
+                pipeline.submit(comic_row['id'], comic_name, image_data)
+
+            scan_progress['message'] = "正在等待封面生成..."
+            pipeline.finish()
+            if pipeline.reused:
+                print(f"{pipeline.reused} 本漫画复用了相同源图的封面。")
+        finally:
+            pipeline.close()
+            for future in pending_writes:
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"  - 写入扫描结果时出错: {e}")
 
+        _check_cancelled()
         scan_progress['message'] = "正在自动分类..."
-        auto_classify_comics(conn)
-        
-        conn.commit()
-        conn.close()
+        db_writer.run(auto_classify_comics)
         print("扫描完成.")
-        
+
+    except ScanCancelled:
+        print("扫描已取消。")
     except Exception as e:
         print(f"--- 扫描时出错: {e} ---")
         traceback.print_exc()
     finally:
         scan_progress['in_progress'] = False
-        scan_progress['message'] = "扫描完成"
+        scan_progress['message'] = "扫描已取消" if _scan_cancel.is_set() else "扫描完成"
         
     return list(database.load_unified_comics().values())
 
 
-def auto_classify_comics(conn):
+# --- 增量扫描 ---
+# dir_index 记录每个目录上次列出时的 mtime，file_index 记录其中漫画文件的大小、mtime 和 inode。
+# 目录的 mtime 只在其直接条目增删或改名时变化：mtime 未变的目录直接沿用索引中的文件和子目录，
+# 不再列出和 stat；有变化的目录用 os.scandir 重新列出。
+def _is_under(path, folder):
+    folder = folder.rstrip(os.sep)
+    return path == folder or path.startswith(folder + os.sep)
+
+def _walk_directory(path, parent, known_dirs, known_children, visited_dirs, scan_files):
+    """
+    递归检查目录，visited_dirs 记录 path -> (parent, mtime_ns, 是否重新列出)，
+    重新列出的目录中的漫画文件以 (path, dir, size, mtime_ns, inode) 追加到 scan_files。
+    """
+    _check_cancelled()
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return
+    scan_progress['current'] = len(visited_dirs) + 1
+    if known_dirs.get(path) == mtime_ns:
+        visited_dirs[path] = (parent, mtime_ns, False)
+        for child in known_children.get(path, []):
+            _walk_directory(child, path, known_dirs, known_children, visited_dirs, scan_files)
+        return
+
+    # 先取 mtime 再列出目录：列出期间新增的文件会让下次扫描再次列出该目录
+    visited_dirs[path] = (parent, mtime_ns, True)
+    subdirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif os.path.splitext(entry.name)[1].lower() in ALLOWED_EXTENSIONS and entry.is_file():
+                        st = entry.stat()
+                        scan_files.append((entry.path, path, st.st_size, st.st_mtime_ns, st.st_ino))
+                except OSError:
+                    continue
+    except OSError as e:
+        print(f"  - 无法读取目录 {path}: {e}")
+        return
+    for subdir in subdirs:
+        _walk_directory(subdir, path, known_dirs, known_children, visited_dirs, scan_files)
+
+def _apply_scan_index(cursor, scan_files, visited_dirs, removed_dirs, scan_folders, managed_folders):
+    """
+    把本次扫描结果合并进 file_index/dir_index，并为索引中还没有对应漫画的文件建立记录。
+    比对通过临时表批量完成。返回 (新增漫画数, 关联到已有在线漫画的数量)。
+    """
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS scan_files (path TEXT PRIMARY KEY, dir TEXT, size INTEGER, mtime_ns INTEGER, inode INTEGER)")
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS scan_dirs (path TEXT PRIMARY KEY, parent TEXT, mtime_ns INTEGER)")
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS scan_new (title TEXT PRIMARY KEY, path TEXT, source_folder TEXT)")
+    for table in ('scan_files', 'scan_dirs', 'scan_new'):
+        cursor.execute(f"DELETE FROM temp.{table}")
+
+    cursor.executemany("INSERT OR REPLACE INTO temp.scan_files VALUES (?, ?, ?, ?, ?)", scan_files)
+    cursor.executemany(
+        "INSERT INTO temp.scan_dirs VALUES (?, ?, ?)",
+        [(path, parent, mtime_ns) for path, (parent, mtime_ns, changed) in visited_dirs.items() if changed]
+    )
+
+    # 重新列出的目录中已消失的文件、已删除目录中的文件，从索引中移除
+    cursor.execute("""
+        DELETE FROM file_index
+        WHERE dir IN (SELECT path FROM temp.scan_dirs) AND path NOT IN (SELECT path FROM temp.scan_files)
+    """)
+    cursor.executemany("DELETE FROM file_index WHERE dir = ?", [(path,) for path in removed_dirs])
+    cursor.executemany("DELETE FROM dir_index WHERE path = ?", [(path,) for path in removed_dirs])
+    cursor.execute("""
+        INSERT INTO file_index (path, dir, size, mtime_ns, inode)
+        SELECT path, dir, size, mtime_ns, inode FROM temp.scan_files WHERE 1
+        ON CONFLICT(path) DO UPDATE SET
+            dir = excluded.dir, size = excluded.size, mtime_ns = excluded.mtime_ns, inode = excluded.inode
+    """)
+    cursor.execute("""
+        INSERT INTO dir_index (path, parent, mtime_ns)
+        SELECT path, parent, mtime_ns FROM temp.scan_dirs WHERE 1
+        ON CONFLICT(path) DO UPDATE SET parent = excluded.parent, mtime_ns = excluded.mtime_ns
+    """)
+
+    # 索引中没有对应漫画的文件：未变化目录中的文件也包括在内，被单独移出书库的漫画会重新加入
+    cursor.execute("SELECT f.path FROM file_index f LEFT JOIN comics c ON c.local_path = f.path WHERE c.id IS NULL ORDER BY f.path")
+    new_comics = []
+    for row in cursor.fetchall():
+        comic_path = row['path']
+        if not any(_is_under(comic_path, folder) for folder in scan_folders):
+            continue
+        comic_name = os.path.splitext(os.path.basename(comic_path))[0]
+        source_folder = next((f for f in managed_folders if comic_path.startswith(f)), None)
+        new_comics.append((comic_name, comic_path, source_folder))
+    if not new_comics:
+        return 0, 0
+    # 同名文件只取第一个，与逐个添加时后来者被跳过的行为一致
+    cursor.executemany("INSERT OR IGNORE INTO temp.scan_new VALUES (?, ?, ?)", new_comics)
+
+    # 同名的在线漫画还没有本地文件时关联上去，其余作为新漫画添加
+    cursor.execute("""
+        UPDATE comics SET
+            local_path = (SELECT n.path FROM temp.scan_new n WHERE n.title = comics.title),
+            local_source_folder = (SELECT n.source_folder FROM temp.scan_new n WHERE n.title = comics.title)
+        WHERE local_path IS NULL AND title IN (SELECT title FROM temp.scan_new)
+    """)
+    linked = cursor.rowcount
+    cursor.execute("""
+        INSERT OR IGNORE INTO comics (title, displayName, date_added, local_path, local_source_folder)
+        SELECT title, title, ?, path, source_folder FROM temp.scan_new
+    """, (time.time(),))
+    return cursor.rowcount, linked
+
+# --- 封面生成 ---
+class _CoverPipeline:
+    """
+    扫描中的封面阶段：扫描线程读取压缩包中的第一页，按其哈希登记封面，攒够 COVER_DB_BATCH 条后一次性交给写线程。
+    默认只登记不生成，文件在第一次被请求时生成（见 cover_builder.py）；
+    配置了 COVER_WARMUP_SIZES 时，这些尺寸提交到进程池提前生成，扫描线程同时继续读取下一本，
+    同时在途的任务数有上限，以限制内存中的图片数据。
+    已有的哈希直接复用，正在生成的哈希等待同一个任务，不会重复生成。
+    """
+    def __init__(self, pending_writes, known_covers):
+        self.pending_writes = pending_writes
+        self.known = known_covers
+        self.executor = None
+        self.in_flight = {}
+        self.rendering = {}
+        self.updates = []
+        self.completed = 0
+        self.reused = 0
+
+    def _advance(self):
+        self.completed += 1
+        scan_progress['current'] = self.completed
+
+    def skip(self):
+        """不需要生成封面的漫画也计入进度。"""
+        self._advance()
+
+    def submit(self, comic_id, comic_name, image_data):
+        cover_hash = covers.content_hash(image_data)
+        if cover_hash in self.known:
+            self.reused += 1
+            self._assign([comic_id], cover_hash, self.known[cover_hash])
+            return
+        if cover_hash in self.rendering:
+            self.reused += 1
+            self.rendering[cover_hash].append(comic_id)
+            return
+        if not COVER_WARMUP_SIZES:
+            ext = covers.cover_extension()
+            self.known[cover_hash] = ext
+            self._assign([comic_id], cover_hash, ext)
+            return
+
+        if self.executor is None:
+            # 使用 spawn 启动子进程，避免在多线程的服务进程中 fork
+            self.executor = ProcessPoolExecutor(
+                max_workers=max(1, COVER_WORKERS), mp_context=multiprocessing.get_context('spawn')
+            )
+        while len(self.in_flight) >= max(1, COVER_MAX_IN_FLIGHT):
+            done, _ = wait(self.in_flight, return_when=FIRST_COMPLETED)
+            self._collect(done)
+            _check_cancelled()
+        future = self.executor.submit(
+            covers.generate_covers, comic_name, image_data, cover_hash, COVERS_DIRECTORY, COVER_WARMUP_SIZES
+        )
+        self.in_flight[future] = cover_hash
+        self.rendering[cover_hash] = [comic_id]
+
+    def _assign(self, comic_ids, cover_hash, ext):
+        for comic_id in comic_ids:
+            if ext:
+                self.updates.append((comic_id, cover_hash, ext))
+            self._advance()
+        if len(self.updates) >= COVER_DB_BATCH:
+            self._flush()
+
+    def _collect(self, done):
+        for future in done:
+            cover_hash = self.in_flight.pop(future)
+            comic_ids = self.rendering.pop(cover_hash)
+            if future.cancelled():
+                continue
+            try:
+                ext = future.result()
+            except Exception as e:
+                print(f"  - 生成封面时出错: {e}")
+                ext = None
+            if ext:
+                self.known[cover_hash] = ext
+            self._assign(comic_ids, cover_hash, ext)
+
+    def _flush(self):
+        if self.updates:
+            self.pending_writes.append(db_writer.submit(covers.assign_covers, self.updates))
+            self.updates = []
+
+    def finish(self):
+        """等待所有在途任务完成。"""
+        while self.in_flight:
+            done, _ = wait(self.in_flight, timeout=0.5, return_when=FIRST_COMPLETED)
+            self._collect(done)
+            _check_cancelled()
+
+    def close(self):
+        """
+        关闭进程池：取消尚未开始的任务，等待正在执行的任务结束，
+        已完成的封面仍会写入数据库（取消扫描时也一样）。
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self._collect(list(self.in_flight))
+        self._flush()
+
+def auto_classify_comics(cursor):
     """
-    对尚未分类的漫画应用自动分类规则。
+    对尚未分类的漫画应用自动分类规则。需要在数据库写线程中调用（由调用方提交事务）。
     """
     print("开始自动分类...")
-    cursor = conn.cursor()
 
     cursor.execute("SELECT id, name, name_includes, tag_includes FROM folders WHERE auto = 1")
     auto_folder_rules = cursor.fetchall()
@@ -270,35 +589,36 @@ def auto_classify_comics(conn):
 
     auto_folder_id_map = {f['id'] for f in auto_folder_rules}
 
-    cursor.execute("SELECT title FROM comics")
-    all_comics_titles = [row['title'] for row in cursor.fetchall()]
+    cursor.execute("SELECT id, title FROM comics")
+    all_comics = cursor.fetchall()
     
-    cursor.execute("SELECT ct.comic_title, t.name, ct.type FROM comic_tags ct JOIN tags t ON ct.tag_id = t.id")
+    cursor.execute("SELECT ct.comic_id, t.name, ct.type FROM comic_tags ct JOIN tags t ON ct.tag_id = t.id")
     tags_rows = cursor.fetchall()
     tags_map = {}
     for row in tags_rows:
-        title = row['comic_title']
-        if title not in tags_map:
-            tags_map[title] = {'source': set(), 'added': set(), 'removed': set()}
-        tags_map[title][row['type']].add(row['name'])
+        comic_id = row['comic_id']
+        if comic_id not in tags_map:
+            tags_map[comic_id] = {'source': set(), 'added': set(), 'removed': set()}
+        tags_map[comic_id][row['type']].add(row['name'])
 
-    cursor.execute("SELECT comic_title, folder_id FROM comic_folders")
+    cursor.execute("SELECT comic_id, folder_id FROM comic_folders")
     comic_folders_rows = cursor.fetchall()
     comic_folders_map = {}
     for row in comic_folders_rows:
-        title = row['comic_title']
-        if title not in comic_folders_map:
-            comic_folders_map[title] = set()
-        comic_folders_map[title].add(row['folder_id'])
+        comic_id = row['comic_id']
+        if comic_id not in comic_folders_map:
+            comic_folders_map[comic_id] = set()
+        comic_folders_map[comic_id].add(row['folder_id'])
 
     classified_count = 0
     updates_to_perform = []
 
-    for title in all_comics_titles:
-        current_folders = comic_folders_map.get(title, set())
+    for comic in all_comics:
+        comic_id, title = comic['id'], comic['title']
+        current_folders = comic_folders_map.get(comic_id, set())
         manual_folders = {f_id for f_id in current_folders if f_id not in auto_folder_id_map}
         
-        comic_tags = tags_map.get(title, {})
+        comic_tags = tags_map.get(comic_id, {})
         source_tags = comic_tags.get('source', set())
         added_tags = comic_tags.get('added', set())
         removed_tags = comic_tags.get('removed', set())
@@ -327,18 +647,17 @@ def auto_classify_comics(conn):
             classified_count += 1
             folders_to_remove = {f_id for f_id in current_folders if f_id in auto_folder_id_map}
             for f_id in folders_to_remove:
-                updates_to_perform.append((title, f_id, 'delete'))
+                updates_to_perform.append((comic_id, f_id, 'delete'))
             for f_id in newly_matched_auto_folders:
-                updates_to_perform.append((title, f_id, 'insert'))
+                updates_to_perform.append((comic_id, f_id, 'insert'))
 
     if updates_to_perform:
-        for title, folder_id, action in updates_to_perform:
+        for comic_id, folder_id, action in updates_to_perform:
             if action == 'delete':
-                cursor.execute("DELETE FROM comic_folders WHERE comic_title = ? AND folder_id = ?", (title, folder_id))
+                cursor.execute("DELETE FROM comic_folders WHERE comic_id = ? AND folder_id = ?", (comic_id, folder_id))
             elif action == 'insert':
-                cursor.execute("INSERT OR IGNORE INTO comic_folders (comic_title, folder_id) VALUES (?, ?)", (title, folder_id))
+                cursor.execute("INSERT OR IGNORE INTO comic_folders (comic_id, folder_id) VALUES (?, ?)", (comic_id, folder_id))
         
-        conn.commit()
         print(f"更新了 {classified_count} 本漫画的文件夹。")
     else:
         print("没有漫画的文件夹被更新。")
@@ -1,175 +1,159 @@
 import os
 import time
 import traceback
-from PIL import Image
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-import io
 
 import database
 import scanner
 import config
+import covers
+from archive_cache import archive_cache
+from db_writer import db_writer
 
 # --- Watchdog 实时文件处理 ---
+# 文件读取和封面生成在监控线程中完成，数据库改动统一交给写线程执行。
+
+def _prepare_cover(comic_name, comic_path):
+    """
+    取得漫画第一页对应的封面，返回 (cover_hash, 扩展名)，没有可用图片时返回 None。
+    相同源图的封面已登记时直接复用，否则只生成 COVER_WARMUP_SIZES 中的尺寸，其余在请求时生成。
+    """
+    image_data = scanner.get_first_image(comic_path)
+    if not image_data:
+        return None
+    cover_hash = covers.content_hash(image_data)
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT ext FROM covers WHERE hash = ?", (cover_hash,))
+    row = cursor.fetchone()
+    conn.close()
+
+    ext = row['ext'] if row else None
+    if ext is None:
+        ext = covers.generate_covers(comic_name, image_data, cover_hash, config.COVERS_DIRECTORY, config.COVER_WARMUP_SIZES)
+    return (cover_hash, ext) if ext else None
+
+def _store_created_comic(cursor, comic_name, comic_path, source_folder, pages, comic_stat, cover):
+    cursor.execute("""
+        INSERT INTO comics (title, displayName, date_added, local_path, local_source_folder)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(title) DO UPDATE SET
+            local_path = excluded.local_path,
+            local_source_folder = excluded.local_source_folder,
+            date_added = excluded.date_added
+    """, (comic_name, comic_name, time.time(), comic_path, source_folder))
+    cursor.execute("SELECT id FROM comics WHERE title = ?", (comic_name,))
+    comic_id = cursor.fetchone()['id']
+
+    scanner.store_page_manifest(cursor, comic_id, pages, comic_stat)
+
+    if cover:
+        covers.assign_covers(cursor, [(comic_id, *cover)])
+
+    scanner.auto_classify_comics(cursor)
 
 def handle_comic_created(comic_path):
     """处理新创建的漫画文件。"""
     try:
         print(f"[DB Update] 开始处理新漫画: {os.path.basename(comic_path)}")
-        conn = database.get_db_connection()
-        cursor = conn.cursor()
-
         comic_name = os.path.splitext(os.path.basename(comic_path))[0]
         app_config = config.get_config()
         source_folder = next((f for f in app_config.get('managed_folders', []) if comic_path.startswith(f)), None)
 
-        cursor.execute("""
-            INSERT INTO comics (title, displayName, date_added, local_path, local_source_folder)
-            VALUES (?, ?, ?, ?, ?)
-            ON CONFLICT(title) DO UPDATE SET
-                local_path = excluded.local_path,
-                local_source_folder = excluded.local_source_folder,
-                date_added = excluded.date_added
-        """, (comic_name, comic_name, time.time(), comic_path, source_folder))
-
-        image_data = scanner.get_first_image_from_zip(comic_path)
-        if image_data:
-            img = Image.open(io.BytesIO(image_data)).convert("RGB")
-            cover_filename = f"{scanner.sanitize_filename(comic_name)}.jpg"
-            cover_paths = {}
-            for size_name, width in config.COVER_SIZES.items():
-                w, h = img.size
-                aspect_ratio = h / w
-                new_height = int(width * aspect_ratio)
-                resized_img = img.resize((width, new_height), Image.Resampling.LANCZOS)
-                size_dir = os.path.join(config.COVERS_DIRECTORY, size_name)
-                output_path = os.path.join(size_dir, cover_filename)
-                resized_img.save(output_path, "JPEG", quality=95)
-                cover_paths[size_name] = f"covers/{size_name}/{cover_filename}"
-            
-            if len(cover_paths) == len(config.COVER_SIZES):
-                cursor.execute("""
-                    UPDATE comics SET 
-                    local_cover_path_thumbnail = ?, 
-                    local_cover_path_medium = ?, 
-                    local_cover_path_large = ?
-                    WHERE title = ?
-                """, (
-                    cover_paths.get('thumbnail'),
-                    cover_paths.get('medium'),
-                    cover_paths.get('large'),
-                    comic_name
-                ))
-        
-        scanner.auto_classify_comics(conn)
-        
-        conn.commit()
-        conn.close()
+        pages, comic_stat = scanner.load_page_manifest(comic_path)
+
+        cover = _prepare_cover(comic_name, comic_path)
+        db_writer.run(_store_created_comic, comic_name, comic_path, source_folder, pages, comic_stat, cover)
         print(f"[DB Update] 成功添加/更新漫画: {comic_name}")
 
     except Exception as e:
         print(f"--- 处理新漫画时出错 {comic_path}: {e} ---")
         traceback.print_exc()
 
+def _remove_local_comic(cursor, comic_path):
+    """移除路径对应漫画的本地信息，返回被处理的行（未找到时返回 None）。"""
+    cursor.execute("SELECT id, title, online_url FROM comics WHERE local_path = ?", (comic_path,))
+    comic_row = cursor.fetchone()
+    if not comic_row:
+        return None
+    if comic_row['online_url']:
+        cursor.execute("""
+            UPDATE comics SET
+            local_path = NULL, local_source_folder = NULL, cover_hash = NULL,
+            local_cover_path_thumbnail = NULL, local_cover_path_medium = NULL, local_cover_path_large = NULL
+            WHERE id = ?
+        """, (comic_row['id'],))
+    else:
+        cursor.execute("DELETE FROM comics WHERE id = ?", (comic_row['id'],))
+    return comic_row
+
 def handle_comic_deleted(comic_path):
     """处理被删除的漫画文件。"""
     try:
         print(f"[DB Update] 开始处理删除: {os.path.basename(comic_path)}")
-        conn = database.get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT title, local_cover_path_thumbnail, online_url FROM comics WHERE local_path = ?", (comic_path,))
-        comic_row = cursor.fetchone()
+        archive_cache.invalidate(comic_path)
+        comic_row = db_writer.run(_remove_local_comic, comic_path)
 
         if comic_row:
             comic_title = comic_row['title']
-            
-            if comic_row['local_cover_path_thumbnail']:
-                base_cover_name = os.path.basename(comic_row['local_cover_path_thumbnail'])
-                for size_name in config.COVER_SIZES.keys():
-                    cover_to_delete = os.path.join(config.COVERS_DIRECTORY, size_name, base_cover_name)
-                    if os.path.exists(cover_to_delete):
-                        os.remove(cover_to_delete)
-                        print(f"  - 已删除封面: {cover_to_delete}")
-
             if comic_row['online_url']:
-                cursor.execute("""
-                    UPDATE comics SET
-                    local_path = NULL, local_source_folder = NULL,
-                    local_cover_path_thumbnail = NULL, local_cover_path_medium = NULL, local_cover_path_large = NULL
-                    WHERE title = ?
-                """, (comic_title,))
                 print(f"[DB Update] 已从漫画 '{comic_title}' 中移除本地路径信息。")
             else:
-                cursor.execute("DELETE FROM comics WHERE title = ?", (comic_title,))
                 print(f"[DB Update] 已从数据库中完全删除漫画 '{comic_title}'。")
-            
-            conn.commit()
+            # 封面文件可能被其他漫画共用，由引用计数回收，见 covers.collect_garbage
         else:
             print(f"[DB Update] 在数据库中未找到路径为 {comic_path} 的漫画，无需操作。")
 
-        conn.close()
-
     except Exception as e:
         print(f"--- 处理删除漫画时出错 {comic_path}: {e} ---")
         traceback.print_exc()
 
+def _move_comic(cursor, comic_id, new_title, dest_path, cover):
+    """
+    移动或重命名只需更新漫画本身这一行：标签、文件夹、页面清单以 comic_id 关联，
+    封面按源图哈希命名，都保持不变。新标题已被另一条记录占用时，与旧版行为一致地由移动过来的漫画取代它。
+    cover 不为 None 时是替换旧版封面的、按哈希登记的封面。
+    """
+    app_config = config.get_config()
+    source_folder = next((f for f in app_config.get('managed_folders', []) if dest_path.startswith(f)), None)
+    cursor.execute("""
+        UPDATE OR REPLACE comics SET title = ?, displayName = CASE WHEN title = ? THEN displayName ELSE ? END,
+        local_path = ?, local_source_folder = ?
+        WHERE id = ?
+    """, (new_title, new_title, new_title, dest_path, source_folder, comic_id))
+    if cover:
+        covers.assign_covers(cursor, [(comic_id, *cover)])
+
 def handle_comic_moved(src_path, dest_path):
     """处理移动或重命名的漫画文件。"""
     try:
         print(f"[DB Update] 开始处理移动/重命名: {os.path.basename(src_path)} -> {os.path.basename(dest_path)}")
+        archive_cache.invalidate(src_path)
         conn = database.get_db_connection()
         cursor = conn.cursor()
-
-        cursor.execute("SELECT title, local_cover_path_thumbnail FROM comics WHERE local_path = ?", (src_path,))
+        cursor.execute("SELECT id, title, local_cover_path_thumbnail, cover_hash FROM comics WHERE local_path = ?", (src_path,))
         comic_row = cursor.fetchone()
+        conn.close()
 
         if comic_row:
             old_title = comic_row['title']
             new_title = os.path.splitext(os.path.basename(dest_path))[0]
             
-            if comic_row['local_cover_path_thumbnail']:
-                old_cover_base = scanner.sanitize_filename(old_title) + ".jpg"
-                new_cover_base = scanner.sanitize_filename(new_title) + ".jpg"
-                if old_cover_base != new_cover_base:
-                    for size_name in config.COVER_SIZES.keys():
-                        old_cover_path = os.path.join(config.COVERS_DIRECTORY, size_name, old_cover_base)
-                        new_cover_path = os.path.join(config.COVERS_DIRECTORY, size_name, new_cover_base)
-                        if os.path.exists(old_cover_path):
-                            os.rename(old_cover_path, new_cover_path)
-                            print(f"  - 已重命名封面: {old_cover_path} -> {new_cover_path}")
-            
-            new_cover_thumb = f"covers/thumbnail/{scanner.sanitize_filename(new_title)}.jpg"
-            new_cover_medium = f"covers/medium/{scanner.sanitize_filename(new_title)}.jpg"
-            new_cover_large = f"covers/large/{scanner.sanitize_filename(new_title)}.jpg"
-
-            cursor.execute("SELECT * FROM comics WHERE title = ?", (old_title,))
-            old_data = cursor.fetchone()
-            
-            cursor.execute("""
-                INSERT OR REPLACE INTO comics 
-                (title, displayName, is_favorite, currentPage, totalPages, date_added, local_path, local_source_folder, 
-                local_cover_path_thumbnail, local_cover_path_medium, local_cover_path_large, online_url, online_cover_url)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                new_title, new_title, old_data['is_favorite'], old_data['currentPage'], old_data['totalPages'], old_data['date_added'],
-                dest_path, old_data['local_source_folder'], new_cover_thumb, new_cover_medium, new_cover_large,
-                old_data['online_url'], old_data['online_cover_url']
-            ))
-
-            cursor.execute("UPDATE comic_tags SET comic_title = ? WHERE comic_title = ?", (new_title, old_title))
-            cursor.execute("UPDATE comic_folders SET comic_title = ? WHERE comic_title = ?", (new_title, old_title))
-
-            cursor.execute("DELETE FROM comics WHERE title = ?", (old_title,))
-
-            conn.commit()
-            print(f"[DB Update] 成功将 '{old_title}' 重命名/移动为 '{new_title}'。")
+            # 旧版本按漫画名保存的封面在改名后就找不到了，趁移动时改为按哈希登记
+            cover = None
+            if comic_row['local_cover_path_thumbnail'] and not comic_row['cover_hash']:
+                cover = _prepare_cover(new_title, dest_path)
+
+            db_writer.run(_move_comic, comic_row['id'], new_title, dest_path, cover)
+            if new_title == old_title:
+                print(f"[DB Update] 成功将 '{old_title}' 移动到 {dest_path}。")
+            else:
+                print(f"[DB Update] 成功将 '{old_title}' 重命名/移动为 '{new_title}'。")
         else:
             print(f"[DB Update] 未找到旧路径 {src_path}，将其作为新文件处理。")
             handle_comic_created(dest_path)
 
-        conn.close()
-
     except Exception as e:
         print(f"--- 处理移动/重命名漫画时出错 {src_path} -> {dest_path}: {e} ---")
         traceback.print_exc()
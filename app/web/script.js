@@ -108,15 +108,17 @@ document.addEventListener('DOMContentLoaded', () => {
     const scanProgressContainer = document.getElementById('scan-progress-container');
     const scanProgressBarInner = document.getElementById('scan-progress-bar-inner');
     const scanProgressText = document.getElementById('scan-progress-text');
+    const scanCancelButton = document.getElementById('scan-cancel-button');
     const toastContainer = document.getElementById('toast-container');
 
     // --- 全局状态 ---
     let allComics = [];
     let customFolders = [];
-    let readerState = { isOpen: false, comic: null, pages: [], currentPage: 0, viewMode: 'double', direction: 'ltr' };
+    let readerState = { isOpen: false, comic: null, pages: [], pageSizes: [], currentPage: 0, viewMode: 'double', direction: 'ltr' };
     let shelfState = { filter: 'all', sort: { by: 'date', order: 'desc' }, searchTerm: '', zoomLevel: 'medium' };
     let contextMenuState = { isOpen: false, comic: null };
     let progressUpdateTimer = null;
+    let longStripObserver = null;
     let selectionMode = false;
     let selectedComics = new Set();
     let confirmCallback = null;
@@ -125,6 +127,7 @@ document.addEventListener('DOMContentLoaded', () => {
     let currentPage = 1;
     const comicsPerPage = 30; // Adjust as needed
     let hasMoreComics = true;
+    let nextCursor = null; // 服务端返回的下一页游标，无限滚动时用它代替页码续读
     let isLoadingMore = false;
 
     // --- Toast 通知 ---
@@ -154,6 +157,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // --- SVG 图标 ---
     const icons = {
+        close: `<svg viewBox="0 0 24 24"><path d="M19 6.41L17.59 5 12 10.59 6.41 5 5 6.41 10.59 12 5 17.59 6.41 19 12 13.41 17.59 19 19 17.59 13.41 12z"/></svg>`,
         all: `<svg viewBox="0 0 24 24"><path d="M3 13h8V3H3v10zm0 8h8v-6H3v6zm10 0h8V11h-8v10zm0-18v6h8V3h-8z"/></svg>`,
         favorite: `<svg viewBox="0 0 24 24"><path d="M12 21.35l-1.45-1.32C5.4 15.36 2 12.28 2 8.5 2 5.42 4.42 3 7.5 3c1.74 0 3.41.81 4.5 2.09C13.09 3.81 14.76 3 16.5 3 19.58 3 22 5.42 22 8.5c0 3.78-3.4 6.86-8.55 11.54L12 21.35z"/></svg>`,
         web: `<svg viewBox="0 0 24 24"><path d="M12 2C6.48 2 2 6.48 2 12s4.48 10 10 10 10-4.48 10-10S17.52 2 12 2zm-1 17.93c-3.95-.49-7-3.85-7-7.93 0-.62.08-1.21.21-1.79L8 12v1c0 1.1.9 2 2 2v1.93zm6.9-2.54c-.26-.81-1-1.39-1.9-1.39h-1v-3c0-.55-.45-1-1-1h-2v-2h2c.55 0 1-.45 1-1V7h2c1.1 0 2-.9 2-2v-.41c2.93 1.19 5 4.06 5 7.41 0 2.08-.8 3.97-2.1 5.39z"/></svg>`,
@@ -176,6 +180,7 @@ document.addEventListener('DOMContentLoaded', () => {
         addFolderButton.innerHTML = icons.plus;
         batchSelectButton.innerHTML = icons.checklist;
         settingsButton.innerHTML = icons.settings;
+        scanCancelButton.innerHTML = icons.close;
     }
 
     // --- 数据加载与渲染 ---
@@ -202,6 +207,9 @@ document.addEventListener('DOMContentLoaded', () => {
                 filter: shelfState.filter,
                 search: shelfState.searchTerm
             });
+            if (append && nextCursor) {
+                params.set('cursor', nextCursor);
+            }
 
             const response = await fetch(`/api/comics?${params.toString()}`);
             if (!response.ok) {
@@ -210,11 +218,12 @@ document.addEventListener('DOMContentLoaded', () => {
             }
             const data = await response.json();
 
+            // 按游标续读时服务端不再统计总数，保留第一页的结果数
             const searchResultsCount = document.getElementById('search-results-count');
             if (data.total_comics !== null && data.total_comics !== undefined) {
                 searchResultsCount.textContent = `${data.total_comics} 结果`;
                 searchResultsCount.style.display = 'block';
-            } else {
+            } else if (!append) {
                 searchResultsCount.style.display = 'none';
             }
             
@@ -228,7 +237,8 @@ document.addEventListener('DOMContentLoaded', () => {
             renderShelf(data.comics);
 
             currentPage = data.page;
-            hasMoreComics = allComics.length < data.total_comics;
+            nextCursor = data.next;
+            hasMoreComics = Boolean(data.next);
 
         } catch (error) {
             console.error('错误:', error);
@@ -262,15 +272,15 @@ document.addEventListener('DOMContentLoaded', () => {
             return;
         }
 
-        const existingTitles = new Set(Array.from(comicShelf.children).map(card => card.dataset.title));
+        const existingIds = new Set(Array.from(comicShelf.children).map(card => Number(card.dataset.id)));
 
         comics.forEach(comic => {
-            if (existingTitles.has(comic.title)) {
+            if (existingIds.has(comic.id)) {
                 return;
             }
 
             const card = cardTemplate.content.cloneNode(true).querySelector('.comic-card');
-            card.dataset.title = comic.title;
+            card.dataset.id = comic.id;
 
             const localSource = comic.sources.find(s => s.type === 'local');
             const onlineSource = comic.sources.find(s => s.type === 'online');
@@ -287,7 +297,7 @@ document.addEventListener('DOMContentLoaded', () => {
             const comicInfoElement = card.querySelector('.comic-info');
             comicInfoElement.addEventListener('click', (e) => {
                 e.stopPropagation(); // 阻止事件冒泡到卡片本身
-                openDetailsView(comic.title);
+                openDetailsView(comic.id);
             });
             
             const favoriteButton = card.querySelector('.favorite-button');
@@ -311,7 +321,7 @@ document.addEventListener('DOMContentLoaded', () => {
             const comicCoverContainer = card.querySelector('.comic-cover-container');
             comicCoverContainer.addEventListener('click', () => {
                 if (selectionMode) {
-                    toggleComicSelection(card, comic.title);
+                    toggleComicSelection(card, comic.id);
                 } else {
                     if (localSource) {
                         openReader(comic);
@@ -323,7 +333,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
             card.addEventListener('click', () => {
                 if (selectionMode) {
-                    toggleComicSelection(card, comic.title);
+                    toggleComicSelection(card, comic.id);
                 }
             });
 
@@ -348,9 +358,9 @@ document.addEventListener('DOMContentLoaded', () => {
     let currentDetailComic = null; // 用于存储当前详情页的完整漫画数据
 
     // --- 详情页功能 ---
-    async function openDetailsView(comicTitle) {
+    async function openDetailsView(comicId) {
         try {
-            const response = await fetch(`/api/comic/${encodeURIComponent(comicTitle)}`);
+            const response = await fetch(`/api/comic/${comicId}`);
             if (!response.ok) {
                 throw new Error('无法加载漫画详情');
             }
@@ -508,7 +518,7 @@ document.addEventListener('DOMContentLoaded', () => {
             }
 
             try {
-                const response = await fetch(`/api/comic/${encodeURIComponent(currentDetailComic.title)}/display_name`, {
+                const response = await fetch(`/api/comic/${currentDetailComic.id}/display_name`, {
                     method: 'PUT',
                     headers: { 'Content-Type': 'application/json' },
                     body: JSON.stringify({ displayName: newDisplayName })
@@ -523,7 +533,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 detailsTitle.textContent = newDisplayName; // Update UI immediately
                 
                 // Also update the comic in allComics array
-                const comicInAllComics = allComics.find(c => c.title === currentDetailComic.title);
+                const comicInAllComics = allComics.find(c => c.id === currentDetailComic.id);
                 if (comicInAllComics) {
                     comicInAllComics.displayName = newDisplayName;
                 }
@@ -599,7 +609,7 @@ document.addEventListener('DOMContentLoaded', () => {
         if (!currentDetailComic || !tag) return;
 
         try {
-            const response = await fetch(`/api/comic/${encodeURIComponent(currentDetailComic.title)}/tags`, {
+            const response = await fetch(`/api/comic/${currentDetailComic.id}/tags`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ action, tag })
@@ -629,7 +639,7 @@ document.addEventListener('DOMContentLoaded', () => {
             console.error('Tag update error:', error);
             showToast(`标签更新失败: ${error.message}`, 'error');
             // Re-fetch to get the ground truth if optimistic update fails
-            openDetailsView(currentDetailComic.title);
+            openDetailsView(currentDetailComic.id);
         }
     }
 
@@ -663,12 +673,12 @@ document.addEventListener('DOMContentLoaded', () => {
         batchRemoveFromFolderButton.style.display = isFolderView ? 'flex' : 'none';
     }
 
-    function toggleComicSelection(card, comicTitle) {
-        if (selectedComics.has(comicTitle)) {
-            selectedComics.delete(comicTitle);
+    function toggleComicSelection(card, comicId) {
+        if (selectedComics.has(comicId)) {
+            selectedComics.delete(comicId);
             card.classList.remove('selected');
         } else {
-            selectedComics.add(comicTitle);
+            selectedComics.add(comicId);
             card.classList.add('selected');
         }
         updateSelectionCount();
@@ -694,20 +704,20 @@ document.addEventListener('DOMContentLoaded', () => {
 
     function handleSelectAll() {
         const allVisibleCards = comicShelf.querySelectorAll('.comic-card:not(.hidden)');
-        const allTitles = Array.from(allVisibleCards).map(card => card.dataset.title).filter(Boolean);
-        if (allTitles.length === 0) return;
+        const allIds = Array.from(allVisibleCards).map(card => Number(card.dataset.id)).filter(Boolean);
+        if (allIds.length === 0) return;
 
-        const allSelected = allTitles.length > 0 && allTitles.every(title => selectedComics.has(title));
+        const allSelected = allIds.length > 0 && allIds.every(id => selectedComics.has(id));
 
         allVisibleCards.forEach(card => {
-            const title = card.dataset.title;
-            if (!title) return;
+            const id = Number(card.dataset.id);
+            if (!id) return;
             if (allSelected) {
-                selectedComics.delete(title);
+                selectedComics.delete(id);
                 card.classList.remove('selected');
             } else {
-                if (!selectedComics.has(title)) {
-                    selectedComics.add(title);
+                if (!selectedComics.has(id)) {
+                    selectedComics.add(id);
                     card.classList.add('selected');
                 }
             }
@@ -716,21 +726,21 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     async function batchUpdateFavorites(isFavorite) {
-        const titles = Array.from(selectedComics);
-        if (titles.length === 0) return;
+        const ids = Array.from(selectedComics);
+        if (ids.length === 0) return;
 
         try {
             await fetch('/api/comics/favorite', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ titles, favorite: isFavorite })
+                body: JSON.stringify({ ids, favorite: isFavorite })
             });
             
             if (shelfState.filter === 'favorites') {
                 fetchAndRenderComics(1, comicsPerPage, false);
             } else {
-                titles.forEach(title => {
-                    const card = comicShelf.querySelector(`.comic-card[data-title="${title}"]`);
+                ids.forEach(id => {
+                    const card = comicShelf.querySelector(`.comic-card[data-id="${id}"]`);
                     if (card) card.classList.toggle('favorite', isFavorite);
                 });
                 updateComicCounts();
@@ -742,15 +752,15 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     async function batchRemoveFromFolder() {
-        const titles = Array.from(selectedComics);
+        const ids = Array.from(selectedComics);
         const folderName = shelfState.filter;
-        if (titles.length === 0 || ['all', 'favorites', 'web', 'downloaded', 'undownloaded'].includes(folderName)) return;
+        if (ids.length === 0 || ['all', 'favorites', 'web', 'downloaded', 'undownloaded'].includes(folderName)) return;
 
         try {
             await fetch('/api/comics/folder', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ titles, folder: null })
+                body: JSON.stringify({ ids, folder: null })
             });
             fetchAndRenderComics(1, comicsPerPage, false);
         } catch (error) {
@@ -759,18 +769,18 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     async function batchDelete() {
-        const titles = Array.from(selectedComics);
-        if (titles.length === 0) return;
+        const ids = Array.from(selectedComics);
+        if (ids.length === 0) return;
 
         showConfirmationModal(
             `删除漫画`,
-            `您确定要永久删除这 ${titles.length} 本漫画吗？这将删除本地漫画文件、在线信息以及所有相关封面。此操作无法撤销。`,
+            `您确定要永久删除这 ${ids.length} 本漫画吗？这将删除本地漫画文件、在线信息以及所有相关封面。此操作无法撤销。`,
             async () => {
                 try {
                     const response = await fetch('/api/comics/delete_full', {
                         method: 'POST',
                         headers: { 'Content-Type': 'application/json' },
-                        body: JSON.stringify({ titles })
+                        body: JSON.stringify({ ids })
                     });
                     if (!response.ok) {
                         const errorData = await response.json();
@@ -778,10 +788,10 @@ document.addEventListener('DOMContentLoaded', () => {
                     }
 
                     // Optimistically remove deleted comics from UI and allComics array
-                    const deletedTitlesSet = new Set(titles);
-                    allComics = allComics.filter(comic => !deletedTitlesSet.has(comic.title));
-                    titles.forEach(title => {
-                        const card = comicShelf.querySelector(`.comic-card[data-title="${title}"]`);
+                    const deletedIdsSet = new Set(ids);
+                    allComics = allComics.filter(comic => !deletedIdsSet.has(comic.id));
+                    ids.forEach(id => {
+                        const card = comicShelf.querySelector(`.comic-card[data-id="${id}"]`);
                         if (card) card.remove();
                     });
 
@@ -791,7 +801,7 @@ document.addEventListener('DOMContentLoaded', () => {
                         // If we deleted enough comics to create a gap, try to fill it
                         await fetchAndRenderComics(currentPage, comicsPerPage, true);
                     }
-                    showToast(`成功删除了 ${titles.length} 本漫画。`, 'success');
+                    showToast(`成功删除了 ${ids.length} 本漫画。`, 'success');
                     toggleSelectionMode();
                 } catch (error) {
                     console.error('批量删除失败:', error);
@@ -807,9 +817,9 @@ document.addEventListener('DOMContentLoaded', () => {
             return;
         }
 
-        const [title1, title2] = Array.from(selectedComics);
-        const comic1 = allComics.find(c => c.title === title1);
-        const comic2 = allComics.find(c => c.title === title2);
+        const [id1, id2] = Array.from(selectedComics);
+        const comic1 = allComics.find(c => c.id === id1);
+        const comic2 = allComics.find(c => c.id === id2);
 
         if (!comic1 || !comic2) {
             showToast('未能找到所选漫画的详细信息。', 'error');
@@ -874,8 +884,8 @@ document.addEventListener('DOMContentLoaded', () => {
                         method: 'POST',
                         headers: { 'Content-Type': 'application/json' },
                         body: JSON.stringify({
-                            online_comic_title: onlineComic.title,
-                            local_comic_title: localComic.title
+                            online_comic_id: onlineComic.id,
+                            local_comic_id: localComic.id
                         })
                     });
 
@@ -1214,17 +1224,17 @@ document.addEventListener('DOMContentLoaded', () => {
                         const response = await fetch(`/api/comic/delete_single`, {
                             method: 'POST',
                             headers: { 'Content-Type': 'application/json' },
-                            body: JSON.stringify({ title: comic.title })
+                            body: JSON.stringify({ id: comic.id })
                         });
                         if (!response.ok) {
                             const errorData = await response.json();
                             throw new Error(errorData.message || '删除失败');
                         }
                         
-                        const card = comicShelf.querySelector(`.comic-card[data-title="${comic.title}"]`);
+                        const card = comicShelf.querySelector(`.comic-card[data-id="${comic.id}"]`);
                         if (card) card.remove();
 
-                        allComics = allComics.filter(c => c.title !== comic.title);
+                        allComics = allComics.filter(c => c.id !== comic.id);
 
                         updateComicCounts();
                         showToast(`漫画 "${comic.displayName}" 已被删除。`, 'success');
@@ -1262,7 +1272,7 @@ document.addEventListener('DOMContentLoaded', () => {
             // 'null' folderName means remove from all folders
             const isRemoving = folderName === null;
             const url = isRemoving ? '/api/comics/folder/remove_all' : '/api/comics/folder';
-            const body = isRemoving ? { titles: [comic.title] } : { titles: [comic.title], folder: folderName };
+            const body = isRemoving ? { ids: [comic.id] } : { ids: [comic.id], folder: folderName };
 
             await fetch(url, {
                 method: 'POST',
@@ -1282,11 +1292,11 @@ document.addEventListener('DOMContentLoaded', () => {
             
             // If we are in a folder view and the comic was removed from it
             if (isRemoving && !['all', 'favorites', 'web', 'downloaded', 'undownloaded'].includes(shelfState.filter)) {
-                 const card = comicShelf.querySelector(`.comic-card[data-title="${comic.title}"]`);
+                 const card = comicShelf.querySelector(`.comic-card[data-id="${comic.id}"]`);
                  if (card) card.remove();
             } else if (shelfState.filter !== 'all' && shelfState.filter !== folderName && !isRemoving) {
                 // If we moved it to a folder that is not the current view
-                const card = comicShelf.querySelector(`.comic-card[data-title="${comic.title}"]`);
+                const card = comicShelf.querySelector(`.comic-card[data-id="${comic.id}"]`);
                 if (card) card.remove();
             }
 
@@ -1314,8 +1324,13 @@ document.addEventListener('DOMContentLoaded', () => {
         readerView.addEventListener('mousemove', handleReaderMouseMove);
 
         try {
-            const response = await fetch(`/api/comic/pages?path=${encodeURIComponent(localSource.path)}`);
-            readerState.pages = await response.json();
+            const comicURL = `/api/comic/${comic.id}`;
+            const [pagesResponse, sizesResponse] = await Promise.all([
+                fetch(`${comicURL}/pages`),
+                fetch(`${comicURL}/pages/dimensions`)
+            ]);
+            readerState.pages = await pagesResponse.json();
+            readerState.pageSizes = sizesResponse.ok ? (await sizesResponse.json()).pages : [];
             readerState.currentPage = comic.currentPage || 0;
             
             updateDirectionButton();
@@ -1336,14 +1351,14 @@ document.addEventListener('DOMContentLoaded', () => {
                 await fetch('/api/comic/progress', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ path: localSource.path, page: currentPage, direction: direction })
+                    body: JSON.stringify({ id: comic.id, page: currentPage, direction: direction })
                 });
                 
-                const localComic = allComics.find(c => c.title === comic.title);
+                const localComic = allComics.find(c => c.id === comic.id);
                 if (localComic) {
                     localComic.currentPage = currentPage;
                     localComic.totalPages = readerState.pages.length;
-                    const card = comicShelf.querySelector(`.comic-card[data-title="${comic.title}"]`);
+                    const card = comicShelf.querySelector(`.comic-card[data-id="${comic.id}"]`);
                     if (card) {
                         updateProgressBar(card, currentPage, readerState.pages.length);
                     }
@@ -1359,6 +1374,7 @@ document.addEventListener('DOMContentLoaded', () => {
         readerImageContainer.innerHTML = '';
         readerView.removeEventListener('mousemove', handleReaderMouseMove);
         readerImageContainer.removeEventListener('scroll', handleLongStripScroll);
+        disconnectLongStripObserver();
         readerControls.classList.remove('controls-visible');
         readerCloseButton.classList.remove('controls-visible');
     }
@@ -1413,12 +1429,20 @@ document.addEventListener('DOMContentLoaded', () => {
         saveProgress();
     }
 
+    function disconnectLongStripObserver() {
+        if (longStripObserver) {
+            longStripObserver.disconnect();
+            longStripObserver = null;
+        }
+    }
+
     function renderCurrentPage() {
         if (!readerState.isOpen) return;
 
         readerImageContainer.innerHTML = '';
         readerImageContainer.className = 'reader-image-container';
         readerImageContainer.removeEventListener('scroll', handleLongStripScroll);
+        disconnectLongStripObserver();
 
         const totalPages = readerState.pages.length;
         if (totalPages === 0) return;
@@ -1426,34 +1450,58 @@ document.addEventListener('DOMContentLoaded', () => {
         const localSource = readerState.comic.sources.find(s => s.type === 'local');
         if (!localSource) return;
 
-        const getPageURL = (index) => `/api/comic/page?path=${encodeURIComponent(localSource.path)}&page=${encodeURIComponent(readerState.pages[index])}`;
+        // 按页面在屏幕上的最大显示宽度向服务器请求缩放后的图片
+        const widthFraction = readerState.viewMode === 'double' ? 0.5 : (readerState.viewMode === 'long' ? 0.8 : 1);
+        const targetWidth = Math.round(readerImageContainer.clientWidth * widthFraction * (window.devicePixelRatio || 1));
+        const getPageURL = (index) => `/api/comic/${readerState.comic.id}/page/${index}?v=${readerState.pages[index].version}&w=${targetWidth}`;
 
         if (readerState.viewMode === 'long') {
             readerImageContainer.classList.add('long-strip');
             pageSlider.max = 1000;
 
-            let imagesLoaded = 0;
-            const images = [];
-
-            readerState.pages.forEach((_, i) => {
+            // 根据服务器返回的页面尺寸预先排好占位，只加载视口附近的图片
+            const images = readerState.pages.map((_, i) => {
                 const img = document.createElement('img');
-                images.push(img);
-                img.onload = () => {
-                    imagesLoaded++;
-                    if (imagesLoaded === totalPages) {
-                        const savedPage = readerState.currentPage || 0;
-                        if (images.length > savedPage) {
-                            readerImageContainer.scrollTop = images[savedPage].offsetTop;
-                        } else {
-                            readerImageContainer.scrollTop = 0;
+                const [width, height] = readerState.pageSizes[i] || [0, 0];
+                img.width = width || 1000;
+                img.height = height || 1414;
+                img.style.aspectRatio = `${img.width} / ${img.height}`;
+                img.dataset.index = i;
+                img.addEventListener('error', () => {
+                    // 请求失败（如排队被取消返回 503）时清掉 src，稍后重新观察，
+                    // 仍在可视范围内的页面会被再次请求
+                    if (!img.getAttribute('src')) return;
+                    img.removeAttribute('src');
+                    setTimeout(() => {
+                        if (longStripObserver && img.isConnected) {
+                            longStripObserver.unobserve(img);
+                            longStripObserver.observe(img);
                         }
-                        handleLongStripScroll();
-                    }
-                };
-                img.src = getPageURL(i);
+                    }, 1000);
+                });
                 readerImageContainer.appendChild(img);
+                return img;
             });
 
+            longStripObserver = new IntersectionObserver((entries) => {
+                entries.forEach(entry => {
+                    const img = entry.target;
+                    if (entry.isIntersecting) {
+                        if (!img.getAttribute('src')) {
+                            img.src = getPageURL(Number(img.dataset.index));
+                        }
+                    } else if (!img.complete) {
+                        // 已滚出预加载范围但还没加载完的图片，取消其请求
+                        img.removeAttribute('src');
+                    }
+                });
+            }, { root: readerImageContainer, rootMargin: '150% 0px' });
+            images.forEach(img => longStripObserver.observe(img));
+
+            const savedPage = Math.min(readerState.currentPage || 0, images.length - 1);
+            readerImageContainer.scrollTop = images[savedPage].offsetTop;
+            handleLongStripScroll();
+
             readerImageContainer.addEventListener('scroll', handleLongStripScroll, { passive: true });
 
         } else {
@@ -1565,7 +1613,7 @@ document.addEventListener('DOMContentLoaded', () => {
             fetch('/api/comic/progress', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ path: localSource.path, page: currentPage, direction: direction })
+                body: JSON.stringify({ id: comic.id, page: currentPage, direction: direction })
             }).catch(err => console.error("保存进度失败:", err));
         }, 500);
     }
@@ -1576,7 +1624,7 @@ document.addEventListener('DOMContentLoaded', () => {
             await fetch('/api/comics/favorite', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ titles: [comic.title], favorite: isFavorite })
+                body: JSON.stringify({ ids: [comic.id], favorite: isFavorite })
             });
             comic.is_favorite = isFavorite;
             card.classList.toggle('favorite', isFavorite);
@@ -1720,6 +1768,14 @@ document.addEventListener('DOMContentLoaded', () => {
             }
         });
 
+        scanCancelButton.addEventListener('click', async () => {
+            try {
+                await fetch('/api/scan/cancel', { method: 'POST' });
+            } catch (error) {
+                console.error('取消扫描时出错:', error);
+            }
+        });
+
         batchSelectButton.addEventListener('click', toggleSelectionMode);
         batchCancelButton.addEventListener('click', toggleSelectionMode);
         batchSelectAllButton.addEventListener('click', handleSelectAll);
@@ -1918,8 +1974,8 @@ document.addEventListener('DOMContentLoaded', () => {
         root.style.setProperty('--comic-card-min-width', newMinWidth);
 
         document.querySelectorAll('.comic-card').forEach(card => {
-            const comicTitle = card.dataset.title;
-            const comic = allComics.find(c => c.title === comicTitle);
+            const comicId = Number(card.dataset.id);
+            const comic = allComics.find(c => c.id === comicId);
             if (comic) {
                 const coverImg = card.querySelector('.comic-cover');
                 const newCoverUrl = getCoverUrlForCurrentZoom(comic);
@@ -0,0 +1,66 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'))
+
+import config
+import database
+
+_tmp = tempfile.mkdtemp()
+config.CONFIG_FILE = os.path.join(_tmp, 'config.json')
+config.COVERS_DIRECTORY = os.path.join(_tmp, 'covers')
+database.DB_FILE = os.path.join(_tmp, 'comics.db')
+
+import main
+from db_writer import db_writer
+
+
+class ListingCacheKeyTest(unittest.TestCase):
+    """同一搜索词在不同排序方式、不同空白下的结果不能共用缓存条目，否则游标指纹不匹配。"""
+
+    @classmethod
+    def setUpClass(cls):
+        database.init_db()
+        config.save_config({"managed_folders": []})
+
+        def add_comics(cursor):
+            cursor.executemany(
+                "INSERT INTO comics (title, displayName, date_added, online_url) VALUES (?, ?, ?, ?)",
+                [(f"alpha {i:02d}", f"alpha {i:02d}", float(i), f"http://example.com/{i}") for i in range(7)]
+            )
+        db_writer.run(add_comics)
+        cls.client = main.app.test_client()
+
+    def _page_through(self, **params):
+        titles = []
+        response = self.client.get('/api/comics', query_string=dict(params, limit=3))
+        while True:
+            self.assertEqual(response.status_code, 200, response.get_json())
+            data = response.get_json()
+            titles.extend(comic['title'] for comic in data['comics'])
+            if not data['next']:
+                return titles
+            response = self.client.get('/api/comics', query_string=dict(params, limit=3, cursor=data['next']))
+
+    def test_relevance_and_date_sorts_are_cached_separately(self):
+        # 只缓存按时间排序的第一页，再分别完整翻阅两种排序
+        first_page = self.client.get('/api/comics', query_string={'search': 'alpha', 'sort_by': 'date', 'limit': 3})
+        self.assertEqual(first_page.status_code, 200)
+        by_relevance = self._page_through(search='alpha', sort_by='relevance')
+        by_date = self._page_through(search='alpha', sort_by='date')
+        self.assertEqual(len(by_date), 7)
+        self.assertEqual(sorted(by_relevance), sorted(by_date))
+
+    def test_search_whitespace_is_normalized_once(self):
+        first_page = self.client.get('/api/comics', query_string={'search': 'alpha', 'sort_by': 'name', 'limit': 3})
+        self.assertEqual(first_page.status_code, 200)
+        padded = self._page_through(search='alpha ', sort_by='name')
+        plain = self._page_through(search='alpha', sort_by='name')
+        self.assertEqual(padded, plain)
+        self.assertEqual(len(plain), 7)
+
+
+if __name__ == '__main__':
+    unittest.main()